@@ -9,6 +9,7 @@ from base_spider import BaseSpider
 import logging
 import os
 import uuid
+from csrc_gov.tools.query_log_tool import query_log
 
 
 class AbstractAttachmentSpider(BaseSpider):
@@ -33,79 +34,84 @@ class AbstractAttachmentSpider(BaseSpider):
             logging.error("数据库未初始化，附件任务无法执行。")
             return
 
-        # 1. 从数据库获取待办任务 (SQL由子类定义)
-        sql_query = self.get_db_tasks_sql()
+        # 1. 从数据库获取待办任务 (SQL由子类定义; 开启租约认领时逐批认领)
+        factor_str, factor_args = self.get_db_tasks_sql()
 
-        db, cs = self.mysql_tool.open_db_conn()
-        data_list = self.mysql_tool.select_db_sql(
-            db, cs, self.db_table, [], sql_query
-        )
-        self.mysql_tool.close_db_conn(db, cs)
-
-        if data_list is None:
-            logging.error("从数据库查询附件任务失败。")
-            return
+        for data_list in self.iter_db_task_batches(factor_str, factor_args):
+            logging.info(f"周期内需要处理的附件数量->{len(data_list)}")
 
-        logging.info(f"周期内需要处理的附件数量->{len(data_list)}")
-
-        # 2. 循环处理 (这是通用的)
-        for data_item in data_list:
-            if not data_item.get("attachment_url"):
-                logging.warning(f"任务 id={data_item['id']} 缺少 'attachment_url'，跳过")
-                continue
-
-            logging.info(f"--- 正在处理附件: id={data_item['id']} ---")
-            try:
-                # 3. 下载附件 (这是通用的)
-                # 生成一个本地缓存路径
-                file_ext = data_item["attachment_url"].split(".")[-1].split("?")[0]  # 处理带?的URL
-                if not file_ext or len(file_ext) > 5:  # 简单校验
-                    file_ext = "file"
-                local_file_name = f"{str(uuid.uuid1()).replace('-', '')}.{file_ext}"
-                local_file_path = os.path.join(self.file_cache_path, local_file_name)
-
-                download_success = self.download_file_generic(
-                    url=data_item["attachment_url"],
-                    save_path=local_file_path
-                )
-
-                if not download_success:
-                    logging.error(f"下载附件失败，跳过: {data_item['attachment_url']}")
+            # 2. 循环处理 (这是通用的)
+            for data_item in data_list:
+                if not data_item.get("attachment_url"):
+                    logging.warning(f"任务 id={data_item['id']} 缺少 'attachment_url'，跳过")
+                    self.finish_claimed_task(data_item["id"], False)
                     continue
 
-                # 4. 处理和存储 (这是子类特定的)
-                self.process_attachment_task(data_item, local_file_path, file_ext)
-
-            except Exception as e:
-                logging.error(f"处理附件 id={data_item['id']} 时失败: {e}", exc_info=True)
+                logging.info(f"--- 正在处理附件: id={data_item['id']} ---")
+                if self.lease_tool:
+                    self.lease_tool.heartbeat()
+                success = False
+                try:
+                    # 3. 下载附件到内存 (这是通用的)
+                    file_ext = data_item["attachment_url"].split(".")[-1].split("?")[0]  # 处理带?的URL
+                    if not file_ext or len(file_ext) > 5:  # 简单校验
+                        file_ext = "file"
+
+                    content = self.download_content_generic(data_item["attachment_url"])
+                    if content is None:
+                        logging.error(f"下载附件失败，跳过: {data_item['attachment_url']}")
+                        continue
+
+                    # 小文件直接在内存中处理; 超过 memory_upload_threshold_mb 时写入本地缓存路径
+                    local_file_path = None
+                    if not self.is_memory_upload(len(content)):
+                        local_file_name = f"{str(uuid.uuid1()).replace('-', '')}.{file_ext}"
+                        local_file_path = os.path.join(self.file_cache_path, local_file_name)
+                        with open(local_file_path, "wb") as f:
+                            f.write(content)
+                        content = None
+                    logging.info(f"下载成功: {data_item['attachment_url']} -> {local_file_path or '<内存>'}")
+
+                    # 4. 处理和存储 (这是子类特定的, 每条任务为一个工作单元)
+                    with query_log.work_unit(f"附件 id={data_item['id']}"):
+                        self.process_attachment_task(data_item, local_file_path, file_ext, content)
+                    success = True
+
+                except Exception as e:
+                    logging.error(f"处理附件 id={data_item['id']} 时失败: {e}", exc_info=True)
+                finally:
+                    self.finish_claimed_task(data_item["id"], success)
 
     # --- 抽象方法 (子类必须实现) ---
 
     @abstractmethod
-    def get_db_tasks_sql(self) -> str:
+    def get_db_tasks_sql(self) -> (str, tuple):
         """
         (子类必须实现)
-        返回一个 SQL `WHERE` 语句 (不含 'WHERE')，用于从数据库获取待处理的 *附件* 任务。
+        返回参数化的 SQL `WHERE` 条件 (不含 'WHERE') 及其参数，用于从数据库获取待处理的 *附件* 任务。
 
         例如:
         return (
-            "(`flag` = 0) and "
-            "(`is_delete` = 0) and "
-            "(`pid` is not null or `pid` != '') and "
-            "(`attachment_url` is not null or `attachment_url` != '') and "
-            f"(`publish_time` >= '{self.start_time}') and "
-            f"(`publish_time` <= '{self.end_time}') "
-            "order by `publish_time` desc"
+            SqlFactor()
+            .eq("flag", 0)
+            .eq("is_delete", 0)
+            .ge("publish_time", self.start_time)
+            .le("publish_time", self.end_time)
+            .order_by("publish_time", desc=True)
+            .build()
         )
         """
         pass
 
     @abstractmethod
-    def process_attachment_task(self, data_item: dict, local_file_path: str, file_ext: str):
+    def process_attachment_task(self, data_item: dict, local_file_path: str | None, file_ext: str,
+                                content: bytes | None = None):
         """
         (子类必须实现)
-        处理已下载的本地附件 (local_file_path)，
-        通常包括：计算MD5、上传OBS、更新数据库。
+        处理已下载的附件，通常包括：计算MD5、上传OBS、更新数据库。
+        小文件只在内存中 (content, local_file_path 为 None, 使用 get_str_md5 / upload_content_to_obs)，
+        大文件已写入本地 (local_file_path, content 为 None, 使用 get_file_md5 / upload_to_obs)。
+        处理失败时须抛出异常 (工作流据此释放租约, 而不是写入完成标记)。
 
         所有工具 (self.obs_tool, self.mysql_tool, self.tools.md5_tool) 均可使用。
         """
@@ -5,6 +5,9 @@
 #       - 定义“从数据库获取任务 -> 处理详情”的标准工作流
 # ---------------------
 from abc import abstractmethod
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 
 import requests
 
@@ -12,6 +15,29 @@ from base_spider import BaseSpider
 import logging
 import os
 from csrc_gov.tools.pdf_tool import PDFTool  # 详情页处理器通常需要PDF工具
+from csrc_gov.tools.asset_tool import AssetTool
+from csrc_gov.tools.render_server_tool import RenderClient
+from csrc_gov.tools.local_obs_tool import LocalOBSTool
+from csrc_gov.tools.snapshot_tool import SnapshotTool
+from csrc_gov.tools.query_log_tool import query_log
+
+# 解析进程中的解析函数 (每个进程初始化时创建一次, 见 _init_parse_worker)
+_parse_worker = None
+
+
+def _init_parse_worker(spider_class: type, worker_context: dict):
+    """
+    解析进程初始化 (每个进程执行一次): 由爬虫类根据上下文创建解析函数 (模板在此时载入)
+    """
+    global _parse_worker
+    _parse_worker = spider_class.create_parse_worker(worker_context)
+
+
+def _run_parse_task(raw_bytes: bytes, encoding: str, row_context: dict):
+    """
+    在解析进程中解析一条详情页
+    """
+    return _parse_worker(raw_bytes, encoding, row_context)
 
 
 class AbstractDetailSpider(BaseSpider):
@@ -19,19 +45,198 @@ class AbstractDetailSpider(BaseSpider):
     定义了“详情页处理”的标准工作流。
     """
     task_name = "抽象详情页处理"
+    # 为 True 时从快照重新处理 (不请求网站), 见 _execute_reprocess_task
+    is_reprocess = False
+    # 传给解析进程的行字段 (配置了 parse_pool 时, 其余字段留在主进程)
+    parse_row_fields = ("id", "detail_url", "title")
 
-    def __init__(self, project_config: dict):
+    def __init__(self, project_config: dict, stage_name: str = "detail_stage"):
         """
         初始化详情页处理器
         :param project_config: 已合并的配置字典
+        :param stage_name: 阶段名 (默认 "detail_stage", 重新处理时为 "reprocess_stage")
         """
-        # 1. 调用父类__init__，硬编码 stage_name 为 "detail_stage"
-        super().__init__(project_config, "detail_stage")
+        # 1. 调用父类__init__
+        super().__init__(project_config, stage_name)
 
-        # 2. 详情页特有的初始化 (例如 PDFTool, 模板读取)
-        self.pdf_tool = PDFTool(self.file_cache_path)  # 使用基类定义的 file_cache_path
+        # 2. 图片预取 (使用阶段配置, 未配置则由渲染引擎自行联网加载图片)
+        self.asset_tool = self._init_asset_tool(self.stage_conf.get("asset_prefetch"))
+
+        # 3. 详情页特有的初始化 (例如 PDFTool, 模板读取)
+        # (配置了 render_pool 时开启渲染池, 多个 wkhtmltopdf 进程并行渲染;
+        #  pdf_engine 选择渲染引擎: wkhtmltopdf (默认) / weasyprint (进程内渲染);
+        #  图片改写为本地文件链接时允许渲染访问本地文件; pdf_profiles 为命名输出配置, pdf_profile 为使用的配置;
+        #  配置了 render_server 时渲染交给主机级渲染服务)
+        render_pool_conf = self.stage_conf.get("render_pool") or {}
+        self.pdf_tool = PDFTool(
+            self.file_cache_path,  # 使用基类定义的 file_cache_path
+            pool_size=render_pool_conf.get("pool_size", 0),
+            queue_size=render_pool_conf.get("queue_size", 8),
+            render_timeout=render_pool_conf.get("timeout", 120),
+            engine=self.stage_conf.get("pdf_engine", "wkhtmltopdf"),
+            local_file_access=bool(self.asset_tool and self.asset_tool.inline == "file"),
+            profile_dict=self.stage_conf.get("pdf_profiles"),
+            profile=self.stage_conf.get("pdf_profile", "default"),
+            render_client=self._init_render_client(self.stage_conf.get("render_server"))
+        )
         self._load_templates()
 
+        # 4. 原始HTML快照 (使用阶段配置, 未配置则不保存)
+        self.snapshot_tool = self._init_snapshot_tool(self.stage_conf.get("snapshot"))
+
+        # 5. 最终HTML与上次成功渲染相同时跳过渲染及上传, 只写入完成标记 (需 content_md5 列, 见 is_render_unchanged)
+        self.skip_unchanged_render = self.stage_conf.get("skip_unchanged_render", False)
+
+        # 6. 解析进程池 (使用阶段配置, 未配置则在主线程解析; 进程池在 _execute_task 开始时创建;
+        #    子类未实现解析进程池的钩子时也在主线程解析)
+        self.parse_pool_conf = self.stage_conf.get("parse_pool")
+        if self.parse_pool_conf and not self.supports_parse_pool():
+            logging.warning(f"{type(self).__name__} 未实现 create_parse_worker / process_parsed_detail，"
+                            f"忽略 parse_pool 配置，在主线程解析")
+            self.parse_pool_conf = None
+        self.parse_executor = None
+        self.parse_queue_size = 0
+        # 已提交解析的任务 [(data_item, future)], 按提交顺序取结果
+        self.parse_pending = deque()
+
+    def _init_snapshot_tool(self, snapshot_conf: dict) -> SnapshotTool | None:
+        """
+        根据阶段配置初始化快照工具: backend 为 obs 时存入 storage 连接的OBS, 为 local 时存入本地目录。
+        """
+        if not snapshot_conf:
+            return None
+
+        if snapshot_conf.get("backend", "obs") == "local":
+            store_tool = LocalOBSTool(snapshot_conf["root_path"], snapshot_conf.get("bt", "snapshot"), "")
+        else:
+            store_tool = self.obs_tool
+        if not store_tool:
+            logging.error("快照存储未初始化，不保存快照")
+            return None
+
+        try:
+            return SnapshotTool(
+                store_tool,
+                prefix=snapshot_conf.get("prefix", "snapshot/"),
+                level=snapshot_conf.get("level", 3)
+            )
+        except ImportError as e:
+            logging.error(f"快照工具初始化失败，不保存快照: {e}")
+            return None
+
+    def _init_asset_tool(self, asset_conf: dict) -> AssetTool | None:
+        """
+        根据阶段配置初始化图片预取工具 (经 _make_request 下载, 使用爬虫的代理及重试逻辑)。
+        重新处理时不请求网站, 只读取已有的图片缓存 (未缓存的改为空白图片, 渲染时也不请求原链接)。
+        """
+        if not asset_conf:
+            return None
+
+        timeout = asset_conf.get("timeout", 30)
+        fetch_func = None if self.is_reprocess else (
+            lambda url: getattr(self._make_request("GET", url, timeout=timeout), "content", None)
+        )
+        return AssetTool(
+            fetch_func,
+            asset_conf.get("cache_path", "./cache/asset_cache/"),
+            worker_number=asset_conf.get("worker_number", 8),
+            inline=asset_conf.get("inline", "file"),
+            max_size=int(asset_conf.get("max_size_mb", 10) * 1024 * 1024)
+        )
+
+    def _init_render_client(self, render_server_conf: dict) -> RenderClient | None:
+        """
+        根据阶段配置初始化渲染服务客户端。
+        """
+        if not render_server_conf:
+            return None
+
+        return RenderClient(
+            render_server_conf.get("socket_path", "/tmp/pdf_render.sock"),
+            priority=render_server_conf.get("priority", 5),
+            busy_timeout=render_server_conf.get("busy_timeout", 600),
+            retry_interval=render_server_conf.get("retry_interval", 30)
+        )
+
+    def _init_parse_executor(self, parse_pool_conf: dict) -> ProcessPoolExecutor | None:
+        """
+        根据阶段配置创建解析进程池 (spawn 方式启动, 不继承主进程的连接及线程;
+        每个进程初始化时由 create_parse_worker 创建解析函数)。
+        """
+        if not parse_pool_conf:
+            return None
+
+        worker_number = parse_pool_conf.get("worker_number") or os.cpu_count() or 1
+        self.parse_queue_size = parse_pool_conf.get("queue_size") or worker_number * 2
+        logging.info(f"解析进程池已启动: 进程 {worker_number} 个，排队上限 {self.parse_queue_size}")
+        return ProcessPoolExecutor(
+            max_workers=worker_number,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_parse_worker,
+            initargs=(type(self), self.get_parse_worker_context())
+        )
+
+    def get_parse_worker_context(self) -> dict:
+        """
+        (子类可扩展)
+        解析进程初始化时使用的上下文 (须可序列化): 模板, 以及是否由主进程预取图片
+        """
+        return {
+            "h5_temp_str": self.h5_temp_str,
+            "c3_temp_str": self.c3_temp_str,
+            "localize_images": bool(self.asset_tool),
+        }
+
+    def submit_parse(self, data_item: dict, raw_bytes: bytes, encoding: str):
+        """
+        提交详情页到解析进程池 (只传原始字节及 parse_row_fields), 排队已满时先处理最早的结果。
+        任务的完成标记在 collect_parse_results 中写入。
+        :return: 本次处理成功的条数
+        """
+        row_context = {field: data_item.get(field) for field in self.parse_row_fields}
+        future = self.parse_executor.submit(_run_parse_task, raw_bytes, encoding, row_context)
+        self.parse_pending.append((data_item, future))
+        return self.collect_parse_results()
+
+    def collect_parse_results(self, wait_all: bool = False) -> int:
+        """
+        按提交顺序处理已完成的解析结果 (在主线程执行: 图片预取、附件入库、渲染及上传)
+        :param wait_all: 为 True 时等待全部解析完成, 否则只处理已完成的 (排队已满时等待最早的一条)
+        :return: 处理成功的条数
+        """
+        success_count = 0
+        while self.parse_pending:
+            data_item, future = self.parse_pending[0]
+            if not wait_all and not future.done() and len(self.parse_pending) < self.parse_queue_size:
+                break
+            self.parse_pending.popleft()
+
+            success = False
+            try:
+                file_list, content_str, img_url_list = future.result()
+                # 解析进程中图片为占位符, 预取后替换为本地缓存
+                if img_url_list:
+                    content_str = self.asset_tool.fill_placeholders(content_str, img_url_list)
+                with query_log.work_unit(f"详情 id={data_item['id']}"):
+                    self.process_parsed_detail(data_item, file_list, content_str)
+                success = True
+                success_count += 1
+            except Exception as e:
+                logging.error(f"处理 id={data_item['id']} 时失败: {e}", exc_info=True)
+            finally:
+                self.finish_claimed_task(data_item["id"], success)
+        return success_count
+
+    def localize_images(self, img_list: list):
+        """
+        渲染前并发预取页面图片并改写为本地缓存 (未配置 asset_prefetch 时不处理)
+        :param img_list: lxml img 节点列表 (src 须已为绝对链接)
+        """
+        if not self.asset_tool or not img_list:
+            return
+        localize_count = self.asset_tool.localize(img_list)
+        logging.info(f"图片预取: {localize_count}/{len(img_list)} 张改写为本地缓存")
+
     def _load_templates(self):
         """
         (子类可覆盖)
@@ -70,42 +275,150 @@ class AbstractDetailSpider(BaseSpider):
             logging.error("数据库未初始化，详情页任务无法执行。")
             return
 
-        # 1. 从数据库获取待办任务 (SQL由子类定义)
-        sql_query = self.get_db_tasks_sql()
+        self.parse_executor = self._init_parse_executor(self.parse_pool_conf)
+        try:
+            if self.is_reprocess:
+                self._execute_reprocess_task()
+            else:
+                self._execute_detail_task()
+        finally:
+            # 异常退出时未处理的解析结果丢弃 (完成标记未写入, 租约过期后重新认领)
+            if self.parse_executor:
+                self.parse_executor.shutdown(wait=True, cancel_futures=True)
+                self.parse_pending.clear()
+            # 等待渲染池中的任务 (渲染完成回调会提交上传, 须在上传队列关闭之前; 等待期间为未结束的任务续约)
+            self.pdf_tool.close(self.lease_tool.heartbeat if self.lease_tool else None)
+            logging.info(f"PDF 统计 (引擎 {self.pdf_tool.engine}):\n{self.pdf_tool.report()}")
+            if self.asset_tool:
+                self.asset_tool.close()
 
-        db, cs = self.mysql_tool.open_db_conn()
-        data_list = self.mysql_tool.select_db_sql(
-            db, cs, self.db_table, [], sql_query
-        )
-        self.mysql_tool.close_db_conn(db, cs)
+    def _execute_detail_task(self):
+        """
+        (已实现) 请求详情页并处理
+        """
+        # 1. 从数据库获取待办任务 (SQL由子类定义; 开启租约认领时逐批认领)
+        factor_str, factor_args = self.get_db_tasks_sql()
 
-        if data_list is None:
-            logging.error("从数据库查询任务失败。")
+        for data_list in self.iter_db_task_batches(factor_str, factor_args):
+            logging.info(f"周期内需要处理的详情页数量->{len(data_list)}")
+
+            # 2. 循环处理 (这是通用的)
+            for data_item in data_list:
+                logging.info(f"--- 正在处理: id={data_item['id']} ---")
+                if self.lease_tool:
+                    self.lease_tool.heartbeat()
+                success = False
+                # 提交到解析进程池后, 完成标记在取得解析结果时写入
+                submitted = False
+                try:
+                    # 3. 获取详情页 (这是通用的)
+                    raw_resp = self._make_request('GET', data_item["detail_url"])
+
+                    if raw_resp:
+                        # 4. 解码 (尝试多种编码)
+                        raw_content, encoding = self.decode_response_content(raw_resp)
+                        if raw_content is None:
+                            logging.warning(f"解码失败: {data_item['detail_url']}")
+                            continue
+
+                        # 保存原始HTML快照 (失败不影响处理)
+                        self.save_snapshot(data_item, raw_resp.content, encoding)
+
+                        # 5. 解析和存储 (这是子类特定的, 每条任务为一个工作单元;
+                        #    配置了 parse_pool 时在解析进程中解析, 结果回到主线程后存储)
+                        if self.parse_executor:
+                            self.submit_parse(data_item, raw_resp.content, encoding)
+                            submitted = True
+                            continue
+                        with query_log.work_unit(f"详情 id={data_item['id']}"):
+                            self.process_detail_task(data_item, raw_content, encoding)
+                        success = True
+                    else:
+                        logging.warning(f"获取详情页失败: {data_item['detail_url']}")
+
+                except Exception as e:
+                    logging.error(f"处理 id={data_item['id']} 时失败: {e}", exc_info=True)
+                finally:
+                    if not submitted:
+                        self.finish_claimed_task(data_item["id"], success)
+
+        # 等待解析进程池中剩余的任务
+        if self.parse_executor:
+            self.collect_parse_results(wait_all=True)
+
+    def _execute_reprocess_task(self):
+        """
+        (已实现) 从快照重新解析、渲染、上传, 不请求网站。
+        任务范围与详情页相同 (get_db_tasks_sql), 已生成过PDF的任务也重新生成。
+        """
+        if not self.snapshot_tool:
+            logging.error("未配置 snapshot，无法重新处理。")
             return
 
-        logging.info(f"周期内需要处理的详情页数量->{len(data_list)}")
+        factor_str, factor_args = self.get_db_tasks_sql()
+        reprocess_count = 0
+        missing_count = 0
+        for data_list in self.iter_db_task_batches(factor_str, factor_args):
+            logging.info(f"周期内需要重新处理的详情页数量->{len(data_list)}")
 
-        # 2. 循环处理 (这是通用的)
-        for data_item in data_list:
-            logging.info(f"--- 正在处理: id={data_item['id']} ---")
-            try:
-                # 3. 获取详情页 (这是通用的)
-                raw_resp = self._make_request('GET', data_item["detail_url"])
-
-                if raw_resp:
-                    # 4. 解码 (尝试多种编码)
-                    raw_content, encoding = self.decode_response_content(raw_resp)
-                    if raw_content is None:
-                        logging.warning(f"解码失败: {data_item['detail_url']}")
+            for data_item in data_list:
+                if self.lease_tool:
+                    self.lease_tool.heartbeat()
+                success = False
+                submitted = False
+                try:
+                    raw_bytes, index_dict = self.snapshot_tool.load(data_item["id"])
+                    if raw_bytes is None:
+                        missing_count += 1
+                        logging.warning(f"快照不存在，跳过: id={data_item['id']}")
+                        continue
+
+                    encoding = index_dict.get("encoding") or "utf-8"
+                    if self.parse_executor:
+                        reprocess_count += self.submit_parse(dict(data_item, flag=0), raw_bytes, encoding)
+                        submitted = True
                         continue
+                    raw_content = raw_bytes.decode(encoding)
+                    with query_log.work_unit(f"重新处理 id={data_item['id']}"):
+                        self.process_detail_task(dict(data_item, flag=0), raw_content, encoding)
+                    reprocess_count += 1
+                    success = True
 
-                    # 5. 解析和存储 (这是子类特定的)
-                    self.process_detail_task(data_item, raw_content, encoding)
-                else:
-                    logging.warning(f"获取详情页失败: {data_item['detail_url']}")
+                except Exception as e:
+                    logging.error(f"重新处理 id={data_item['id']} 时失败: {e}", exc_info=True)
+                finally:
+                    if not submitted:
+                        self.finish_claimed_task(data_item["id"], success)
 
-            except Exception as e:
-                logging.error(f"处理 id={data_item['id']} 时失败: {e}", exc_info=True)
+        if self.parse_executor:
+            reprocess_count += self.collect_parse_results(wait_all=True)
+        logging.info(f"重新处理完成: {reprocess_count} 条，无快照 {missing_count} 条")
+
+    def is_render_unchanged(self, data_item: dict, content_md5: str) -> bool:
+        """
+        最终HTML的 md5 与上次成功渲染时写入的 content_md5 相同 (且已有 obs_path) 时返回 True。
+        (wkhtmltopdf 每次输出的PDF带生成时间, file_md5 不能判断内容是否变化)
+        """
+        if not self.skip_unchanged_render or not data_item.get("obs_path"):
+            return False
+        return data_item.get("content_md5") == content_md5
+
+    def save_snapshot(self, data_item: dict, raw_bytes: bytes, encoding: str):
+        """
+        保存原始HTML快照 (按行 id 索引, 内容相同只存一份)
+        配置了 upload_queue 时提交到后台上传队列 (不阻塞详情页处理), 否则同步保存
+        """
+        if not self.snapshot_tool:
+            return
+        try:
+            if self.upload_queue_tool:
+                self.upload_queue_tool.submit(
+                    self.snapshot_tool.save, data_item["id"], raw_bytes, encoding, data_item.get("detail_url")
+                )
+                return
+            self.snapshot_tool.save(data_item["id"], raw_bytes, encoding, data_item.get("detail_url"))
+        except Exception as e:
+            logging.error(f"保存快照失败: id={data_item['id']}，错误: {e}", exc_info=True)
 
     def decode_response_content(self, response: requests.Response) -> (str, str):
         """
@@ -132,19 +445,20 @@ class AbstractDetailSpider(BaseSpider):
     # --- 抽象方法 (子类必须实现) ---
 
     @abstractmethod
-    def get_db_tasks_sql(self) -> str:
+    def get_db_tasks_sql(self) -> (str, tuple):
         """
         (子类必须实现)
-        返回一个 SQL `WHERE` 语句 (不含 'WHERE')，用于从数据库获取待处理的任务。
+        返回参数化的 SQL `WHERE` 条件 (不含 'WHERE') 及其参数，用于从数据库获取待处理的任务。
 
         例如:
         return (
-            "(`flag` = 0) and "
-            "(`pid` is null or `pid` = '') and "
-            "(`detail_url` is not null or `detail_url` != '') and "
-            f"(`publish_time` >= '{self.start_time}') and "
-            f"(`publish_time` <= '{self.end_time}') "
-            "order by `publish_time` desc"
+            SqlFactor()
+            .eq("flag", 0)
+            .is_blank("pid")
+            .ge("publish_time", self.start_time)
+            .le("publish_time", self.end_time)
+            .order_by("publish_time", desc=True)
+            .build()
         )
         """
         pass
@@ -155,7 +469,35 @@ class AbstractDetailSpider(BaseSpider):
         (子类必须实现)
         解析详情页的原始数据 (raw_content)，
         并处理（例如转PDF、上传OBS、更新数据库、解析附件并入库）。
+        处理失败时须抛出异常 (工作流据此释放租约, 而不是写入完成标记)。
 
         所有工具 (self.pdf_tool, self.obs_tool, self.mysql_tool, self.handle_snow_id) 均可使用。
         """
-        pass
\ No newline at end of file
+        pass
+
+    # --- 解析进程池 (子类实现后才使用 parse_pool 配置, 见 supports_parse_pool) ---
+
+    @classmethod
+    def supports_parse_pool(cls) -> bool:
+        """
+        子类是否实现了解析进程池的钩子 (create_parse_worker 及 process_parsed_detail)
+        """
+        return (cls.create_parse_worker.__func__ is not AbstractDetailSpider.create_parse_worker.__func__
+                and cls.process_parsed_detail is not AbstractDetailSpider.process_parsed_detail)
+
+    @classmethod
+    def create_parse_worker(cls, worker_context: dict):
+        """
+        (使用解析进程池时子类须实现, 在解析进程中执行)
+        根据 get_parse_worker_context 的上下文创建解析函数:
+        参数为 (原始字节, 编码, 行上下文), 返回 (附件列表, 最终HTML, 图片原链接列表)。
+        需要主进程预取图片时 (localize_images), 最终HTML中图片为 AssetTool 占位符, 原链接按占位符序号排列。
+        """
+        raise NotImplementedError(f"{cls.__name__} 未实现解析进程池")
+
+    def process_parsed_detail(self, data_item: dict, file_list: list, content_str: str):
+        """
+        (使用解析进程池时子类须实现)
+        处理解析进程返回的结果 (附件入库、转PDF、上传), 与 process_detail_task 解析之后的部分相同。
+        """
+        raise NotImplementedError(f"{type(self).__name__} 未实现解析进程池")
\ No newline at end of file
@@ -5,10 +5,14 @@
 #       - 定义“列表爬取”的标准工作流
 # ---------------------
 from abc import abstractmethod
+from contextlib import contextmanager
 from base_spider import BaseSpider
 import logging
 import datetime
+from csrc_gov.tools.unit_of_work_tool import UnitOfWork
 from csrc_gov.tools.monitor_tool import update_info  # 列表爬虫通常需要监控
+from csrc_gov.tools.sql_tool import SqlFactor
+from csrc_gov.tools.query_log_tool import query_log
 
 
 class AbstractListSpider(BaseSpider):
@@ -34,6 +38,11 @@ class AbstractListSpider(BaseSpider):
 
         # 3. 列表爬虫特有的配置
         self.is_full_crawled = self.env_settings.get("list_is_full_crawled", False)
+        # 页入库失败 (整页回滚) 后的重试次数
+        self.page_retry_number = self.stage_conf.get("page_retry_number", 2)
+        # 数据库慢或不可用时整页延后入库 (页面原始数据写入发件箱, 恢复后重新解析)
+        if self.outbox_tool:
+            self.outbox_tool.register_handler("list_page", self.replay_list_page)
 
         # 4. 列表爬虫特有的时间
         # (如果不是全量爬取，才使用时间范围)
@@ -44,6 +53,13 @@ class AbstractListSpider(BaseSpider):
         # (self.today_time 在原代码中 CsrcGovList.__init__ 被定义, 在 parse_list_page 中使用)
         self.today_time = datetime.datetime.now().strftime("%Y-%m-%d 00:00:00")
 
+        # 5. 热数据窗口 (表按 publish_time 分区时, 非全量爬取的查重先查热分区, 见 select_hot_first)
+        self.hot_start_time = None
+        hot_days = self.project_conf.get("partition", {}).get("hot_days")
+        if hot_days and not self.is_full_crawled:
+            hot_start_time = (datetime.datetime.now() - datetime.timedelta(days=hot_days)).strftime("%Y-%m-%d %H:%M:%S")
+            self.hot_start_time = min(hot_start_time, self.start_time)
+
     def _execute_task(self):
         """
         (已实现) 定义了列表爬取的核心工作流
@@ -56,66 +72,136 @@ class AbstractListSpider(BaseSpider):
             logging.error(f"配置中未找到目标列表: {self.get_target_list_key()}")
             return
 
-        for target in targets:
-            # --- 监控相关初始化 ---
-            state = 0
-            page_total_count = None
-            increment_count = 0
-            error_info = ""
-
-            try:
-                logging.info(f"--- 正在处理目标: {self.get_target_name(target)} ---")
-                total_pages = self.get_total_pages(target)
-                logging.info(f"获取到总页数: {total_pages}")
-
-                if total_pages is None:  # 允许 get_total_pages 返回 None 来跳过
-                    logging.warning(f"获取总页数失败或为0，跳过目标: {self.get_target_name(target)}")
-                    error_info = "获取总页数失败"
-                    continue
-
-                # 用于统计总条数
-                current_target_total_count = 0
-
-                for page in range(1, total_pages + 1):
-                    logging.info(f"--- 正在爬取第 {page} / {total_pages} 页 ---")
-                    try:
-                        page_data = self.fetch_list_page(target, page)
-
-                        if not page_data:
-                            logging.warning(f"第 {page} 页未获取到数据")
-                            continue
+        # 各目标的监控信息 (统一统计已入库条数后写入; 中途异常退出时已完成目标的监控信息也会写入)
+        status_list = []
 
-                        # parse_list_page 应该返回 (是否继续, 本页新增数, 本页总条数)
-                        continue_crawl, page_increment, page_item_count = self.parse_list_page(target, page_data)
-
-                        increment_count += page_increment
-                        current_target_total_count += page_item_count
-
-                        # 如果不是全量爬取，且解析器返回 False (说明遇到旧数据)，则停止翻页
-                        if not self.is_full_crawled and not continue_crawl:
-                            logging.info(f"遇到旧数据，停止非全量爬取。 (第 {page} 页)")
-                            break
+        try:
+            for target in targets:
+                # --- 监控相关初始化 ---
+                state = 0
+                page_total_count = None
+                increment_count = 0
+                error_info = ""
+
+                try:
+                    logging.info(f"--- 正在处理目标: {self.get_target_name(target)} ---")
+                    total_pages = self.get_total_pages(target)
+                    logging.info(f"获取到总页数: {total_pages}")
+
+                    if total_pages is None:  # 允许 get_total_pages 返回 None 来跳过
+                        logging.warning(f"获取总页数失败或为0，跳过目标: {self.get_target_name(target)}")
+                        error_info = "获取总页数失败"
+                        continue
+
+                    # 用于统计总条数
+                    current_target_total_count = 0
+
+                    for page in range(1, total_pages + 1):
+                        logging.info(f"--- 正在爬取第 {page} / {total_pages} 页 ---")
+                        try:
+                            page_data = self.fetch_list_page(target, page)
+
+                            if not page_data:
+                                logging.warning(f"第 {page} 页未获取到数据")
+                                continue
+
+                            # parse_list_page 应该返回 (是否继续, 本页新增数, 本页总条数)
+                            # (每页为一个工作单元: 一个连接、一个事务, 失败整页回滚后重试)
+                            continue_crawl, page_increment, page_item_count = self.save_list_page(
+                                target, page, page_data
+                            )
+
+                            increment_count += page_increment
+                            current_target_total_count += page_item_count
+
+                            # 如果不是全量爬取，且解析器返回 False (说明遇到旧数据)，则停止翻页
+                            if not self.is_full_crawled and not continue_crawl:
+                                logging.info(f"遇到旧数据，停止非全量爬取。 (第 {page} 页)")
+                                break
+
+                        except Exception as e:
+                            logging.error(f"处理第 {page} 页时失败: {e}", exc_info=True)
+
+                    state = 1  # 目标处理成功
+                    page_total_count = current_target_total_count  # 记录总条数
+
+                except Exception as e:
+                    error_info = f"处理目标 {self.get_target_name(target)} 时失败: {e}"
+                    logging.error(error_info, exc_info=True)
+
+                finally:
+                    status_list.append((target, page_total_count, increment_count, state, error_info))
+        finally:
+            self.flush_crawler_status(status_list)
 
-                    except Exception as e:
-                        logging.error(f"处理第 {page} 页时失败: {e}", exc_info=True)
+        # 确保关闭特有的数据库连接
+        if self.monitor_mysql_tool:
+            self.monitor_mysql_tool.close_ssh_conn()
 
-                state = 1  # 目标处理成功
-                page_total_count = current_target_total_count  # 记录总条数
+    def save_list_page(self, target: dict, page: int, page_data: any) -> (bool, int, int):
+        """
+        以页为工作单元解析入库, 失败时整页回滚并重试 (不重新请求页面)
+        配置了 db_outbox 时: 数据库慢或重试仍失败则整页延后入库, 不阻塞翻页
+        """
+        if self.outbox_tool and self.outbox_tool.is_degraded():
+            return self.defer_list_page(target, page, page_data)
 
+        for attempt in range(self.page_retry_number + 1):
+            uow = None
+            try:
+                with query_log.work_unit(f"{self.get_target_name(target)} 第{page}页"), \
+                        self.page_unit_of_work() as uow:
+                    return self.parse_list_page(target, page_data, uow)
             except Exception as e:
-                error_info = f"处理目标 {self.get_target_name(target)} 时失败: {e}"
-                logging.error(error_info, exc_info=True)
-
+                logging.error(f"第 {page} 页入库失败，已整页回滚 (第 {attempt + 1} 次): {e}")
+                if attempt >= self.page_retry_number:
+                    if not self.outbox_tool:
+                        raise
+                    self.outbox_tool.mark_degraded("写入失败")
+                    return self.defer_list_page(target, page, page_data)
             finally:
-                # --- 更新监控 ---
-                if self.monitor_mysql_tool and self.db_monitor_table:
-                    self.handle_crawler_status_to_db(target, page_total_count, increment_count, state, error_info)
-                if self.get_monitor_api_condition(target):
-                    self.handle_crawler_status_to_api(target, page_total_count, increment_count, state, error_info)
+                # 只计数据库耗时 (连接、sql、提交), 页内的稿件信息等接口请求不计入
+                if self.outbox_tool and uow:
+                    self.outbox_tool.mark_elapsed(uow.db_elapsed)
 
-        # 确保关闭特有的数据库连接
-        if self.monitor_mysql_tool:
-            self.monitor_mysql_tool.close_ssh_conn()
+    def defer_list_page(self, target: dict, page: int, page_data: any) -> (bool, int, int):
+        """
+        页面原始数据写入发件箱, 数据库恢复后由 replay_list_page 重新解析入库
+        (新增数在重放时才能确定, 本次监控不计入)
+        """
+        self.outbox_tool.append("list_page", self.db_table, {"target": target, "page": page, "page_data": page_data})
+        logging.warning(f"{self.get_target_name(target)} 第 {page} 页延后入库 (已写入发件箱)")
+        return self.is_page_in_window(target, page_data), 0, 0
+
+    def replay_list_page(self, payload: dict) -> bool:
+        """
+        发件箱重放: 重新解析一页并入库 (解析入库可重复执行, 已存在的数据会被跳过)
+        """
+        target, page, page_data = payload["target"], payload["page"], payload["page_data"]
+        try:
+            with query_log.work_unit(f"{self.get_target_name(target)} 第{page}页 (延后入库)"), \
+                    self.page_unit_of_work() as uow:
+                _, page_increment, _ = self.parse_list_page(target, page_data, uow)
+            logging.info(f"{self.get_target_name(target)} 第 {page} 页延后入库完成, 新增 {page_increment} 条")
+            return True
+        except Exception as e:
+            logging.error(f"{self.get_target_name(target)} 第 {page} 页延后入库失败: {e}")
+            return False
+
+    @contextmanager
+    def page_unit_of_work(self):
+        """
+        一页的工作单元: 正常结束时提交一次, 异常时回滚
+        """
+        uow = UnitOfWork(self.mysql_tool)
+        try:
+            yield uow
+            uow.commit()
+        except Exception:
+            uow.rollback()
+            raise
+        finally:
+            uow.close()
 
     # --- 抽象方法 (子类必须实现) ---
 
@@ -154,10 +240,11 @@ class AbstractListSpider(BaseSpider):
         pass
 
     @abstractmethod
-    def parse_list_page(self, target: dict, page_data: any) -> (bool, int, int):
+    def parse_list_page(self, target: dict, page_data: any, uow: UnitOfWork) -> (bool, int, int):
         """
         (子类必须实现)
-        解析页面数据，并使用 self.mysql_tool 存入数据库。
+        解析页面数据，并通过工作单元 uow (uow.select / uow.insert / uow.update) 存入数据库。
+        整页共用一个事务，由工作流统一提交；出错时直接抛出异常，整页回滚后重试。
         :return: (
             continue_crawl: bool, # 是否继续翻页 (对非全量爬取有效)
             increment_count: int, # 本页新增了多少条数据
@@ -176,9 +263,76 @@ class AbstractListSpider(BaseSpider):
         """
         pass
 
+    def get_existence_stats(self) -> dict | None:
+        """
+        (子类可选实现)
+        返回各目标的已入库总条数 {目标名称: 条数}，键与 get_target_name 一致。
+        应使用一条分组统计 (select_db_group_count_sql) 得到全部目标的结果。
+        返回 None 表示不统计 (监控中 existence 为空)。
+        """
+        return None
+
+    def is_page_in_window(self, target: dict, page_data: any) -> bool:
+        """
+        (子类可选实现)
+        不访问数据库判断本页是否仍在采集时间范围内 (延后入库时用于决定是否继续翻页)。
+        默认返回 True (继续翻页)。
+        """
+        return True
+
+    # --- 列表爬虫特有的辅助方法 (分区路由) ---
+
+    def select_hot_first(self, uow: UnitOfWork, field_list: list, build_factor) -> list | None:
+        """
+        按自然键查重: 非全量爬取时先追加 publish_time 热数据窗口条件 (只扫描热分区), 未命中再查全部分区
+        (已入库数据被网站改了发布日期, 或仍在列表中但早于热数据窗口时, 只查热分区会漏查而重复入库);
+        全量爬取或未配置 partition.hot_days 时直接查全部分区。
+        :param uow: 工作单元
+        :param field_list: 查询字段
+        :param build_factor: 返回自然键条件 SqlFactor 的函数 (每次查询新建一个)
+        :return: 查询结果
+        """
+        if self.hot_start_time:
+            factor_str, factor_args = build_factor().ge("publish_time", self.hot_start_time).build()
+            select_ret = uow.select(self.db_table, field_list, factor_str, factor_args)
+            if select_ret:
+                return select_ret
+
+        factor_str, factor_args = build_factor().build()
+        return uow.select(self.db_table, field_list, factor_str, factor_args)
+
     # --- 列表爬虫特有的辅助方法 (监控) ---
 
-    def handle_crawler_status_to_db(self, target: dict, total: int, increment: int, state: int, error_info: str):
+    def flush_crawler_status(self, status_list: list):
+        """
+        写入各目标的监控信息: 已入库总条数所有目标一次分组统计, 不逐目标 count
+        :param status_list: [(目标, 页面总条数, 新增数, 状态, 错误信息), ...]
+        """
+        if not status_list:
+            return
+
+        existence_dict = self.handle_existence_stats()
+        for target, page_total_count, increment_count, state, error_info in status_list:
+            existence = existence_dict.get(self.get_target_name(target))
+            if self.monitor_mysql_tool and self.db_monitor_table:
+                self.handle_crawler_status_to_db(target, page_total_count, increment_count, state, error_info,
+                                                 existence)
+            if self.get_monitor_api_condition(target):
+                self.handle_crawler_status_to_api(target, page_total_count, increment_count, state, error_info,
+                                                  existence)
+
+    def handle_existence_stats(self) -> dict:
+        """
+        获取各目标的已入库总条数，失败时返回空字典 (不影响监控写入)
+        """
+        try:
+            return self.get_existence_stats() or {}
+        except Exception as e:
+            logging.error(f"统计已入库总条数失败: {e}", exc_info=True)
+            return {}
+
+    def handle_crawler_status_to_db(self, target: dict, total: int, increment: int, state: int, error_info: str,
+                                    existence: int = None):
         """
         爬虫监控信息写入数据库 (原 csrc_gov_list 中的方法)
         """
@@ -188,24 +342,27 @@ class AbstractListSpider(BaseSpider):
 
         try:
             log_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            factor_str, factor_args = SqlFactor().eq("id", crawler_status_id).build()
             db, cs = self.monitor_mysql_tool.open_db_conn()
             self.monitor_mysql_tool.update_db_sql(
                 db, cs, self.db_monitor_table,
                 {
                     "total": total,
+                    "existence": existence,
                     "increment": increment,
                     "state": state,
                     "errorInfo": error_info,
                     "logTime": log_time
                 },
-                f"`id` = {crawler_status_id}"
+                factor_str, factor_args
             )
             self.monitor_mysql_tool.close_db_conn(db, cs)
             logging.info(f"数据库监控(ID:{crawler_status_id})更新成功")
         except Exception as e:
             logging.error(f"数据库监控(ID:{crawler_status_id})写入失败: {e}", exc_info=True)
 
-    def handle_crawler_status_to_api(self, target: dict, total: int, increment: int, state: int, error_info: str):
+    def handle_crawler_status_to_api(self, target: dict, total: int, increment: int, state: int, error_info: str,
+                                     existence: int = None):
         """
         爬虫监控信息写入API (原 csrc_gov_list 中的方法)
         """
@@ -217,7 +374,7 @@ class AbstractListSpider(BaseSpider):
             log_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             crawler_status = {
                 "total": total,
-                "existence": None,  # "existence" 在原代码中未被使用
+                "existence": existence,
                 "increment": increment,
                 "state": state,
                 "errorInfo": error_info,
@@ -0,0 +1,117 @@
+# 文件名: base_job.py
+# ---------------------
+# desc: 任务基类 (L1)
+#       - 封装配置注入、日志及数据库连接 (不请求网站、不上传的任务直接继承, 例如分区维护)
+#       - BaseSpider 在此之上再初始化 OBS、代理、发件箱、上传队列等爬虫工具
+# ---------------------
+from abc import ABCMeta, abstractmethod
+import datetime
+import logging
+import os
+from retrying import retry
+
+from csrc_gov.tools.log_tool import log_conf
+from csrc_gov.tools.mysql_tool import MysqlTool
+from csrc_gov.tools.sqlite_tool import SqliteTool
+from csrc_gov.tools.query_log_tool import query_log
+
+
+class BaseJob(metaclass=ABCMeta):
+    """
+    任务基类 (L1)
+    """
+    task_name = "未命名任务"
+
+    def __init__(self, project_config: dict, stage_name: str):
+        """
+        初始化基类
+        :param project_config: 一个 *已合并* 的配置字典 (见 BaseSpider)
+        :param stage_name:     当前实例化的阶段名, e.g., "partition_stage"
+        """
+        # 1. 存储配置
+        self.project_conf = project_config
+        self.stage_conf = project_config[stage_name]
+        self.connections = project_config.get("connections", {})
+        self.env_settings = project_config.get("env_settings", {})
+        self.task_name = f"{self.project_conf.get('project_name', 'Unnamed')} - {stage_name}"
+
+        # 2. 配置日志 (使用阶段配置)
+        log_conf(self.stage_conf["log_path"], self.stage_conf.get("log_file_path", "log.log"))
+        # 超过阈值(秒)的 SQL 写入慢查询日志
+        # 配置了 n_plus_one_threshold (环境配置) 时检测每个工作单元内的重复查询
+        query_log.configure(
+            slow_threshold=self.stage_conf.get("slow_query_threshold", 1.0),
+            slow_log_path=os.path.join(self.stage_conf["log_path"], "slow_query.log"),
+            n_plus_one_threshold=self.env_settings.get("n_plus_one_threshold", 0)
+        )
+
+        # 3. 初始化数据库连接 (使用注入的 connections)
+        self.mysql_tool = self._init_mysql_tool(self.connections.get("data_db"))
+        self.db_table = self.project_conf.get("db_table")
+
+    @retry(stop_max_attempt_number=3, wait_random_min=1000, wait_random_max=3000)
+    def _init_mysql_tool(self, db_conf: dict) -> MysqlTool | None:
+        """
+        根据传入的 *具体配置* 初始化数据库连接。
+        """
+        if not db_conf:
+            logging.warning(f"任务 {self.task_name} 未配置 'data_db' 连接。")
+            return None
+
+        # 本地离线运行: infrastructure.yml 中配置 db_engine: sqlite 时使用 sqlite 替身库
+        if db_conf.get("db_engine") == "sqlite":
+            logging.info(f"正在连接 sqlite 替身库: {db_conf.get('db_path')}")
+            return SqliteTool(
+                db_path=db_conf["db_path"],
+                bootstrap_path=db_conf.get("bootstrap_path")
+            )
+
+        logging.info(f"正在连接数据库: {db_conf.get('db_host')}/{db_conf.get('db_database')}")
+        return MysqlTool(
+            db_host=db_conf["db_host"],
+            db_port=db_conf["db_port"],
+            db_username=db_conf["db_username"],
+            db_password=db_conf["db_password"],
+            db_database=db_conf["db_database"],
+            ssh_host=db_conf.get("ssh_host"),
+            ssh_username=db_conf.get("ssh_username"),
+            ssh_password=db_conf.get("ssh_password"),
+            charset="utf8",
+            connect_timeout=db_conf.get("connect_timeout", 10),
+            read_timeout=db_conf.get("read_timeout"),
+            write_timeout=db_conf.get("write_timeout")
+        )
+
+    # --- 模板方法 ---
+    def run(self):
+        """
+        公开的执行入口 (模板方法): 日志、计时、错误处理及关闭数据库连接。
+        """
+        logging.info("=" * 50 + f"开始 {self.task_name}" + "=" * 50)
+        start_run_time = datetime.datetime.now()
+        logging.info(f"开始：{start_run_time.strftime('%Y-%m-%d %H:%M:%S')}")
+
+        try:
+            self._execute_task()
+        except Exception as e:
+            logging.error(f"{self.task_name} 未知错误 - {str(e)}", exc_info=True)
+        finally:
+            # 关闭mysql ssh连接
+            if self.mysql_tool:
+                self.mysql_tool.close_ssh_conn()
+
+            # 按调用位置汇总本次运行的 SQL 次数及耗时
+            logging.info(f"SQL 统计:\n{query_log.report()}")
+
+            end_run_time = datetime.datetime.now()
+            logging.info(f"结束：{end_run_time.strftime('%Y-%m-%d %H:%M:%S')}")
+            logging.info(f"总耗时：{end_run_time - start_run_time}")
+            logging.info("=" * 50 + f"结束 {self.task_name}" + "=" * 50)
+
+    @abstractmethod
+    def _execute_task(self):
+        """
+        抽象的执行任务方法。
+        子类必须实现此方法，写入自己核心的业务逻辑。
+        """
+        pass
\ No newline at end of file
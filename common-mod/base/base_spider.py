@@ -1,40 +1,45 @@
 # 文件名: base_spider.py
 # ---------------------
 # desc: 爬虫框架核心基类 (L1)
-#       - 封装配置注入、通用工具（DB, OBS, Proxy, Log...）
+#       - 继承 BaseJob (配置注入、日志、DB), 封装其余通用工具（OBS, Proxy...）
 #       - 封装通用网络 I/O (request, download, upload)
 # ---------------------
-from abc import ABCMeta, abstractmethod
 import datetime
 import json
 import logging
 import os
 import re
 import shutil
+import threading
 import time
 import uuid
 import urllib3
 import requests
 from retrying import retry
 
+from base_job import BaseJob
 # --- 导入所有通用工具 ---
-from csrc_gov.tools.log_tool import log_conf
-from csrc_gov.tools.mysql_tool import MysqlTool
+from csrc_gov.tools.batch_tool import BatchUpdateTool
+from csrc_gov.tools.lease_tool import LeaseTool
+from csrc_gov.tools.outbox_tool import OutboxTool
+from csrc_gov.tools.upload_queue_tool import UploadQueueTool
+from csrc_gov.tools.query_log_tool import query_log
 from csrc_gov.tools.obs_tool import OBSTool
+from csrc_gov.tools.local_obs_tool import LocalOBSTool
 from csrc_gov.tools.proxy_tool import ProxyTool
 from csrc_gov.tools.snow_tool import SnowTool
 from csrc_gov.tools.md5_tool import get_file_md5
+from csrc_gov.tools.sql_tool import SqlFactor
 from csrc_gov.tools.guise_tool import random_user_agent
 
 # 禁用 InsecureRequestWarning
 urllib3.disable_warnings()
 
 
-class BaseSpider(metaclass=ABCMeta):
+class BaseSpider(BaseJob):
     """
     爬虫框架核心基类 (L1)
     """
-    task_name = "未命名任务"
 
     def __init__(self, project_config: dict, stage_name: str):
         """
@@ -47,27 +52,22 @@ class BaseSpider(metaclass=ABCMeta):
                               - "env_settings": {"is_use_proxy": 0} (环境配置)
         :param stage_name:     当前实例化的阶段名, e.g., "list_stage"
         """
-        # 1. 存储配置
-        self.project_conf = project_config
-        self.stage_conf = project_config[stage_name]
-        self.connections = project_config.get("connections", {})
-        self.env_settings = project_config.get("env_settings", {})
-        self.task_name = f"{self.project_conf.get('project_name', 'Unnamed')} - {stage_name}"
-
-        # 2. 配置日志 (使用阶段配置)
-        log_conf(self.stage_conf["log_path"], self.stage_conf.get("log_file_path", "log.log"))
+        # 1~2. 存储配置、配置日志、初始化数据库连接 (见 BaseJob)
+        super().__init__(project_config, stage_name)
 
         # 3. 初始化通用工具 (使用注入的 connections)
-        self.mysql_tool = self._init_mysql_tool(self.connections.get("data_db"))
-        self.obs_tool = self._init_obs_tool(self.connections.get("storage"))
+        self.obs_tool = self._init_obs_tool(self.connections.get("storage"), self.stage_conf.get("obs_multipart"))
 
         # 这些工具可以保持原样，或在未来也改为从配置中获取URL
         self.proxy_tool = ProxyTool()
         self.snow_tool = SnowTool()
 
         # 4. 设置通用属性
-        self.db_table = self.project_conf.get("db_table")
         self.file_cache_path = self.stage_conf.get("file_cache_path", "./cache/default_cache/")
+        # 不超过该大小(MB)的文件在内存中计算MD5并上传, 不经过 file_cache_path (0 为始终落盘)
+        self.memory_upload_threshold = int(self.stage_conf.get("memory_upload_threshold_mb", 0) * 1024 * 1024)
+        # 上传前按内容 md5 去重 (未配置则始终上传)
+        self.upload_dedup_conf = self.stage_conf.get("upload_dedup") or {}
 
         # 5. 设置时间范围 (使用阶段配置)
         self.start_time, self.end_time = self._setup_time_range(
@@ -78,36 +78,41 @@ class BaseSpider(metaclass=ABCMeta):
         self.proxy_dict = self.read_cache_proxy()
         self.proxy_count = 0
 
-    @retry(stop_max_attempt_number=3, wait_random_min=1000, wait_random_max=3000)
-    def _init_mysql_tool(self, db_conf: dict) -> MysqlTool | None:
-        """
-        根据传入的 *具体配置* 初始化数据库连接。
-        """
-        if not db_conf:
-            logging.warning(f"任务 {self.task_name} 未配置 'data_db' 连接。")
-            return None
+        # 7. 本地写库发件箱 (使用阶段配置, 数据库慢或不可用时先落本地, 恢复后重放)
+        self.outbox_tool = self._init_outbox_tool(self.stage_conf.get("db_outbox"))
 
-        logging.info(f"正在连接数据库: {db_conf.get('db_host')}/{db_conf.get('db_database')}")
-        return MysqlTool(
-            db_host=db_conf["db_host"],
-            db_port=db_conf["db_port"],
-            db_username=db_conf["db_username"],
-            db_password=db_conf["db_password"],
-            db_database=db_conf["db_database"],
-            ssh_host=db_conf.get("ssh_host"),
-            ssh_username=db_conf.get("ssh_username"),
-            ssh_password=db_conf.get("ssh_password"),
-            charset="utf8"
-        )
+        # 任务完成标记的写后批量更新 (使用阶段配置, 未配置则逐条更新)
+        self.flag_update_tool = self._init_batch_update_tool(self.stage_conf.get("flag_update_batch"))
+
+        # 8. 多 worker 租约认领任务 (使用阶段配置, 未配置则一次性查询全部任务)
+        self.lease_tool = self._init_lease_tool(self.stage_conf.get("task_claim"))
+        # 已交给后台 (上传队列、渲染池) 继续处理的任务, 由后台完成回调结束租约
+        self.deferred_task_set = set()
+        self.deferred_task_lock = threading.Lock()
 
-    def _init_obs_tool(self, obs_conf: dict) -> OBSTool | None:
+        # 9. 后台上传队列 (使用阶段配置, 未配置则同步上传)
+        self.upload_queue_tool = self._init_upload_queue_tool(self.stage_conf.get("upload_queue"))
+
+    def _init_obs_tool(self, obs_conf: dict, multipart_conf: dict = None) -> OBSTool | None:
         """
         根据传入的 *具体配置* 初始化OBS工具。
+        multipart_conf 为阶段的分段上传配置 (未配置则始终整体上传)。
         """
         if not obs_conf:
             logging.warning(f"任务 {self.task_name} 未配置 'storage' 连接。")
             return None
 
+        # 本地离线运行: infrastructure.yml 中配置 backend: local 时使用本地目录替身OBS
+        if obs_conf.get("backend") == "local":
+            return LocalOBSTool(
+                obs_conf["root_path"],
+                obs_conf.get("bt", "local-bucket"),
+                obs_conf.get("fd", ""),
+                bandwidth_mbps=obs_conf.get("bandwidth_mbps"),
+                latency_ms=obs_conf.get("latency_ms", 0),
+                **self._get_obs_multipart_kwargs(multipart_conf)
+            )
+
         logging.info(f"正在连接OBS: {obs_conf.get('sv')}/{obs_conf.get('bt')}")
         return OBSTool(
             obs_conf["ak"],
@@ -115,8 +120,158 @@ class BaseSpider(metaclass=ABCMeta):
             obs_conf["sv"],
             obs_conf["bt"],
             obs_conf["fd"],
+            **self._get_obs_multipart_kwargs(multipart_conf)
+        )
+
+    @staticmethod
+    def _get_obs_multipart_kwargs(multipart_conf: dict) -> dict:
+        """
+        分段上传配置转换为 OBSTool 参数 (大小以 MB 配置)。
+        """
+        if not multipart_conf:
+            return {}
+
+        return {
+            "multipart_threshold": int(multipart_conf.get("threshold_mb", 20) * 1024 * 1024),
+            "part_size": int(multipart_conf.get("part_size_mb", 9) * 1024 * 1024),
+            "task_num": multipart_conf.get("task_num", 4),
+            "checkpoint_path": multipart_conf.get("checkpoint_path", "./cache/obs_checkpoint_cache/")
+        }
+
+    def _init_batch_update_tool(self, batch_conf: dict) -> BatchUpdateTool | None:
+        """
+        根据阶段配置初始化写后批量更新工具。
+        """
+        if not batch_conf or not self.mysql_tool:
+            return None
+
+        return BatchUpdateTool(
+            self.mysql_tool,
+            self.db_table,
+            key_field="id",
+            batch_size=batch_conf.get("batch_size", 50),
+            flush_interval=batch_conf.get("flush_interval", 30),
+            journal_path=batch_conf.get("journal_path"),
+            outbox_tool=self.outbox_tool,
+            retry_interval=batch_conf.get("retry_interval", 30)
         )
 
+    def _init_outbox_tool(self, outbox_conf: dict) -> OutboxTool | None:
+        """
+        根据阶段配置初始化本地写库发件箱。
+        """
+        if not outbox_conf or not self.mysql_tool:
+            return None
+
+        return OutboxTool(
+            self.mysql_tool,
+            outbox_conf["outbox_path"],
+            batch_size=outbox_conf.get("batch_size", 100),
+            slow_threshold=outbox_conf.get("slow_threshold", 5.0),
+            retry_interval=outbox_conf.get("retry_interval", 30),
+            max_attempts=outbox_conf.get("max_attempts", 5)
+        )
+
+    def _init_lease_tool(self, claim_conf: dict) -> LeaseTool | None:
+        """
+        根据阶段配置初始化租约认领工具。
+        """
+        if not claim_conf or not self.mysql_tool:
+            return None
+
+        lease_tool = LeaseTool(
+            self.mysql_tool,
+            self.db_table,
+            key_field="id",
+            batch_size=claim_conf.get("batch_size", 20),
+            lease_seconds=claim_conf.get("lease_seconds", 600),
+            retry_backoff=claim_conf.get("retry_backoff", 300)
+        )
+        logging.info(f"已开启租约认领任务: worker={lease_tool.worker_id}")
+        return lease_tool
+
+    def _init_upload_queue_tool(self, queue_conf: dict) -> UploadQueueTool | None:
+        """
+        根据阶段配置初始化后台上传队列。
+        """
+        if not queue_conf:
+            return None
+
+        upload_queue_tool = UploadQueueTool(
+            worker_number=queue_conf.get("worker_number", 4),
+            queue_size=queue_conf.get("queue_size", 16)
+        )
+        logging.info(f"已开启后台上传队列: {upload_queue_tool.worker_number} 个上传线程")
+        return upload_queue_tool
+
+    def iter_db_task_batches(self, factor_str: str, factor_args: tuple):
+        """
+        按批次产出待处理任务。
+        开启租约认领时逐批认领直到无可认领任务, 否则一次性查询全部任务。
+        (认领为空可能是与其他 worker 竞争失败, 统计可认领条数为 0 后才结束)
+        """
+        if self.lease_tool:
+            while True:
+                data_list = self.lease_tool.claim(factor_str, factor_args)
+                if data_list is None:
+                    return
+                if data_list:
+                    yield data_list
+                    continue
+
+                claimable_count = self.lease_tool.count_claimable(factor_str, factor_args)
+                if not claimable_count:
+                    return
+                logging.info(f"本次认领为空，仍有 {claimable_count} 条可认领任务，重新认领")
+                time.sleep(1)
+
+        db, cs = self.mysql_tool.open_db_conn()
+        data_list = self.mysql_tool.select_db_sql(
+            db, cs, self.db_table, [], factor_str, factor_args
+        )
+        self.mysql_tool.close_db_conn(db, cs)
+        if data_list is None:
+            logging.error("从数据库查询任务失败。")
+            return
+        yield data_list
+
+    def defer_claimed_task(self, row_id):
+        """
+        任务交给后台 (上传队列、渲染池) 继续处理: 工作流中的 finish_claimed_task 不再结束该任务,
+        由后台完成回调调用 finish_deferred_task; 结束前租约保持认领并随心跳续约。
+        须在提交到后台之前调用 (提交失败时调用 finish_deferred_task 撤销)。
+        """
+        if not self.lease_tool:
+            return
+        with self.deferred_task_lock:
+            self.deferred_task_set.add(row_id)
+
+    def finish_claimed_task(self, row_id, success: bool):
+        """
+        开启租约认领时: 成功的任务写入完成标记 (本次运行不再认领), 失败的任务释放租约并退避。
+        已交给后台继续处理的任务跳过 (见 defer_claimed_task)。
+        """
+        if not self.lease_tool:
+            return
+        with self.deferred_task_lock:
+            if row_id in self.deferred_task_set:
+                self.deferred_task_set.discard(row_id)
+                return
+        self.finish_deferred_task(row_id, success)
+
+    def finish_deferred_task(self, row_id, success: bool):
+        """
+        后台完成回调: 结束已交给后台的任务 (同一任务只有第一次结束生效)。
+        """
+        if not self.lease_tool:
+            return
+        with self.deferred_task_lock:
+            self.deferred_task_set.discard(row_id)
+        if success:
+            self.lease_tool.complete(row_id)
+        else:
+            self.lease_tool.release(row_id)
+
     def _setup_time_range(self, update_extent_days: int) -> (str, str):
         """
         设置并返回 (start_time, end_time)
@@ -140,30 +295,44 @@ class BaseSpider(metaclass=ABCMeta):
         try:
             # 准备文件缓存
             self.create_file_cache()
+            # 先重放上次运行遗留的发件箱记录
+            if self.outbox_tool:
+                self.outbox_tool.drain()
             # 执行子类定义的具体任务
             self._execute_task()
         except Exception as e:
             logging.error(f"{self.task_name} 未知错误 - {str(e)}", exc_info=True)
         finally:
+            # 等待后台上传完成 (完成回调会写入任务完成标记, 须在写库和清理缓存之前; 等待期间为未结束的任务续约)
+            if self.upload_queue_tool:
+                self.upload_queue_tool.shutdown(self.lease_tool.heartbeat if self.lease_tool else None)
+            # 写入剩余的租约完成标记
+            if self.lease_tool:
+                self.lease_tool.close()
+            # 写入剩余的任务完成标记 (失败时保留在本地日志, 下次启动重放)
+            if self.flag_update_tool:
+                self.flag_update_tool.close()
+            # 重放发件箱 (数据库仍不可用时保留在本地, 下次启动重放)
+            if self.outbox_tool:
+                if not self.outbox_tool.drain():
+                    logging.warning(f"发件箱剩余 {self.outbox_tool.pending_count()} 条未重放，下次运行时重放")
+                self.outbox_tool.close()
             # 清理文件缓存
             self.clear_file_cache()
             # 关闭mysql ssh连接
             if self.mysql_tool:
                 self.mysql_tool.close_ssh_conn()
 
+            # 按调用位置汇总本次运行的 SQL 次数及耗时
+            logging.info(f"SQL 统计:\n{query_log.report()}")
+            if query_log.n_plus_one_threshold:
+                logging.info(f"N+1 查询检测:\n{query_log.report_n_plus_one()}")
+
             end_run_time = datetime.datetime.now()
             logging.info(f"结束：{end_run_time.strftime('%Y-%m-%d %H:%M:%S')}")
             logging.info(f"总耗时：{end_run_time - start_run_time}")
             logging.info("=" * 50 + f"结束 {self.task_name}" + "=" * 50)
 
-    @abstractmethod
-    def _execute_task(self):
-        """
-        抽象的执行任务方法。
-        子类必须实现此方法，写入自己核心的业务逻辑。
-        """
-        pass
-
     # --- 通用网络 I/O 方法 ---
 
     def _make_request(self, method: str, url: str, **kwargs) -> requests.Response | None:
@@ -222,6 +391,19 @@ class BaseSpider(metaclass=ABCMeta):
         """
         一个通用的文件下载器，处理代理、重试和网络异常。
         """
+        resp_content = self.download_content_generic(url)
+        if resp_content is None:
+            return False
+
+        with open(save_path, "wb") as f:
+            f.write(resp_content)
+        logging.info(f"下载成功: {url} -> {save_path}")
+        return True
+
+    def download_content_generic(self, url: str) -> bytes | None:
+        """
+        通用的内存下载器 (同 download_file_generic, 返回文件内容, 不落盘)。
+        """
         headers = {"User-Agent": random_user_agent()}
 
         retry_number = self.stage_conf.get("get_proxy_retry_number", 3)
@@ -251,10 +433,7 @@ class BaseSpider(metaclass=ABCMeta):
                     if len(resp_content) < 1024 * 1:  # 简单校验
                         raise Exception(f"文件异常 (小于1KB): {url}")
 
-                    with open(save_path, "wb") as f:
-                        f.write(resp_content)
-                    logging.info(f"下载成功: {url} -> {save_path}")
-                    return True
+                    return resp_content
                 else:
                     logging.warning(f"下载失败 (状态码: {resp.status_code}): {url}")
                     if "Auth Failed" in resp.text:
@@ -271,23 +450,27 @@ class BaseSpider(metaclass=ABCMeta):
 
             except Exception as e:
                 logging.error(f"下载文件失败: {url}，错误: {e}", exc_info=True)
-                return False
+                return None
 
         logging.error(f"下载失败: {url} (已达最大重试次数)")
-        return False
+        return None
 
-    def upload_to_obs(self, local_file_path: str, obs_object_name: str) -> str | None:
+    def upload_to_obs(self, local_file_path: str, obs_object_name: str, file_md5: str = None) -> str | None:
         """
         一个通用的OBS上传器。
+        配置了 obs_multipart 时, 大文件分段并发上传 (支持断点续传)。
+        传入 file_md5 时写入对象自定义元数据 (供去重校验), 并作为分段上传断点续传的文件标识。
         """
         if not self.obs_tool:
             logging.error("OBSTool 未初始化，无法上传")
             return None
 
         try:
-            success = self.obs_tool.upload_file(
+            success = self.obs_tool.upload_file_auto(
                 obs_object_name,
-                local_file_path
+                local_file_path,
+                {"md5": file_md5} if file_md5 else None,
+                checkpoint_key=file_md5
             )
             if success:
                 obs_path = self.obs_tool.base + obs_object_name
@@ -300,6 +483,161 @@ class BaseSpider(metaclass=ABCMeta):
             logging.error(f"OBS上传时发生异常: {e}", exc_info=True)
             return None
 
+    def is_memory_upload(self, content_size: int) -> bool:
+        """
+        该大小的文件是否走内存上传路径 (超过阈值时落盘, 由 upload_to_obs 按大小分段上传)。
+        """
+        return 0 < content_size <= self.memory_upload_threshold
+
+    def upload_content_to_obs(self, content: bytes, obs_object_name: str, file_md5: str = None) -> str | None:
+        """
+        通用的OBS内存上传器 (putContent, 不经过本地文件)。
+        """
+        if not self.obs_tool:
+            logging.error("OBSTool 未初始化，无法上传")
+            return None
+
+        try:
+            if self.obs_tool.upload_text(obs_object_name, content, {"md5": file_md5} if file_md5 else None):
+                obs_path = self.obs_tool.base + obs_object_name
+                logging.info(f"OBS上传成功: <内存 {len(content)} 字节> -> {obs_path}")
+                return obs_path
+            else:
+                logging.error(f"OBS上传失败: {obs_object_name}")
+                return None
+        except Exception as e:
+            logging.error(f"OBS上传时发生异常: {e}", exc_info=True)
+            return None
+
+    def build_object_name(self, prefix: str, file_md5: str, file_ext: str, file_size: int = 0) -> str:
+        """
+        生成新的OBS对象名: 配置了 upload_dedup.md5_object_key 时以内容 md5 命名 (相同内容得到相同对象名),
+        否则以 uuid 命名。
+        分段上传的大文件始终以内容 md5 命名 (断点续传要求重试时对象名不变)。
+        """
+        if self.upload_dedup_conf.get("md5_object_key") or (
+                self.obs_tool and self.obs_tool.is_multipart_size(file_size)):
+            return f"{prefix}/{file_md5}.{file_ext}"
+        return f"{prefix}/{str(uuid.uuid1()).replace('-', '')}.{file_ext}"
+
+    @staticmethod
+    def is_shared_object_stale(obs_object_name: str, old_file_md5: str, file_md5: str) -> bool:
+        """
+        记录已有的对象以旧内容 md5 命名 (可能被相同内容的其他记录复用) 且内容已变化:
+        不能覆盖该对象, 须按新内容重新生成对象名。
+        """
+        if not old_file_md5 or old_file_md5 == file_md5:
+            return False
+        return os.path.splitext(os.path.basename(obs_object_name))[0] == old_file_md5
+
+    def find_existing_obs_path(self, file_md5: str, obs_object_name: str) -> str | None:
+        """
+        按内容 md5 查找已上传的对象:
+            1. check_table: 表中已有相同 file_md5 且已上传的记录, 复用其 obs_path
+               (只复用以内容 md5 命名的对象; uuid 命名的对象属于单条记录, 重新渲染或下载时会被覆盖)
+            2. check_obs: 目标对象已存在且内容 md5 一致 (重试或 md5 对象名)
+        :return: 已有的 obs_path, 未找到返回 None
+        """
+        if not self.upload_dedup_conf or not file_md5:
+            return None
+
+        try:
+            if self.upload_dedup_conf.get("check_table", True) and self.mysql_tool:
+                factor_str, factor_args = (
+                    SqlFactor()
+                    .eq("file_md5", file_md5)
+                    .eq("flag", 1)
+                    .eq("is_delete", 0)
+                    .raw("`obs_path` like %s", f"%/{file_md5}.%")
+                    .limit(1)
+                    .build()
+                )
+                db, cs = self.mysql_tool.open_db_conn()
+                ret = self.mysql_tool.select_db_sql(db, cs, self.db_table, ["obs_path"], factor_str, factor_args)
+                self.mysql_tool.close_db_conn(db, cs)
+                if ret:
+                    return ret[0]["obs_path"]
+
+            if self.upload_dedup_conf.get("check_obs", True) and self.obs_tool:
+                if self.obs_tool.get_object_md5(obs_object_name) == file_md5:
+                    return self.obs_tool.base + obs_object_name
+        except Exception as e:
+            logging.error(f"上传去重查询失败 (继续上传): {e}", exc_info=True)
+        return None
+
+    def upload_to_obs_dedup(self, file_md5: str, obs_object_name: str, local_file_path: str = None,
+                            content: bytes = None) -> str | None:
+        """
+        上传前按内容 md5 去重: 已存在相同内容时复用已有 obs_path 并跳过上传,
+        否则上传 content (内存) 或 local_file_path (本地文件)。
+        """
+        obs_path = self.find_existing_obs_path(file_md5, obs_object_name)
+        if obs_path:
+            logging.info(f"内容已存在 (md5={file_md5})，跳过上传: {obs_path}")
+            return obs_path
+
+        if content is not None:
+            return self.upload_content_to_obs(content, obs_object_name, file_md5)
+        return self.upload_to_obs(local_file_path, obs_object_name, file_md5)
+
+    def submit_upload_task(self, row_id, db_dict: dict, file_md5: str, obs_object_name: str,
+                           local_file_path: str = None, content: bytes = None) -> bool:
+        """
+        上传文件并保存任务结果 (上传成功后 obs_path 并入 db_dict, 再调用 save_task_result)。
+        配置了 upload_queue 时提交到后台上传队列 (队列满时阻塞), 任务交给队列结束:
+        完成回调在上传写库成功时写入完成标记, 失败 (含任务异常) 时释放租约; 否则同步执行。
+        :return: 同步执行时为是否成功; 提交到后台队列时为 True
+        """
+        if not self.upload_queue_tool:
+            return self.upload_and_save_task(row_id, db_dict, file_md5, obs_object_name, local_file_path, content)
+
+        self.defer_claimed_task(row_id)
+        try:
+            self.upload_queue_tool.submit(
+                self.upload_and_save_task, row_id, db_dict, file_md5, obs_object_name, local_file_path, content,
+                callback=lambda success: self.finish_deferred_task(row_id, success)
+            )
+        except Exception:
+            self.finish_deferred_task(row_id, False)
+            raise
+        return True
+
+    def upload_and_save_task(self, row_id, db_dict: dict, file_md5: str, obs_object_name: str,
+                             local_file_path: str = None, content: bytes = None) -> bool:
+        """
+        上传 (按内容去重) 并保存任务结果。
+        """
+        obs_path = self.upload_to_obs_dedup(file_md5, obs_object_name, local_file_path=local_file_path,
+                                            content=content)
+        if not obs_path:
+            logging.error(f"上传失败，数据库未更新: id={row_id}")
+            return False
+
+        if self.save_task_result(row_id, dict(db_dict, obs_path=obs_path)):
+            logging.info(f"数据库更新已提交: id={row_id}")
+            return True
+        logging.error(f"数据库更新失败: id={row_id}")
+        return False
+
+    def save_task_result(self, row_id, db_dict: dict):
+        """
+        保存任务完成结果 (obs_path, file_md5, flag 等)。
+        配置了 flag_update_batch 时写入写后缓冲, 否则立即逐条更新。
+        配置了 db_outbox 时经发件箱写库 (数据库慢或不可用时先落本地)。
+        """
+        if self.flag_update_tool:
+            self.flag_update_tool.add(row_id, db_dict)
+            return True
+
+        factor_str, factor_args = SqlFactor().eq("id", row_id).build()
+        if self.outbox_tool:
+            return self.outbox_tool.update(self.db_table, db_dict, factor_str, factor_args)
+
+        db, cs = self.mysql_tool.open_db_conn()
+        ret = self.mysql_tool.update_db_sql(db, cs, self.db_table, db_dict, factor_str, factor_args)
+        self.mysql_tool.close_db_conn(db, cs)
+        return ret
+
     # --- 通用辅助方法 (Cache, Proxy, Snow) ---
 
     @retry(stop_max_attempt_number=5, wait_random_min=1000, wait_random_max=3000)
@@ -0,0 +1,46 @@
+# 文件名: partition_job.py
+# ---------------------
+# desc: 分区维护任务 (L2)
+#       - 继承 BaseJob (只连接数据库, 不初始化 OBS、代理、发件箱、上传队列等爬虫工具)
+#       - 按月预建未来分区、将整年过期的月分区合并为年分区
+# ---------------------
+from base_job import BaseJob
+import logging
+from csrc_gov.tools.partition_tool import PartitionTool
+
+
+class PartitionJob(BaseJob):
+    """
+    数据表 publish_time 按月分区的维护任务 (每月由 shell/csrc_gov_partition.sh 定时执行, 不在采集流程中)。
+    分区布局由 sql/ 下的迁移脚本初始化。
+    """
+    task_name = "分区维护"
+
+    def __init__(self, project_config: dict):
+        """
+        初始化分区维护任务
+        :param project_config: 已合并的配置字典
+        """
+        # 1. 调用父类__init__，硬编码 stage_name 为 "partition_stage"
+        super().__init__(project_config, "partition_stage")
+
+        # 2. 分区维护特有的配置
+        self.hot_months = self.stage_conf.get("hot_months", 6)
+        self.future_months = self.stage_conf.get("future_months", 3)
+
+        self.partition_tool = PartitionTool(self.mysql_tool, self.db_table) if self.mysql_tool else None
+
+    def _execute_task(self):
+        """
+        (已实现) 分区轮转
+        """
+        if not self.partition_tool:
+            logging.error("数据库未初始化，无法维护分区")
+            return
+
+        logging.info(f"开始维护分区: 表 {self.db_table}，热数据 {self.hot_months} 个月，预建 {self.future_months} 个月")
+        if self.partition_tool.rotate(self.hot_months, self.future_months):
+            logging.info("分区维护完成")
+        else:
+            logging.error("分区维护失败或表未分区")
+        logging.info(f"当前分区: {[name for name, _ in self.partition_tool.get_partition_list()]}")
\ No newline at end of file
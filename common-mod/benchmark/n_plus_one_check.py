@@ -0,0 +1,186 @@
+# 文件名: benchmark/n_plus_one_check.py
+# ---------------------
+# desc: N+1 查询回归检查
+#       - 以检测模式运行指定项目的指定阶段 (强制 local 环境: sqlite 替身库 + 本地替身OBS, 否则拒绝运行)
+#       - 网站请求只从录制的夹具目录回放, 未录制的请求直接失败 (不联网); 其他外部服务 (监控接口等) 一律不请求
+#       - 任一工作单元 (页/任务) 内同一 SQL 形态超过阈值即以非 0 退出
+#       用法 (在 common-mod 目录下): python3 -m benchmark.n_plus_one_check csrc_gov list 5
+#       录制夹具 (请求网站, 只写本地): python3 -m benchmark.n_plus_one_check csrc_gov list 5 --record
+# ---------------------
+import sys
+import json
+import time
+import hashlib
+import logging
+import itertools
+import os
+import urllib.parse
+from contextlib import contextmanager
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from main import load_config, get_spider_class
+from csrc_gov.tools.query_log_tool import query_log
+
+# 夹具目录: {FIXTURE_PATH}{项目名}_{阶段名}/
+FIXTURE_PATH = "./benchmark/fixture/"
+
+
+class RecordedFixture(object):
+    """
+    按 (method, url, params, data) 录制/回放网站响应, 每个请求一个 .json (状态码/编码/头) 及一个 .body (原始字节)
+    """
+
+    def __init__(self, fixture_dir_path: str, allow_host_list: list, record: bool = False):
+        """
+        :param fixture_dir_path: 夹具目录
+        :param allow_host_list: 可录制的网站域名 (其他域名的请求一律失败)
+        :param record: 为 True 时请求网站并录制, 否则只回放
+        """
+        self.fixture_dir_path = fixture_dir_path
+        self.allow_host_list = allow_host_list
+        self.record = record
+        self.hit_count = 0
+        self.miss_count = 0
+        self.blocked_count = 0
+
+    @staticmethod
+    def get_key(method: str, url: str, params=None, data=None) -> str:
+        return hashlib.sha1(json.dumps(
+            [method.upper(), url, params, data], ensure_ascii=False, sort_keys=True, default=str
+        ).encode("utf8")).hexdigest()
+
+    def load(self, key: str) -> requests.Response | None:
+        meta_path = os.path.join(self.fixture_dir_path, key + ".json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf8") as f:
+            meta_dict = json.load(f)
+        with open(os.path.join(self.fixture_dir_path, key + ".body"), "rb") as f:
+            content = f.read()
+
+        resp = requests.Response()
+        resp.status_code = meta_dict["status_code"]
+        resp.url = meta_dict["url"]
+        resp.encoding = meta_dict["encoding"]
+        resp.headers = CaseInsensitiveDict(meta_dict["headers"])
+        resp._content = content
+        return resp
+
+    def save(self, key: str, resp: requests.Response):
+        os.makedirs(self.fixture_dir_path, exist_ok=True)
+        with open(os.path.join(self.fixture_dir_path, key + ".body"), "wb") as f:
+            f.write(resp.content)
+        with open(os.path.join(self.fixture_dir_path, key + ".json"), "w", encoding="utf8") as f:
+            json.dump({
+                "status_code": resp.status_code,
+                "url": resp.url,
+                "encoding": resp.encoding,
+                "headers": dict(resp.headers)
+            }, f, ensure_ascii=False)
+
+    @contextmanager
+    def install(self):
+        """
+        替换 requests 的请求入口 (requests.get/post/request 均经过 Session.request), 退出时恢复
+        """
+        origin_request = requests.Session.request
+        fixture = self
+
+        def request(session, method, url, params=None, data=None, **kwargs):
+            host = urllib.parse.urlparse(url).hostname or ""
+            if host not in fixture.allow_host_list:
+                fixture.blocked_count += 1
+                raise requests.exceptions.ConnectionError(f"N+1 检查不请求外部服务: {url}")
+
+            key = fixture.get_key(method, url, params, data)
+            if not fixture.record:
+                resp = fixture.load(key)
+                if resp is None:
+                    fixture.miss_count += 1
+                    raise requests.exceptions.ConnectionError(f"夹具中没有该请求 (需先 --record 录制): {method} {url}")
+                fixture.hit_count += 1
+                return resp
+
+            resp = origin_request(session, method, url, params=params, data=data, **kwargs)
+            fixture.save(key, resp)
+            return resp
+
+        requests.Session.request = request
+        try:
+            yield self
+        finally:
+            requests.Session.request = origin_request
+
+
+def check_local_connections(connections: dict) -> bool:
+    """
+    只允许 sqlite 替身库及本地替身OBS
+    """
+    for conn_name in ("data_db", "monitor_db"):
+        db_conf = connections.get(conn_name)
+        if db_conf and db_conf.get("db_engine") != "sqlite":
+            logging.error(f"N+1 检查只能使用 sqlite 替身库, {conn_name} 不是 sqlite, 拒绝运行")
+            return False
+    if not connections.get("data_db"):
+        logging.error("N+1 检查未配置 sqlite 替身库 (local 环境的 data_db), 拒绝运行")
+        return False
+    storage_conf = connections.get("storage")
+    if storage_conf and storage_conf.get("backend") != "local":
+        logging.error("N+1 检查只能使用本地替身OBS, storage 不是 local, 拒绝运行")
+        return False
+    return True
+
+
+def run_check(project_name: str, stage_name: str, threshold: int, record: bool = False) -> int:
+    """
+    运行阶段并检查 N+1 告警
+    :return: 退出码 (0 无告警, 1 有告警, 2 无法运行)
+    """
+    final_config = load_config(project_name, environment="local")
+    if not final_config or not check_local_connections(final_config["connections"]):
+        return 2
+
+    fixture_dir_path = os.path.join(FIXTURE_PATH, f"{project_name}_{stage_name}")
+    if not record and not os.path.isdir(fixture_dir_path):
+        logging.error(f"夹具目录不存在: {fixture_dir_path} (需先 --record 录制), 拒绝运行")
+        return 2
+
+    SpiderClass = get_spider_class(project_name, stage_name)
+    if not SpiderClass:
+        return 2
+
+    website_host = urllib.parse.urlparse(final_config.get("website_base_url", "")).hostname
+    fixture = RecordedFixture(fixture_dir_path, [website_host] if website_host else [], record=record)
+
+    # 强制打开检测 (BaseSpider 初始化时读取)
+    final_config["env_settings"]["n_plus_one_threshold"] = threshold
+    with fixture.install():
+        spider_instance = SpiderClass(project_config=final_config)
+        # 雪花ID服务不在夹具内, 本地生成 (毫秒时间戳起的递增序号, 不与替身库中已有的ID冲突)
+        snow_id_iter = itertools.count(int(time.time() * 1000) * 1000)
+        spider_instance.snow_tool.get_snow_id = lambda: str(next(snow_id_iter))
+        spider_instance.run()
+    logging.info(f"夹具: 回放 {fixture.hit_count} 个请求, 未录制 {fixture.miss_count} 个, "
+                 f"拦截外部服务 {fixture.blocked_count} 个")
+
+    if query_log.violation_list:
+        logging.error(f"N+1 查询检查未通过 ({project_name} {stage_name}, 阈值 {threshold}):\n"
+                      f"{query_log.report_n_plus_one()}")
+        return 1
+
+    logging.info(f"N+1 查询检查通过 ({project_name} {stage_name}, 阈值 {threshold})")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    arg_list = [arg for arg in sys.argv[1:] if arg != "--record"]
+    if len(arg_list) < 2:
+        print("用法: python3 -m benchmark.n_plus_one_check [项目名] [阶段名] [阈值, 默认5] [--record]")
+        sys.exit(2)
+
+    sys.exit(run_check(arg_list[0], arg_list[1], int(arg_list[2]) if len(arg_list) > 2 else 5,
+                       record="--record" in sys.argv))
\ No newline at end of file
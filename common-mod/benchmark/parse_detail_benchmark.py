@@ -0,0 +1,216 @@
+# 文件名: benchmark/parse_detail_benchmark.py
+# ---------------------
+# desc: 详情页清洗微基准 (原多次 XPath 清洗 vs DetailCleaner 单次遍历)
+#       - 直接对样本HTML调用 DetailCleaner (不创建爬虫实例, 不连接数据库/OBS, 不请求网站)
+#       - 样本为 N+1 检查录制的详情页夹具 (benchmark/fixture/{项目名}_detail/), 未录制时使用内置样本页
+#       - 每个样本交替执行两种实现各 rounds 次, 对比每页平均耗时
+#       - 同时核对两种实现的附件列表及正文文本是否一致
+#       用法 (在 common-mod 目录下): python3 -m benchmark.parse_detail_benchmark csrc_gov 50 20
+# ---------------------
+import os
+import re
+import sys
+import json
+import time
+import logging
+import urllib.parse
+
+from lxml import etree
+from lxml.html import tostring
+
+from main import load_config
+from csrc_gov.tools.html_clean_tool import DetailCleaner
+from benchmark.n_plus_one_check import FIXTURE_PATH
+
+# 内置样本页 (详情页结构: 标题、附件区、正文附件链接、图片、字体、信息公开表格)
+SAMPLE_URL = "http://www.csrc.gov.cn/beijing/c103543/c1234567/content.shtml"
+SAMPLE_HTML = """<html><head><title>样本</title></head><body>
+<div class="content">
+  <h2>关于对某某公司采取出具警示函措施的决定</h2>
+  <div class="xxgk-table"><table><tr><td>索引号</td><td>bm56000001/2026-00001</td></tr></table></div>
+  <div class="detail-news">
+    <p><font face="仿宋" style="font-family: 仿宋;">当事人：某某公司，住所：北京市西城区。</font></p>
+    <p style="font-family: 宋体;">经查，你公司存在以下违规行为：%E8%BF%9D%E8%A7%84%E4%BA%8B%E9%A1%B9。</p>
+    <p><img src="/beijing/c103543/c1234567/images/sample.png"><img src="http://www.csrc.gov.cn/a.jpg"></p>
+    <p><a href="/beijing/c103543/c1234567/files/附件1.pdf">附件1：处罚决定书</a></p>
+    <p><a href="http://www.csrc.gov.cn/other.shtml">相关链接</a></p>
+  </div>
+  <div id="files" style="display:none">
+    <a href="files/附件2.docx">附件2：整改报告.docx</a>
+    <a href="/video/sample.mp4">视频</a>
+    <a href="files/空白.pdf"> </a>
+  </div>
+  <div class="xxgk-down-box"><a href="#">下载</a></div>
+</div>
+</body></html>"""
+
+
+def legacy_clean(data_str: str, detail_url: str, website_base_url: str) -> (list, str):
+    """
+    原 csrc_gov_detail.py parse_detail_page 的清洗逻辑 (基准, 不含模板拼接)
+    :return: (附件列表, 正文html)
+    """
+    url_head = detail_url[:detail_url.rfind("/") + 1]
+    tree = etree.HTML(data_str)
+    content_str = ""
+    file_info_list = []
+
+    for content in tree.xpath('//div[@class="content"]'):
+        h2_list = content.xpath('.//h2')
+        if not h2_list:
+            continue
+        h2_list[0].getparent().remove(h2_list[0])
+
+        for files in content.xpath('.//div[@id="files"]'):
+            if files.xpath("./@style"):
+                files.attrib.pop("style")
+
+        for files_a in content.xpath('.//div[@id="files"]/a'):
+            href_list = files_a.xpath('./@href')
+            title_list = files_a.xpath('.//text()')
+            if not href_list or not title_list:
+                continue
+            href, title = href_list[0], "".join(title_list).strip()
+            if "http" not in href:
+                href = href[1:] if href.startswith("/") else href
+                href = (website_base_url if href.endswith((".mp4", ".MP4")) else url_head) + href
+            file_info_list.append((href, title))
+
+        for detail_news_a in content.xpath('.//div[@class="detail-news"]//a'):
+            href_list = detail_news_a.xpath('./@href')
+            title_list = detail_news_a.xpath('.//text()')
+            if not href_list or not title_list or "/files/" not in href_list[0]:
+                continue
+            href, title = href_list[0], "".join(title_list).strip()
+            if "http" not in href:
+                href = href[1:] if href.startswith("/") else href
+                href = (website_base_url if href.endswith((".mp4", ".MP4")) else url_head) + href
+            file_info_list.append((href, title))
+
+        for content_a in content.xpath('.//a'):
+            if content_a.xpath('./@href'):
+                content_a.attrib["href"] = "javascript:void(0);"
+
+        for img in content.xpath('.//img'):
+            src_list = img.xpath('./@src')
+            if not src_list:
+                continue
+            src = src_list[0]
+            if "http" not in src:
+                src = url_head + (src[1:] if src.startswith("/") else src)
+            img.attrib["src"] = src
+
+        for font in content.xpath('.//font'):
+            if font.xpath("./@face"):
+                font.attrib.pop("face")
+
+        for xxgk_table in content.xpath('.//div[@class="xxgk-table"]'):
+            xxgk_table.getparent().remove(xxgk_table)
+        for xxgk_down_box in content.xpath('.//div[@class="xxgk-down-box"]'):
+            xxgk_down_box.getparent().remove(xxgk_down_box)
+        content_str += tostring(content, encoding="utf8", method="html").decode("utf8")
+
+    content_str = re.sub(r'font-family(.*?);', "", content_str)
+    content_str = urllib.parse.unquote(content_str)
+    return list(set(file_info_list)), content_str
+
+
+def engine_clean(cleaner: DetailCleaner, data_str: str, detail_url: str) -> (list, str):
+    """ DetailCleaner 清洗 (不预取图片) """
+    content_node_list, file_info_list, _ = cleaner.clean(data_str, detail_url)
+    return file_info_list, cleaner.serialize(content_node_list)
+
+
+def html_text(html: str) -> str:
+    """ 正文可见文本 (去空白, 用于核对) """
+    tree = etree.HTML(html) if html.strip() else None
+    return re.sub(r"\s+", "", tree.xpath("string()")) if tree is not None else ""
+
+
+def load_pages(project_name: str, sample_number: int) -> list:
+    """
+    加载样本: 录制的详情页夹具 (只取详情页, 即 content.shtml), 未录制时使用内置样本页
+    :return: [(详情页链接, html), ...]
+    """
+    fixture_dir_path = os.path.join(FIXTURE_PATH, f"{project_name}_detail")
+    page_list = []
+    if os.path.isdir(fixture_dir_path):
+        for file_name in sorted(os.listdir(fixture_dir_path)):
+            if len(page_list) >= sample_number:
+                break
+            if not file_name.endswith(".json"):
+                continue
+            with open(os.path.join(fixture_dir_path, file_name), "r", encoding="utf8") as f:
+                meta_dict = json.load(f)
+            if not meta_dict["url"].endswith(".shtml"):
+                continue
+            with open(os.path.join(fixture_dir_path, file_name[:-len(".json")] + ".body"), "rb") as f:
+                content = f.read()
+            page_list.append((meta_dict["url"], content.decode(meta_dict.get("encoding") or "utf-8", "replace")))
+
+    if not page_list:
+        logging.info(f"夹具目录中没有详情页 ({fixture_dir_path}), 使用内置样本页")
+        page_list.append((SAMPLE_URL, SAMPLE_HTML))
+    return page_list
+
+
+def run_benchmark(project_name: str, sample_number: int, rounds: int) -> int:
+    """
+    运行微基准并输出报告
+    :return: 退出码 (0 完成, 2 无法运行)
+    """
+    final_config = load_config(project_name)
+    if not final_config:
+        return 2
+
+    page_list = load_pages(project_name, sample_number)
+    logging.info(f"已加载 {len(page_list)} 个样本, 每个样本每种实现执行 {rounds} 次")
+
+    website_base_url = final_config.get("website_base_url", "")
+    cleaner = DetailCleaner(website_base_url)
+    legacy_seconds, engine_seconds = 0.0, 0.0
+    file_mismatch_count, text_mismatch_count = 0, 0
+    for detail_url, data_str in page_list:
+        # 两种实现交替执行, 减少缓存/频率波动对某一方的偏向
+        for _ in range(rounds):
+            start = time.perf_counter()
+            legacy_ret = legacy_clean(data_str, detail_url, website_base_url)
+            legacy_seconds += time.perf_counter() - start
+
+            start = time.perf_counter()
+            engine_ret = engine_clean(cleaner, data_str, detail_url)
+            engine_seconds += time.perf_counter() - start
+
+        if set(legacy_ret[0]) != set(engine_ret[0]):
+            file_mismatch_count += 1
+            logging.warning(f"附件列表不一致: {detail_url}")
+        if html_text(legacy_ret[1]) != html_text(engine_ret[1]):
+            text_mismatch_count += 1
+            logging.warning(f"正文文本不一致: {detail_url}")
+
+    run_count = len(page_list) * rounds
+    legacy_ms = legacy_seconds / run_count * 1000
+    engine_ms = engine_seconds / run_count * 1000
+    logging.info(
+        "详情页清洗微基准:\n"
+        f"{'实现':<16}{'每页平均(ms)':>14}\n"
+        f"{'原多次XPath':<16}{legacy_ms:>14.3f}\n"
+        f"{'DetailCleaner':<16}{engine_ms:>14.3f}\n"
+        f"加速比: {legacy_ms / engine_ms if engine_ms else 0:.2f}x, "
+        f"附件不一致 {file_mismatch_count} 页, 正文文本不一致 {text_mismatch_count} 页"
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if len(sys.argv) < 2:
+        print("用法: python3 -m benchmark.parse_detail_benchmark [项目名] [样本数, 默认50] [每样本次数, 默认20]")
+        sys.exit(2)
+
+    sys.exit(run_benchmark(
+        sys.argv[1],
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    ))
\ No newline at end of file
@@ -0,0 +1,161 @@
+# 文件名: benchmark/pdf_engine_benchmark.py
+# ---------------------
+# desc: PDF 渲染引擎对比 (wkhtmltopdf / weasyprint)
+#       - 从 detail_stage 保存的快照中取样本 (不请求网站), 按详情页逻辑解析成最终 HTML
+#       - 每个引擎依次渲染全部样本, 对比耗时 (首个文档 / 平均 / p50 / p95) 与输出 (页数 / 大小 / 文本相似度)
+#       - 文本相似度需安装 pypdf, 未安装时跳过
+#       用法 (在 common-mod 目录下): python3 -m benchmark.pdf_engine_benchmark csrc_gov 20
+# ---------------------
+import io
+import sys
+import re
+import time
+import difflib
+import logging
+
+from lxml import etree
+
+from main import load_config, get_spider_class
+from csrc_gov.tools.pdf_tool import PDFTool
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+ENGINE_LIST = ["wkhtmltopdf", "weasyprint"]
+
+
+def load_samples(spider_instance, sample_number: int) -> list:
+    """
+    从快照加载样本并解析成最终 HTML (只读查询, 不认领租约)
+    :return: [(id, html), ...]
+    """
+    factor_str, factor_args = spider_instance.get_db_tasks_sql()
+    db, cs = spider_instance.mysql_tool.open_db_conn()
+    data_list = spider_instance.mysql_tool.select_db_sql(
+        db, cs, spider_instance.db_table, [], factor_str, factor_args
+    ) or []
+    spider_instance.mysql_tool.close_db_conn(db, cs)
+
+    sample_list = []
+    for data_item in data_list:
+        if len(sample_list) >= sample_number:
+            break
+        raw_bytes, index_dict = spider_instance.snapshot_tool.load(data_item["id"])
+        if raw_bytes is None:
+            continue
+        raw_content = raw_bytes.decode(index_dict.get("encoding") or "utf-8")
+        _, content_str = spider_instance.parse_detail_page(raw_content, data_item)
+        sample_list.append((data_item["id"], content_str))
+    return sample_list
+
+
+def html_text(html: str) -> str:
+    """ HTML 可见文本 (去空白, 用于相似度) """
+    return re.sub(r"\s+", "", "".join(etree.HTML(html).xpath("//body//text()")))
+
+
+def pdf_text(pdf_content: bytes) -> str | None:
+    """ PDF 提取文本 (去空白), 未安装 pypdf 返回 None """
+    if pypdf is None:
+        return None
+    reader = pypdf.PdfReader(io.BytesIO(pdf_content))
+    return re.sub(r"\s+", "", "".join(page.extract_text() or "" for page in reader.pages))
+
+
+def percentile(value_list: list, rate: float) -> float:
+    value_list = sorted(value_list)
+    return value_list[min(len(value_list) - 1, int(len(value_list) * rate))]
+
+
+def run_engine(engine: str, stage_pdf_tool: PDFTool, sample_list: list) -> dict | None:
+    """
+    用指定引擎依次渲染全部样本 (输出配置与阶段配置一致)
+    :return: 统计字典, 引擎不可用时返回 None
+    """
+    try:
+        # 首个文档的耗时包含引擎加载 (weasyprint 的 import 已在模块加载时完成, 字体配置在首个文档时创建)
+        pdf_tool = PDFTool(stage_pdf_tool.cache_path, engine=engine, profile_dict=stage_pdf_tool.profile_dict,
+                           profile=stage_pdf_tool.profile)
+    except (ImportError, ValueError) as e:
+        logging.warning(f"引擎 {engine} 不可用, 跳过: {e}")
+        return None
+
+    cost_list, page_list, size_list, ratio_list = [], [], [], []
+    failure_count = 0
+    for row_id, html in sample_list:
+        start = time.perf_counter()
+        pdf_content = pdf_tool.render_html(html)
+        cost_list.append(time.perf_counter() - start)
+
+        if not pdf_content:
+            failure_count += 1
+            logging.warning(f"{engine} 渲染失败: id={row_id}")
+            continue
+        page_list.append(len(re.findall(rb"/Type\s*/Page\b", pdf_content)))
+        size_list.append(len(pdf_content))
+        text = pdf_text(pdf_content)
+        if text is not None:
+            ratio_list.append(difflib.SequenceMatcher(None, html_text(html), text, autojunk=False).ratio())
+
+    return {
+        "first": cost_list[0],
+        "mean": sum(cost_list) / len(cost_list),
+        "p50": percentile(cost_list, 0.5),
+        "p95": percentile(cost_list, 0.95),
+        "total": sum(cost_list),
+        "failure": failure_count,
+        "page": sum(page_list) / len(page_list) if page_list else 0,
+        "size": sum(size_list) / len(size_list) if size_list else 0,
+        "ratio": sum(ratio_list) / len(ratio_list) if ratio_list else None,
+    }
+
+
+def run_benchmark(project_name: str, sample_number: int) -> int:
+    """
+    运行对比并输出报告
+    :return: 退出码 (0 完成, 2 无法运行)
+    """
+    final_config = load_config(project_name)
+    if not final_config:
+        return 2
+
+    SpiderClass = get_spider_class(project_name, "reprocess")
+    if not SpiderClass:
+        return 2
+    spider_instance = SpiderClass(project_config=final_config)
+    if not spider_instance.mysql_tool or not spider_instance.snapshot_tool:
+        logging.error("数据库或快照未配置, 无法加载样本")
+        return 2
+
+    sample_list = load_samples(spider_instance, sample_number)
+    if not sample_list:
+        logging.error("没有可用的快照样本")
+        return 2
+    logging.info(f"已加载 {len(sample_list)} 个快照样本")
+
+    line_list = [f"{'引擎':<12}{'首个(s)':>10}{'平均(s)':>10}{'p50(s)':>10}{'p95(s)':>10}{'总计(s)':>10}"
+                 f"{'失败':>6}{'平均页数':>10}{'平均KB':>10}{'文本相似度':>12}"]
+    for engine in ENGINE_LIST:
+        stat = run_engine(engine, spider_instance.pdf_tool, sample_list)
+        if stat is None:
+            continue
+        ratio_str = f"{stat['ratio']:.3f}" if stat["ratio"] is not None else "-"
+        line_list.append(
+            f"{engine:<12}{stat['first']:>10.3f}{stat['mean']:>10.3f}{stat['p50']:>10.3f}{stat['p95']:>10.3f}"
+            f"{stat['total']:>10.2f}{stat['failure']:>6}{stat['page']:>10.1f}{stat['size'] / 1024:>10.1f}"
+            f"{ratio_str:>12}"
+        )
+    logging.info(f"PDF 渲染引擎对比 (输出配置 {spider_instance.pdf_tool.profile}):\n" + "\n".join(line_list))
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if len(sys.argv) < 2:
+        print("用法: python3 -m benchmark.pdf_engine_benchmark [项目名] [样本数, 默认20]")
+        sys.exit(2)
+
+    sys.exit(run_benchmark(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 20))
\ No newline at end of file
@@ -13,12 +13,13 @@ import logging
 
 # --- 1. 配置加载器 ---
 
-def load_config(project_name: str) -> dict:
+def load_config(project_name: str, environment: str = None) -> dict:
     """
     加载并合并三层配置
     1. conf/config.yml (环境开关)
     2. conf/infrastructure.yml (密钥库)
     3. conf/projects/{project_name}.yml (业务逻辑)
+    :param environment: 指定运行环境 (默认使用 config.yml 中的 environment)
     """
     try:
         # --- 加载文件 ---
@@ -38,7 +39,7 @@ def load_config(project_name: str) -> dict:
         # --- 合并配置 ---
 
         # 1. 确定当前环境
-        current_env = env_config.get("environment", "dev")  # 默认为 dev
+        current_env = environment or env_config.get("environment", "dev")  # 默认为 dev
         logging.info(f"--- 当前运行环境: {current_env} ---")
 
         # 2. 从 env_config 获取环境特定设置
@@ -85,6 +86,8 @@ SPIDER_REGISTRY = {
         "list": "projects.csrc_gov.csrc_gov_list_spider.CsrcGovListSpider",
         "detail": "projects.csrc_gov.csrc_gov_detail_spider.CsrcGovDetailSpider",
         "attachment": "projects.csrc_gov.csrc_gov_attachment_spider.CsrcGovAttachmentSpider",
+        "partition": "projects.csrc_gov.csrc_gov_partition_job.CsrcGovPartitionJob",
+        "reprocess": "projects.csrc_gov.csrc_gov_reprocess_spider.CsrcGovReprocessSpider",
     },
     # "new_site": {
     #     "list": "projects.new_site.new_site_list_spider.NewSiteListSpider",
@@ -116,6 +119,7 @@ if __name__ == '__main__':
     # 用法: python main.py csrc_gov list
     # 用法: python main.py csrc_gov detail
     # 用法: python main.py csrc_gov attachment
+    # 用法: python main.py csrc_gov reprocess
     if len(sys.argv) < 3:
         print("用法: python main.py [项目名] [阶段名]")
         print("可用项目:", list(SPIDER_REGISTRY.keys()))
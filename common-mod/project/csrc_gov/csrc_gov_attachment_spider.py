@@ -4,10 +4,10 @@
 #       - 继承 AbstractAttachmentSpider
 #       - 实现所有抽象方法
 # ---------------------
-import logging
-import uuid
+import os
 from ...base.abstract_attachment_spider import AbstractAttachmentSpider
-from csrc_gov.tools.md5_tool import get_file_md5  # 导入特定工具
+from csrc_gov.tools.md5_tool import get_file_md5, get_str_md5  # 导入特定工具
+from csrc_gov.tools.sql_tool import SqlFactor
 
 
 class CsrcGovAttachmentSpider(AbstractAttachmentSpider):
@@ -25,60 +25,52 @@ class CsrcGovAttachmentSpider(AbstractAttachmentSpider):
 
     # --- 1. 实现 AbstractAttachmentSpider 的抽象方法 ---
 
-    def get_db_tasks_sql(self) -> str:
+    def get_db_tasks_sql(self) -> (str, tuple):
         """
-        返回获取附件任务的 SQL 语句
+        返回获取附件任务的参数化条件
         (逻辑移植自原 csrc_gov_attachment.py run)
         """
         return (
-            "(`flag` = 0) and "
-            "(`is_delete` = 0) and "
-            "(`pid` is not null or `pid` != '') and "
-            "(`attachment_url` is not null or `attachment_url` != '') and "
-            f"(`publish_time` >= '{self.start_time}') and "
-            f"(`publish_time` <= '{self.end_time}') "
-            "order by `publish_time` desc"
+            SqlFactor()
+            .eq("flag", 0)
+            .eq("is_delete", 0)
+            .raw("(`pid` is not null or `pid` != '')")
+            .raw("(`attachment_url` is not null or `attachment_url` != '')")
+            .ge("publish_time", self.start_time)
+            .le("publish_time", self.end_time)
+            .order_by("publish_time", desc=True)
+            .build()
         )
 
-    def process_attachment_task(self, data_item: dict, local_file_path: str, file_ext: str):
+    def process_attachment_task(self, data_item: dict, local_file_path: str | None, file_ext: str,
+                                content: bytes | None = None):
         """
-        处理单条附件任务：计算MD5、上传、更新DB
+        处理单条附件任务：计算MD5、上传、更新DB (失败时抛出异常, 由工作流释放租约)
         (逻辑移植自原 csrc_gov_attachment.py retry_upload_file)
         """
-        try:
-            # a. 计算MD5
+        # a. 计算MD5
+        if content is not None:
+            file_md5 = get_str_md5(content)
+        else:
             file_md5 = get_file_md5(local_file_path)
 
-            # b. 决定OBS对象名
-            obs_object_name = data_item.get("obs_path", "").split("csrc_gov/")[1]
-            if not obs_object_name:
-                obs_object_name = "{}/{}.{}".format(
-                    data_item.get("precinct_code", "UNKNOWN"),
-                    str(uuid.uuid1()).replace("-", ""),
-                    file_ext
-                )
+        # b. 决定OBS对象名 (已有 obs_path 时沿用, 以内容 md5 命名且内容已变化的除外)
+        obs_object_name = (data_item.get("obs_path") or "").split("csrc_gov/")[-1]
+        if not obs_object_name or self.is_shared_object_stale(obs_object_name, data_item.get("file_md5"), file_md5):
+            obs_object_name = self.build_object_name(
+                data_item.get("precinct_code", "UNKNOWN"), file_md5, file_ext,
+                len(content) if content is not None else os.path.getsize(local_file_path)
+            )
 
-            # c. 调用基类的通用上传器
-            obs_path = self.upload_to_obs(local_file_path, obs_object_name)
-
-            # d. 更新数据库 (特定业务)
-            if obs_path:
-                db_dict = {
-                    "obs_path": obs_path,
-                    "file_type": file_ext.upper(),
-                    "file_md5": file_md5,
-                    "flag": 1
-                }
-                db, cs = self.mysql_tool.open_db_conn()
-                self.mysql_tool.update_db_sql(
-                    db, cs, self.db_table,
-                    db_dict,
-                    f"`id`='{data_item['id']}'"
-                )
-                self.mysql_tool.close_db_conn(db, cs)
-                logging.info(f"附件数据库更新成功: id={data_item['id']}")
-            else:
-                logging.error(f"附件上传失败，数据库未更新: id={data_item['id']}")
-
-        except Exception as e:
-            logging.error(f"附件处理失败: {e}", exc_info=True)
\ No newline at end of file
+        # c. 上传并更新数据库 (配置了 upload_dedup 时相同内容复用已有 obs_path;
+        #    配置了 upload_queue 时在后台上传, 完成后写库)
+        db_dict = {
+            "file_type": file_ext.upper(),
+            "file_md5": file_md5,
+            "flag": 1
+        }
+        if not self.submit_upload_task(
+                data_item["id"], db_dict, file_md5, obs_object_name,
+                local_file_path=local_file_path, content=content
+        ):
+            raise Exception(f"附件上传或写库失败: id={data_item['id']}")
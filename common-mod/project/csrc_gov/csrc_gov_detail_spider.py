@@ -8,12 +8,48 @@ import logging
 import datetime
 import uuid
 import re
-import urllib.parse
 import os
-from lxml import etree
-from lxml.html import tostring
 from ...base.abstract_detail_spider import AbstractDetailSpider
-from csrc_gov.tools.md5_tool import get_file_md5  # 导入特定工具
+from csrc_gov.tools.md5_tool import get_file_md5, get_str_md5  # 导入特定工具
+from csrc_gov.tools.sql_tool import SqlFactor
+from csrc_gov.tools.html_clean_tool import DetailCleaner
+from csrc_gov.tools.asset_tool import AssetTool
+
+
+class CsrcGovDetailParser(object):
+    """
+    详情页解析 (清洗 + 模板拼接), 不依赖爬虫实例:
+    主线程解析时由爬虫持有, 配置了 parse_pool 时每个解析进程创建一个 (模板随之载入一次)
+    """
+
+    def __init__(self, website_base_url: str, h5_temp_str: str, c3_temp_str: str, use_placeholder: bool = False):
+        """
+        :param website_base_url: 网站根链接
+        :param h5_temp_str: H5 模板
+        :param c3_temp_str: C3 模板
+        :param use_placeholder: 图片 src 替换为 AssetTool 占位符 (由主进程预取后替换)
+        """
+        self.detail_cleaner = DetailCleaner(website_base_url)
+        self.h5_temp_str = h5_temp_str
+        self.c3_temp_str = c3_temp_str
+        self.use_placeholder = use_placeholder
+
+    def build_html(self, title: str, content_str: str) -> str:
+        """ 正文套用模板生成最终HTML """
+        return self.h5_temp_str.format(title, self.c3_temp_str, title, content_str)
+
+    def parse(self, raw_bytes: bytes, encoding: str, row_context: dict) -> (list, str, list):
+        """
+        解析详情页原始字节 (在解析进程中执行)
+        :param row_context: 行上下文 (detail_url, title)
+        :return: (附件列表, 最终HTML, 图片原链接列表 (未使用占位符时为空))
+        """
+        content_list, file_info_list, img_list = self.detail_cleaner.clean(
+            raw_bytes.decode(encoding), row_context["detail_url"]
+        )
+        img_url_list = AssetTool.set_placeholders(img_list) if self.use_placeholder else []
+        content_str = self.build_html(row_context["title"], self.detail_cleaner.serialize(content_list))
+        return file_info_list, content_str, img_url_list
 
 
 class CsrcGovDetailSpider(AbstractDetailSpider):
@@ -22,32 +58,36 @@ class CsrcGovDetailSpider(AbstractDetailSpider):
     """
     task_name = "证监局详情页处理"
 
-    def __init__(self, project_config: dict):
+    def __init__(self, project_config: dict, stage_name: str = "detail_stage"):
         """
         初始化
         :param project_config: 已合并的配置字典
+        :param stage_name: 阶段名
         """
-        super().__init__(project_config)
+        super().__init__(project_config, stage_name)
 
         # --- 本业务特有的配置 ---
         self.website_base_url = self.project_conf.get("website_base_url", "http://www.csrc.gov.cn/")
+        self.detail_parser = CsrcGovDetailParser(self.website_base_url, self.h5_temp_str, self.c3_temp_str)
         if not self.h5_temp_str or not self.c3_temp_str:
             logging.error("H5或C3模板加载失败，PDF转换功能将受限。")
 
     # --- 1. 实现 AbstractDetailSpider 的抽象方法 ---
 
-    def get_db_tasks_sql(self) -> str:
+    def get_db_tasks_sql(self) -> (str, tuple):
         """
-        返回获取详情页任务的 SQL 语句
+        返回获取详情页任务的参数化条件
         (逻辑移植自原 csrc_gov_detail.py run)
         """
         return (
-            "(`is_delete` = 0) and "
-            "(`pid` is null or `pid` = '') and "
-            "(`detail_url` is not null or `detail_url` != '') and "
-            f"(`publish_time` >= '{self.start_time}') and "
-            f"(`publish_time` <= '{self.end_time}') "
-            "order by `publish_time` desc"
+            SqlFactor()
+            .eq("is_delete", 0)
+            .is_blank("pid")
+            .raw("(`detail_url` is not null or `detail_url` != '')")
+            .ge("publish_time", self.start_time)
+            .le("publish_time", self.end_time)
+            .order_by("publish_time", desc=True)
+            .build()
         )
 
     def process_detail_task(self, data_item: dict, raw_content: str, encoding: str):
@@ -57,7 +97,12 @@ class CsrcGovDetailSpider(AbstractDetailSpider):
         """
         # 1. 解析详情页，提取附件列表和清洗后的HTML
         file_list, content_str = self.parse_detail_page(raw_content, data_item)
+        self.process_parsed_detail(data_item, file_list, content_str)
 
+    def process_parsed_detail(self, data_item: dict, file_list: list, content_str: str):
+        """
+        处理解析结果：存附件、转PDF、上传 (主线程解析及解析进程池共用), 失败时抛出异常
+        """
         # 2. 将解析到的附件信息保存到数据库
         attachment_info_save_ret = self.attachment_info_save(file_list, data_item)
         if not attachment_info_save_ret:
@@ -66,108 +111,139 @@ class CsrcGovDetailSpider(AbstractDetailSpider):
         # 3. 检查是否需要生成PDF (flag=0)
         if not data_item.get("flag", 0):
             if not self.h5_temp_str or not self.c3_temp_str:
-                logging.error(f"模板未加载，无法生成PDF: id={data_item['id']}")
+                raise Exception(f"模板未加载，无法生成PDF: id={data_item['id']}")
+
+            # 最终HTML (及渲染引擎、输出配置) 与上次成功渲染相同时跳过渲染及上传, 只写入完成标记 (沿用已有 obs_path)
+            content_md5 = get_str_md5((self.pdf_tool.get_render_signature() + content_str).encode("utf8"))
+            if self.is_render_unchanged(data_item, content_md5):
+                logging.info(f"HTML未变化 (content_md5={content_md5})，跳过PDF生成: id={data_item['id']}")
+                if not self.save_task_result(data_item["id"], {"flag": 1}):
+                    raise Exception(f"完成标记写库失败: id={data_item['id']}")
                 return
 
-            try:
-                # a. 生成PDF
-                uuid_str = str(uuid.uuid1()).replace("-", "")
-                local_pdf_name = f"{uuid_str}.pdf"
-                local_pdf_path = os.path.join(self.file_cache_path, local_pdf_name)
+            # 开启渲染池时提交后立即返回处理下一条, 渲染完成后在渲染线程中上传
+            # (任务交给渲染完成回调结束, 工作流不写入完成标记)
+            if self.pdf_tool.pool_size:
+                self.defer_claimed_task(data_item["id"])
+                try:
+                    self.pdf_tool.submit_render(
+                        content_str,
+                        callback=lambda pdf_content: self.handle_rendered_pdf(data_item, content_md5, pdf_content)
+                    )
+                except Exception:
+                    self.finish_deferred_task(data_item["id"], False)
+                    raise
+                return
 
+            # a. 生成PDF (配置了 memory_upload_threshold_mb 时在内存中生成, 超过阈值才落盘;
+            #    渲染或上传失败时抛出异常, 由工作流释放租约)
+            if self.memory_upload_threshold:
+                pdf_content = self.pdf_tool.string_html_to_pdf_content(content_str)
+                if not pdf_content:
+                    raise Exception(f"PDFTool未能成功生成PDF: id={data_item['id']}")
+                self.upload_rendered_pdf(data_item, content_md5, pdf_content)
+            else:
                 # (注意: PDFTool 的 string_html_to_pdf 方法会自己拼接 cache_path 和文件名)
+                local_pdf_name = f"{str(uuid.uuid1()).replace('-', '')}.pdf"
+                local_pdf_path = os.path.join(self.file_cache_path, local_pdf_name)
                 self.pdf_tool.string_html_to_pdf(content_str, local_pdf_name)
 
                 if not os.path.exists(local_pdf_path):
                     raise Exception(f"PDFTool未能成功创建文件: {local_pdf_path}")
+                self.upload_rendered_pdf(data_item, content_md5, local_pdf_path=local_pdf_path)
+        else:
+            logging.info(f"PDF已处理 (flag=1)，跳过: id={data_item['id']}")
 
-                # b. 计算MD5
-                file_md5 = get_file_md5(local_pdf_path)
+    # --- 2. 解析进程池 ---
 
-                # c. 决定OBS对象名
-                obs_object_name = data_item.get("obs_path", "").split("csrc_gov/")[1]
-                if not obs_object_name:
-                    obs_object_name = "{}/{}.pdf".format(
-                        data_item.get("precinct_code", "UNKNOWN"), uuid_str
-                    )
+    def get_parse_worker_context(self) -> dict:
+        return dict(super().get_parse_worker_context(), website_base_url=self.website_base_url)
 
-                # d. 调用基类的通用上传器
-                obs_path = self.upload_to_obs(local_pdf_path, obs_object_name)
-
-                # e. 更新数据库
-                if obs_path:
-                    db_dict = {
-                        "obs_path": obs_path,
-                        "file_type": "PDF",
-                        "file_md5": file_md5,
-                        "flag": 1
-                    }
-                    db, cs = self.mysql_tool.open_db_conn()
-                    self.mysql_tool.update_db_sql(
-                        db, cs, self.db_table,
-                        db_dict,
-                        f"`id`='{data_item['id']}'"
-                    )
-                    self.mysql_tool.close_db_conn(db, cs)
-                    logging.info(f"PDF 数据库更新成功: id={data_item['id']}")
-                else:
-                    logging.error(f"PDF 上传失败，数据库未更新: id={data_item['id']}")
+    @classmethod
+    def create_parse_worker(cls, worker_context: dict):
+        """
+        解析进程中创建解析器 (每个进程一个), 返回其解析函数
+        """
+        return CsrcGovDetailParser(
+            worker_context["website_base_url"],
+            worker_context["h5_temp_str"],
+            worker_context["c3_temp_str"],
+            use_placeholder=worker_context["localize_images"]
+        ).parse
 
-            except Exception as e:
-                logging.error(f"PDF处理或上传失败: {e}", exc_info=True)
-        else:
-            logging.info(f"PDF已处理 (flag=1)，跳过: id={data_item['id']}")
+    # --- 3. CsrcGov 特有的辅助方法 ---
 
-    # --- 2. CsrcGov 特有的辅助方法 ---
+    def handle_rendered_pdf(self, data_item: dict, content_md5: str, pdf_content: bytes | None):
+        """
+        渲染池完成回调 (在渲染线程中执行): 上传PDF并结束任务, 渲染或上传失败时释放租约
+        (配置了 upload_queue 时由上传队列的完成回调结束任务)
+        """
+        try:
+            if not pdf_content:
+                raise Exception(f"PDF渲染失败: id={data_item['id']}")
+            self.upload_rendered_pdf(data_item, content_md5, pdf_content)
+        except Exception as e:
+            logging.error(f"PDF处理或上传失败: {e}", exc_info=True)
+            self.finish_deferred_task(data_item["id"], False)
+            return
+        if not self.upload_queue_tool:
+            self.finish_deferred_task(data_item["id"], True)
+
+    def upload_rendered_pdf(self, data_item: dict, content_md5: str, pdf_content: bytes = None,
+                            local_pdf_path: str = None):
+        """
+        计算MD5、决定OBS对象名并上传PDF, 上传后更新数据库 (content_md5 随上传结果一起写入), 失败时抛出异常。
+        内存中的PDF超过 memory_upload_threshold_mb 时先落盘再上传。
+        """
+        if pdf_content is not None and not self.is_memory_upload(len(pdf_content)):
+            local_pdf_path = os.path.join(self.file_cache_path, f"{str(uuid.uuid1()).replace('-', '')}.pdf")
+            with open(local_pdf_path, "wb") as f:
+                f.write(pdf_content)
+            pdf_content = None
+
+        # b. 计算MD5
+        if pdf_content is not None:
+            file_md5 = get_str_md5(pdf_content)
+        else:
+            file_md5 = get_file_md5(local_pdf_path)
+
+        # c. 决定OBS对象名 (已有 obs_path 时沿用, 以内容 md5 命名且内容已变化的除外)
+        obs_object_name = (data_item.get("obs_path") or "").split("csrc_gov/")[-1]
+        if not obs_object_name or self.is_shared_object_stale(obs_object_name, data_item.get("file_md5"), file_md5):
+            obs_object_name = self.build_object_name(
+                data_item.get("precinct_code", "UNKNOWN"), file_md5, "pdf",
+                len(pdf_content) if pdf_content is not None else os.path.getsize(local_pdf_path)
+            )
+
+        # d. 上传并更新数据库 (配置了 upload_dedup 时相同内容复用已有 obs_path;
+        #    配置了 upload_queue 时在后台上传, 完成后写库)
+        db_dict = {
+            "file_type": "PDF",
+            "file_md5": file_md5,
+            "flag": 1
+        }
+        if self.skip_unchanged_render:
+            db_dict["content_md5"] = content_md5
+        if not self.submit_upload_task(
+                data_item["id"], db_dict, file_md5, obs_object_name,
+                local_file_path=local_pdf_path, content=pdf_content
+        ):
+            raise Exception(f"PDF上传或写库失败: id={data_item['id']}")
 
     def parse_detail_page(self, data_str: str, data_dict: dict) -> (list, str):
         """
-        解析详情页 (移植自原 csrc_gov_detail.py parse_detail_page)
+        解析详情页 (清洗规则见 DetailCleaner: 预编译 XPath, 每个正文节点单次遍历, 只序列化一次)
         :return: (file_info_list, cleaned_html_content)
         """
-        url_head = data_dict["detail_url"][:data_dict["detail_url"].rfind("/") + 1]
-        tree = etree.HTML(data_str)
-        content_str = ""
-        file_info_list = []
-
-        content_list = tree.xpath('//div[@class="content"]')
-        for content in content_list:
-            if not content.xpath('.//h2'): continue
-            for h2 in content.xpath('.//h2'): h2.getparent().remove(h2); break
-
-            # (省略原代码中移除隐藏属性、处理a标签、img标签、font标签、移除表格和打印按钮等DOM清洗逻辑)
-            # ... (DOM cleaning logic from original file) ...
-
-            # --- 提取附件 ---
-            for files_a in content.xpath('.//div[@id="files"]/a | .//div[@class="detail-news"]//a'):
-                href = (files_a.xpath('./@href') or [""])[0]
-                title = "".join(files_a.xpath('.//text()')).strip()
-                if not href or not title or ("/files/" not in href and "http" not in href):
-                    continue
-
-                if "http" not in href:
-                    href = href[1:] if href.startswith("/") else href
-                    if href.endswith((".mp4", ".MP4")):
-                        href = self.website_base_url + href
-                    else:
-                        href = url_head + href
-                file_info_list.append((href, title))
-
-            # (省略替换 a 和 img 标签的逻辑)
-            # ...
-
-            content_str += tostring(content, encoding="utf8", method="html").decode("utf8")
-
-        content_str = re.sub(r'font-family(.*?);', "", content_str)
-        content_str = urllib.parse.unquote(content_str)
-
-        new_content_str = self.h5_temp_str.format(
-            data_dict["title"],
-            self.c3_temp_str,
-            data_dict["title"],
-            content_str
-        )
-        return list(set(file_info_list)), new_content_str
+        detail_cleaner = self.detail_parser.detail_cleaner
+        content_list, file_info_list, img_list = detail_cleaner.clean(data_str, data_dict["detail_url"])
+
+        # 图片一次性并发预取并改写为本地缓存 (配置了 asset_prefetch 时)
+        self.localize_images(img_list)
+        content_str = detail_cleaner.serialize(content_list)
+
+        new_content_str = self.detail_parser.build_html(data_dict["title"], content_str)
+        return file_info_list, new_content_str
 
     @staticmethod
     def split_name_suffix(file_name: str) -> (str, str):
@@ -198,10 +274,18 @@ class CsrcGovDetailSpider(AbstractDetailSpider):
                 title, _ = self.split_name_suffix(file_title)
                 attachment_url = file_href
 
+                # (附件的 publish_time 与公告一致, 带上后只扫描所在分区)
+                factor_str, factor_args = (
+                    SqlFactor()
+                    .eq("pid", data_dict["id"])
+                    .eq("publish_time", data_dict["publish_time"])
+                    .eq("attachment_url", attachment_url)
+                    .build()
+                )
                 select_db_sql_ret = self.mysql_tool.select_db_sql(
                     db, cs, self.db_table,
                     ["id", "title"],
-                    f"`pid` = '{data_dict['id']}' and `attachment_url` = '{attachment_url}'"
+                    factor_str, factor_args
                 )
 
                 if select_db_sql_ret is None:
@@ -220,10 +304,11 @@ class CsrcGovDetailSpider(AbstractDetailSpider):
                         ))
                 elif title != select_db_sql_ret[0]["title"]:
                     # --- 更新附件标题和flag ---
+                    factor_str, factor_args = SqlFactor().eq("id", select_db_sql_ret[0]["id"]).build()
                     self.mysql_tool.update_db_sql(
                         db, cs, self.db_table,
                         {"title": title, "flag": 0},
-                        f"`id` = '{select_db_sql_ret[0]['id']}'"
+                        factor_str, factor_args
                     )
 
             # --- 批量插入新附件 ---
@@ -8,6 +8,8 @@ import logging
 import datetime
 import requests
 from ...base.abstract_list_spider import AbstractListSpider
+from csrc_gov.tools.sql_tool import SqlFactor
+from csrc_gov.tools.unit_of_work_tool import UnitOfWork
 
 
 class CsrcGovListSpider(AbstractListSpider):
@@ -37,6 +39,18 @@ class CsrcGovListSpider(AbstractListSpider):
     def get_monitor_api_condition(self, target: dict) -> dict | None:
         return target.get("condition")
 
+    def get_existence_stats(self) -> dict | None:
+        """
+        按辖区分组统计已入库的公告条数 (不含附件、已删除数据)
+        """
+        factor_str, factor_args = SqlFactor().eq("is_delete", 0).is_blank("pid").build()
+        db, cs = self.mysql_tool.open_db_conn()
+        existence_dict = self.mysql_tool.select_db_group_count_sql(
+            db, cs, self.db_table, "precinct", factor_str, factor_args
+        )
+        self.mysql_tool.close_db_conn(db, cs)
+        return existence_dict
+
     def get_total_pages(self, target: dict) -> int | None:
         """
         通过请求第1页来获取总页数
@@ -81,10 +95,19 @@ class CsrcGovListSpider(AbstractListSpider):
                 logging.error(f"解析列表页JSON失败: {e} - {resp.text[:100]}")
         return None
 
-    def parse_list_page(self, target: dict, page_data: any) -> (bool, int, int):
+    def is_page_in_window(self, target: dict, page_data: any) -> bool:
+        """
+        本页是否全部在采集时间范围内 (与 parse_list_page 的时间范围检查一致)
+        """
+        if self.is_full_crawled:
+            return True
+        results = page_data["data"].get("results", [])
+        return all(result.get("publishedTimeStr", "") >= self.start_time for result in results)
+
+    def parse_list_page(self, target: dict, page_data: any, uow: UnitOfWork) -> (bool, int, int):
         """
         解析列表页数据并存入数据库
-        (逻辑移植自原 csrc_gov_list.py 中的 parse_list_page)
+        (逻辑移植自原 csrc_gov_list.py 中的 parse_list_page, 整页读写共用 uow 的一个事务)
         """
         continue_crawl = True
         increment_count = 0
@@ -127,24 +150,13 @@ class CsrcGovListSpider(AbstractListSpider):
                     continue_crawl = False  # 遇到旧数据，停止
                     return continue_crawl, increment_count, page_item_count
 
-            # --- 数据库检查 ---
-            db, cs = self.mysql_tool.open_db_conn()
-            select_db_sql_ret = self.mysql_tool.select_db_sql(
-                db, cs, self.db_table,
+            # --- 数据库检查 (非全量爬取先查热分区, 未命中再查全部分区) ---
+            select_db_sql_ret = self.select_hot_first(
+                uow,
                 ["id", "type", "number", "title", "publish_time"],  # 查询所需字段
-                f"`detail_url` = '{url}' and "
-                f"(`attachment_url` is null or `attachment_url` = '') and "
-                f"`precinct` = '{precinct}'"
+                lambda: SqlFactor().eq("detail_url", url).is_blank("attachment_url").eq("precinct", precinct)
             )
 
-            # (在循环中开关DB不是最佳实践，但为了保持原逻辑，暂时保留。
-            # 更好的做法是批处理，或在循环外开关DB)
-
-            if select_db_sql_ret is None:
-                logging.error("数据库连接失败，跳过此条")
-                self.mysql_tool.close_db_conn(db, cs)
-                continue
-
             # 统计当天新增
             if published_time_str >= self.today_time:
                 increment_count += 1
@@ -153,7 +165,6 @@ class CsrcGovListSpider(AbstractListSpider):
             ret_get_manuscript_data = self.get_manuscript_data(manuscript_id)
             if not ret_get_manuscript_data:
                 logging.warning(f"获取稿件信息失败: {manuscript_id}")
-                self.mysql_tool.close_db_conn(db, cs)
                 continue
 
             type_str = self.parse_manuscript_data(ret_get_manuscript_data)
@@ -163,8 +174,8 @@ class CsrcGovListSpider(AbstractListSpider):
                 # --- 新增数据 ---
                 text_id = self.handle_snow_id()
                 if text_id:
-                    self.mysql_tool.insert_db_sql(
-                        db, cs, self.db_table,
+                    uow.insert(
+                        self.db_table,
                         {
                             "precinct": precinct,
                             "precinct_code": precinct_code,
@@ -189,25 +200,23 @@ class CsrcGovListSpider(AbstractListSpider):
                 if not (title == ret_title and published_time_str == ret_publish_time and \
                         number_str == ret_number and type_str == ret_type):
 
-                    # 事务更新 (原代码逻辑)
-                    try:
-                        self.mysql_tool.transaction_update_db_sql(
-                            db, cs, self.db_table,
-                            {"number": number_str, "title": title, "publish_time": published_time_str, "type": type_str,
-                             "flag": 0},
-                            f"`id` = {ret_id}"
-                        )
-                        self.mysql_tool.transaction_update_db_sql(
-                            db, cs, self.db_table,
-                            {"number": number_str, "publish_time": published_time_str, "type": type_str},
-                            f"`pid` = {ret_id}"
-                        )
-                        db.commit()
-                    except Exception as e:
-                        logging.error(f"数据库事务更新错误 {e}", exc_info=True)
-                        db.rollback()
-
-            self.mysql_tool.close_db_conn(db, cs)
+                    # 公告及其附件一并更新 (与整页同一事务提交)
+                    id_factor_str, id_factor_args = SqlFactor().eq("id", ret_id).build()
+                    # (附件的 publish_time 与公告一致, 带上后只扫描所在分区)
+                    pid_factor_str, pid_factor_args = (
+                        SqlFactor().eq("pid", ret_id).eq("publish_time", ret_publish_time).build()
+                    )
+                    uow.update(
+                        self.db_table,
+                        {"number": number_str, "title": title, "publish_time": published_time_str, "type": type_str,
+                         "flag": 0},
+                        id_factor_str, id_factor_args
+                    )
+                    uow.update(
+                        self.db_table,
+                        {"number": number_str, "publish_time": published_time_str, "type": type_str},
+                        pid_factor_str, pid_factor_args
+                    )
 
         return continue_crawl, increment_count, page_item_count
 
@@ -0,0 +1,13 @@
+# 文件名: projects/csrc_gov/csrc_gov_partition_job.py
+# ---------------------
+# desc: 证监局数据表分区维护 (L3)
+#       - 继承 PartitionJob
+# ---------------------
+from ...base.partition_job import PartitionJob
+
+
+class CsrcGovPartitionJob(PartitionJob):
+    """
+    csrc_gov 表按 publish_time 按月分区的维护 (分区布局见 sql/csrc_gov_partition_mysql.sql)
+    """
+    task_name = "证监局分区维护"
\ No newline at end of file
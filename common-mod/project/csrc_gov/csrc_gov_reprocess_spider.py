@@ -0,0 +1,22 @@
+# 文件名: projects/csrc_gov/csrc_gov_reprocess_spider.py
+# ---------------------
+# desc: 证监局详情页重新处理 (L3)
+#       - 继承 CsrcGovDetailSpider
+#       - 从原始HTML快照重新解析、渲染、上传 (模板/解析/清洗逻辑变更后使用, 不请求网站)
+# ---------------------
+from .csrc_gov_detail_spider import CsrcGovDetailSpider
+
+
+class CsrcGovReprocessSpider(CsrcGovDetailSpider):
+    """
+    证监局详情页重新处理 (配置见 reprocess_stage)
+    """
+    task_name = "证监局详情页重新处理"
+    is_reprocess = True
+
+    def __init__(self, project_config: dict):
+        """
+        初始化
+        :param project_config: 已合并的配置字典
+        """
+        super().__init__(project_config, "reprocess_stage")
\ No newline at end of file
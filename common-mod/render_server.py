@@ -0,0 +1,27 @@
+# 文件名: render_server.py
+# ---------------------
+# desc: 主机级 PDF 渲染服务入口 (常驻进程)
+#       - 同一主机上各项目/阶段的爬虫进程 (配置了 render_server) 把 wkhtmltopdf 渲染交给本服务, 由一个渲染池统一调度
+#       - 渲染线程数默认为 CPU 核数, 排队超过上限时返回 busy, 客户端退避重试
+#       - 服务未启动时各爬虫进程自行本地渲染
+#       用法 (在 common-mod 目录下): python3 render_server.py [socket路径, 默认 /tmp/pdf_render.sock] [渲染线程数, 默认CPU核数] [排队上限]
+# ---------------------
+import sys
+import signal
+import logging
+
+from csrc_gov.tools.render_server_tool import RenderServer
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    socket_path = sys.argv[1] if len(sys.argv) > 1 else "/tmp/pdf_render.sock"
+    worker_number = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    queue_size = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    server = RenderServer(socket_path, worker_number=worker_number, queue_size=queue_size)
+    # 收到停止信号后不再接受新请求, 已接受的请求渲染完成后退出
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.shutdown())
+    signal.signal(signal.SIGINT, lambda signum, frame: server.shutdown())
+    server.serve_forever()
\ No newline at end of file
@@ -0,0 +1,41 @@
+#!/bin/bash
+
+# 分区维护 (预建未来分区、归档过期分区), 与采集脚本分开, 每月执行一次
+# crontab 示例 (每月 1 日 02:30, 在采集之前):
+# 30 2 1 * * /bin/bash /data/spider_project/shell/csrc_gov_partition.sh
+
+# --- 1. 配置 ---
+
+# 项目启动路径 (请根据你的服务器实际路径修改)
+processPath="/data/spider_project/"
+
+# 主程序名称
+mainProgram="main.py"
+
+# 要运行的项目 (main.py 的第一个参数)
+PROJECT_NAME="csrc_gov"
+
+# 日志文件
+LOG_FILE="${processPath}log/spider_partition.log"
+
+# --- 2. 检查 ---
+
+# 切换项目目录
+cd ${processPath}
+if [ $? -ne 0 ]; then
+    echo "错误: 无法切换到目录 ${processPath}"
+    exit 1
+fi
+
+# 查询分区任务是否启动
+processList=$(ps -aux | grep "${mainProgram}" | grep "${PROJECT_NAME} partition" | grep -v "grep" | grep -v "vim" | grep -v "vi")
+
+# --- 3. 启动 ---
+
+if [ -z "$processList" ]
+then
+        echo "--- 开始执行 [${PROJECT_NAME} partition] $(date) ---" >> ${LOG_FILE}
+        python3 -u ${mainProgram} ${PROJECT_NAME} partition >> ${LOG_FILE} 2>&1
+else
+        echo "分区任务已在运行, 本次不启动。"
+fi
\ No newline at end of file
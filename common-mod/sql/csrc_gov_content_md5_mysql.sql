@@ -0,0 +1,8 @@
+-- 文件名: sql/csrc_gov_content_md5_mysql.sql
+-- ---------------------
+-- desc: 未变化的详情页跳过重新渲染所需的列 (对应 detail_stage / reprocess_stage 的 skip_unchanged_render 配置)
+--       - content_md5: 上次成功渲染并上传时最终HTML (parse_detail_page 输出) 的 md5
+-- ---------------------
+
+ALTER TABLE `csrc_gov`
+    ADD COLUMN `content_md5` CHAR(32) NULL DEFAULT NULL;
@@ -0,0 +1,8 @@
+-- 文件名: sql/csrc_gov_file_md5_index_mysql.sql
+-- ---------------------
+-- desc: 上传前按内容去重所需的索引 (对应 detail_stage / attachment_stage 的 upload_dedup.check_table 配置)
+--       - file_md5: 已上传文件的 md5, 相同内容复用已有 obs_path
+-- ---------------------
+
+ALTER TABLE `csrc_gov`
+    ADD INDEX `idx_file_md5` (`file_md5`);
@@ -0,0 +1,49 @@
+-- 文件名: sql/csrc_gov_partition_mysql.sql
+-- ---------------------
+-- desc: csrc_gov 表按 publish_time 做 RANGE COLUMNS 按月分区 (冷热分离), 一次性迁移脚本
+--       - p_archive: 迁移时热数据窗口之前的全部历史 (之后不再改动)
+--       - pYYYY:     冷数据, 整年移出热数据窗口后由月分区合并为年分区
+--       - pYYYYMM:   热数据, 每月一个分区
+--       - p_future:  兜底分区
+--       迁移后由 shell/csrc_gov_partition.sh (每月 cron) 预建未来分区、归档过期分区
+--       (热数据月数见 csrc_gov.yml partition_stage.hot_months)
+--       带 publish_time 条件的查询只扫描命中的分区; 不带 publish_time 的查询 (全量爬取) 扫描全部分区
+-- !!! 注意: ALTER 会重建整表, 请在停爬时段执行并提前备份
+-- !!! 注意: publish_time 为空的记录无法分区, 本脚本不会改写这些记录, 存在时迁移直接失败;
+--          请先用第 0 步查出这些记录的 id, 补全 publish_time (或按业务处理) 后再执行
+-- ---------------------
+
+-- 0. 检查 publish_time 为空的记录 (结果必须为空)
+SELECT `id`, `detail_url` FROM `csrc_gov` WHERE `publish_time` IS NULL;
+
+-- 1. 分区键必须包含在每个主键/唯一键中, publish_time 不允许为空
+--    严格模式下存在空值时 MODIFY ... NOT NULL 报错 (ERROR 1138), 不会把空值改写为零值
+SET SESSION sql_mode = CONCAT_WS(',', @@SESSION.sql_mode, 'STRICT_ALL_TABLES');
+
+ALTER TABLE `csrc_gov`
+    MODIFY `publish_time` DATETIME NOT NULL,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (`id`, `publish_time`);
+
+-- 2. 列表查重 / 附件查重 / 任务拉取 使用的索引
+ALTER TABLE `csrc_gov`
+    ADD INDEX `idx_detail_url` (`detail_url`(191)),
+    ADD INDEX `idx_pid` (`pid`),
+    ADD INDEX `idx_flag_publish_time` (`flag`, `publish_time`);
+
+-- 3. 分区 (以 2026-10 执行、保留 6 个月热数据为例; 之后由 partition 阶段维护)
+ALTER TABLE `csrc_gov` PARTITION BY RANGE COLUMNS (`publish_time`) (
+    PARTITION `p_archive` VALUES LESS THAN ('2026-05-01'),
+    PARTITION `p202605` VALUES LESS THAN ('2026-06-01'),
+    PARTITION `p202606` VALUES LESS THAN ('2026-07-01'),
+    PARTITION `p202607` VALUES LESS THAN ('2026-08-01'),
+    PARTITION `p202608` VALUES LESS THAN ('2026-09-01'),
+    PARTITION `p202609` VALUES LESS THAN ('2026-10-01'),
+    PARTITION `p202610` VALUES LESS THAN ('2026-11-01'),
+    PARTITION `p202611` VALUES LESS THAN ('2026-12-01'),
+    PARTITION `p202612` VALUES LESS THAN ('2027-01-01'),
+    PARTITION `p_future` VALUES LESS THAN (MAXVALUE)
+);
+
+-- 4. 检查分区裁剪 (partitions 列应只包含热分区)
+-- EXPLAIN SELECT `id` FROM `csrc_gov` WHERE `flag` = 0 AND `publish_time` >= '2026-10-09 00:00:00';
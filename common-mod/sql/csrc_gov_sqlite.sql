@@ -0,0 +1,49 @@
+-- 文件名: sql/csrc_gov_sqlite.sql
+-- ---------------------
+-- desc: 本地 sqlite 替身库建表脚本 (SqliteTool 初始化时执行, 可重复执行)
+--       字段与生产 MySQL 的 csrc_gov / crawler_status 表一致
+-- ---------------------
+
+CREATE TABLE IF NOT EXISTS `csrc_gov` (
+    `id`             INTEGER PRIMARY KEY AUTOINCREMENT,
+    `pid`            INTEGER,                        -- 附件所属公告 id (公告本身为空)
+    `precinct`       VARCHAR(64),                    -- 辖区
+    `precinct_code`  VARCHAR(16),                    -- 辖区编码
+    `title`          VARCHAR(512),
+    `detail_url`     VARCHAR(512),
+    `publish_time`   DATETIME,
+    `number`         VARCHAR(255),                   -- 文号
+    `type`           VARCHAR(255),                   -- 主题分类
+    `attachment_url` VARCHAR(512),
+    `obs_path`       VARCHAR(512),
+    `file_type`      VARCHAR(16),
+    `file_md5`       CHAR(32),
+    `content_md5`    CHAR(32),                       -- 上次成功渲染的最终HTML md5
+    `flag`           TINYINT NOT NULL DEFAULT 0,     -- 0: 待处理 1: 已上传
+    `is_delete`      TINYINT NOT NULL DEFAULT 0,
+    `insert_time`    DATETIME,
+    `text_id`        BIGINT,
+    `claimed_by`     VARCHAR(64),                    -- 租约认领批次令牌
+    `lease_until`    DATETIME                        -- 租约到期时间
+);
+
+CREATE INDEX IF NOT EXISTS `idx_csrc_gov_detail_url` ON `csrc_gov` (`detail_url`);
+CREATE INDEX IF NOT EXISTS `idx_csrc_gov_pid` ON `csrc_gov` (`pid`);
+CREATE INDEX IF NOT EXISTS `idx_csrc_gov_precinct` ON `csrc_gov` (`precinct`);
+CREATE INDEX IF NOT EXISTS `idx_csrc_gov_claimed_by` ON `csrc_gov` (`claimed_by`);
+CREATE INDEX IF NOT EXISTS `idx_csrc_gov_file_md5` ON `csrc_gov` (`file_md5`);
+CREATE INDEX IF NOT EXISTS `idx_csrc_gov_flag_publish_time` ON `csrc_gov` (`flag`, `publish_time`);
+
+CREATE TABLE IF NOT EXISTS `crawler_status` (
+    `id`         INTEGER PRIMARY KEY AUTOINCREMENT,
+    `total`      INTEGER,
+    `existence`  INTEGER,
+    `increment`  INTEGER,
+    `state`      TINYINT,
+    `errorInfo`  TEXT,
+    `logTime`    DATETIME
+);
+
+-- 预置 csrc_gov.yml 中各辖区的 crawler_status_id (70 ~ 107)
+WITH RECURSIVE `seq`(`id`) AS (SELECT 70 UNION ALL SELECT `id` + 1 FROM `seq` WHERE `id` < 107)
+INSERT OR IGNORE INTO `crawler_status` (`id`) SELECT `id` FROM `seq`;
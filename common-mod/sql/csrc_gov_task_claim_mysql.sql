@@ -0,0 +1,12 @@
+-- 文件名: sql/csrc_gov_task_claim_mysql.sql
+-- ---------------------
+-- desc: 多 worker 租约认领任务所需的列 (对应 detail_stage / attachment_stage 的 task_claim 配置)
+--       - claimed_by:  最近一次认领的批次令牌 (主机名-进程号-随机串:批次号), 处理完成后为 done
+--       - lease_until: 租约到期时间, 为空或已过期的行可被认领; 失败释放后为退避结束时间;
+--                      完成后为完成时间 (worker 不再认领其本次运行开始后完成的行)
+-- ---------------------
+
+ALTER TABLE `csrc_gov`
+    ADD COLUMN `claimed_by` VARCHAR(64) NULL DEFAULT NULL,
+    ADD COLUMN `lease_until` DATETIME NULL DEFAULT NULL,
+    ADD INDEX `idx_claimed_by` (`claimed_by`);
@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+# ---------------------
+# author: chenweida
+# date:
+# desc: 异步mysql工具（aiomysql连接池），方法与MysqlTool一一对应，供asyncio爬虫使用
+# ---------------------
+import logging
+import time
+from contextlib import asynccontextmanager
+
+import aiomysql
+from sshtunnel import SSHTunnelForwarder
+
+from .mysql_tool import build_select_sql, build_update_sql
+from .query_log_tool import query_log
+
+
+async def execute_sql(cs, sql, args=None, many=False):
+    """
+    执行sql并记录耗时、行数、指纹及调用位置
+    :param cs: 数据库游标对象
+    :param sql: sql语句
+    :param args: sql参数
+    :param many: 是否executemany
+    :return:
+    """
+    start_time = time.perf_counter()
+    try:
+        if many:
+            return await cs.executemany(sql, args)
+        return await cs.execute(sql, args)
+    finally:
+        query_log.record(sql, time.perf_counter() - start_time, cs.rowcount)
+
+
+class AioMysqlTool(object):
+
+    def __init__(self, db_username, db_password, db_database, db_host="127.0.0.1", db_port=3306,
+                 db_relay_host="0.0.0.0", db_relay_port=10022, ssh_host="139.159.150.159",
+                 ssh_port=22, ssh_username=None, ssh_password=None, charset="utf8",
+                 pool_minsize=1, pool_maxsize=10):
+
+        self.db_username = db_username
+        self.db_password = db_password
+        self.db_database = db_database
+        self.db_host = db_host
+        self.db_port = db_port
+        self.db_relay_host = db_relay_host
+        self.db_relay_port = db_relay_port
+
+        self.ssh_host = ssh_host
+        self.ssh_port = ssh_port
+        self.ssh_username = ssh_username
+        self.ssh_password = ssh_password
+        self.charset = charset
+
+        # 连接池大小
+        self.pool_minsize = pool_minsize
+        self.pool_maxsize = pool_maxsize
+        # 连接池（首次open_db_conn时创建，需在事件循环内）
+        self.pool = None
+
+        # 是否通过ssh连接mysql（隧道转发在独立线程中进行，不阻塞事件循环）
+        if self.ssh_username and self.ssh_password:
+            self.server = SSHTunnelForwarder((self.ssh_host, self.ssh_port),
+                                             ssh_username=self.ssh_username,
+                                             ssh_password=self.ssh_password,
+                                             remote_bind_address=(self.db_host, self.db_port),
+                                             local_bind_address=(self.db_relay_host, self.db_relay_port))
+            self.server.start()
+
+    async def create_pool(self):
+        """
+        创建连接池
+        :return:
+        """
+        if self.ssh_username and self.ssh_password:
+            port = self.db_relay_port
+        else:
+            port = self.db_port
+        self.pool = await aiomysql.create_pool(
+            host=self.db_host,
+            port=port,
+            user=self.db_username,
+            password=self.db_password,
+            db=self.db_database,
+            charset=self.charset,
+            minsize=self.pool_minsize,
+            maxsize=self.pool_maxsize
+        )
+
+    async def open_db_conn(self):
+        """
+        从连接池获取db连接
+        :return:
+        """
+        if not self.pool:
+            await self.create_pool()
+        start_time = time.perf_counter()
+        db = await self.pool.acquire()
+        query_log.record("connect", time.perf_counter() - start_time, 0)
+        # 创建游标对象
+        cs = await db.cursor(aiomysql.DictCursor)
+        return db, cs
+
+    async def close_db_conn(self, db, cs):
+        """
+        归还db连接到连接池
+        :param db: 数据库连接对象
+        :param cs: 数据库游标对象
+        :return:
+        """
+        await cs.close()
+        self.pool.release(db)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        事务上下文，正常退出时commit，异常时rollback
+        用法：
+            async with amt.transaction() as (db, cs):
+                await amt.transaction_update_db_sql(db, cs, ...)
+        :return:
+        """
+        db, cs = await self.open_db_conn()
+        try:
+            await db.begin()
+            yield db, cs
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        finally:
+            await self.close_db_conn(db, cs)
+
+    async def close_pool(self):
+        """
+        关闭连接池
+        :return:
+        """
+        if self.pool:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+
+    def close_ssh_conn(self):
+        """
+        关闭ssh连接
+        :return:
+        """
+        if self.ssh_username and self.ssh_password and self.server:
+            self.server.stop()
+
+    @staticmethod
+    async def select_db_count_sql(db, cs, table, factor_str="", factor_args=None):
+        """
+        查询总条数sql
+        :param db: 数据库连接对象
+        :param cs: 数据库游标对象
+        :param table: 表名（例如：user）
+        :param factor_str: 条件（例如：`name` = %s）
+        :param factor_args: 条件参数（例如：("cwd",)）
+        :return:
+        """
+        if not factor_str:
+            sql = "select count(*) as count from {}".format(table)
+        else:
+            sql = "select count(*) as count from {} where {}".format(table, factor_str)
+
+        try:
+            await execute_sql(cs, sql, factor_args or None)
+            return await cs.fetchone()
+        except Exception as e:
+            logging.error(str(e))
+            return None
+
+    @staticmethod
+    async def select_db_group_count_sql(db, cs, table, group_field, factor_str="", factor_args=None):
+        """
+        分组统计条数sql
+        :param db: 数据库连接对象
+        :param cs: 数据库游标对象
+        :param table: 表名（例如：user）
+        :param group_field: 分组字段（例如：sex）
+        :param factor_str: 条件（例如：`age` >= %s）
+        :param factor_args: 条件参数（例如：(18,)）
+        :return: {分组值: 条数}
+        """
+        quote_field = "`" + group_field + "`"
+        sql = "select " + quote_field + " as group_value, count(*) as count from " + table
+        if factor_str:
+            sql += " where " + factor_str
+        sql += " group by " + quote_field
+
+        try:
+            await execute_sql(cs, sql, factor_args or None)
+            return {row["group_value"]: row["count"] for row in await cs.fetchall()}
+        except Exception as e:
+            logging.error(str(e))
+            return None
+
+    @staticmethod
+    async def select_db_sql(db, cs, table, field_list, factor_str, factor_args=None):
+        """
+        查询sql
+        :param db: 数据库连接对象
+        :param cs: 数据库游标对象
+        :param table: 表名（例如：user）
+        :param field_list: 所需字段列表（例如：["id", "name"]）
+        :param factor_str: 条件（例如：`id` = %s）
+        :param factor_args: 条件参数（例如：(1,)）
+        :return:
+        """
+        sql = build_select_sql(table, tuple(field_list or ()), factor_str)
+
+        try:
+            await execute_sql(cs, sql, factor_args or None)
+            return await cs.fetchall()
+        except Exception as e:
+            logging.error(str(e))
+            return None
+
+    @staticmethod
+    async def insert_db_sql(db, cs, table, data_dict):
+        """
+        插入sql
+        :param db: 数据库连接对象
+        :param cs: 数据库游标对象
+        :param table: 表名（例如：user）
+        :param data_dict: 数据字典（例如：{"name": "cwd", "age": 18, "sex": "men"}）
+        :return:
+        """
+        field_str = ",".join(["`" + data_key + "`" for data_key in data_dict])
+        seat_str = ",".join(["%s"] * len(data_dict))
+        sql = "insert into " + table + "(" + field_str + ") values (" + seat_str + ")"
+
+        try:
+            await execute_sql(cs, sql, list(data_dict.values()))
+            insert_id = cs.lastrowid
+            await db.commit()
+            return insert_id
+        except Exception as e:
+            logging.error(str(e))
+            await db.rollback()
+            return None
+
+    @staticmethod
+    async def transaction_insert_db_sql(db, cs, table, data_dict):
+        """
+        事务插入sql，需要手动commit（或在transaction()上下文中使用）
+        :param db: 数据库连接对象
+        :param cs: 数据库游标对象
+        :param table: 表名（例如：user）
+        :param data_dict: 数据字典（例如：{"name": "cwd", "age": 18, "sex": "men"}）
+        :return: 插入行id，失败返回None
+        """
+        field_str = ",".join(["`" + data_key + "`" for data_key in data_dict])
+        seat_str = ",".join(["%s"] * len(data_dict))
+        sql = "insert into " + table + "(" + field_str + ") values (" + seat_str + ")"
+
+        try:
+            await execute_sql(cs, sql, list(data_dict.values()))
+            return cs.lastrowid
+        except Exception as e:
+            logging.error(str(e))
+            return None
+
+    @staticmethod
+    async def many_insert_db_sql(db, cs, table, field_list, data_list):
+        """
+        批量插入sql
+        :param db: 数据库连接对象
+        :param cs: 数据库游标对象
+        :param table: 表名（例如：user）
+        :param field_list: 所需字段列表（例如：["id", "name"]）
+        :param data_list: 对应字段数据列表（例如：[(1, "cwd"), (2, "cwd2")]）
+        :return:
+        """
+        field_str = ",".join(["`" + field + "`" for field in field_list])
+        seat_str = ",".join(["%s"] * len(field_list))
+        sql = "insert into " + table + "(" + field_str + ") values (" + seat_str + ")"
+
+        try:
+            await execute_sql(cs, sql, data_list, many=True)
+            await db.commit()
+            return True
+        except Exception as e:
+            logging.error(str(e))
+            await db.rollback()
+            return False
+
+    @staticmethod
+    async def update_db_sql(db, cs, table, data_dict, factor_str, factor_args=None):
+        """
+        更新sql
+        :param db: 数据库连接对象
+        :param cs: 数据库游标对象
+        :param table: 表名（例如：user）
+        :param data_dict: 数据字典（例如：{"name": "cwd", "age": 18, "sex": "men"}）
+        :param factor_str: 条件（例如：`id` = %s）
+        :param factor_args: 条件参数（例如：(1,)）
+        :return:
+        """
+        sql = build_update_sql(table, tuple(data_dict), factor_str)
+        value_list = list(data_dict.values()) + list(factor_args or ())
+
+        try:
+            await execute_sql(cs, sql, value_list)
+            await db.commit()
+            return True
+        except Exception as e:
+            logging.error(str(e))
+            await db.rollback()
+            return False
+
+    @staticmethod
+    async def transaction_update_db_sql(db, cs, table, data_dict, factor_str, factor_args=None):
+        """
+        事务更新sql，需要手动commit（或在transaction()上下文中使用）
+        :param db: 数据库连接对象
+        :param cs: 数据库游标对象
+        :param table: 表名（例如：user）
+        :param data_dict: 数据字典（例如：{"name": "cwd", "age": 18, "sex": "men"}）
+        :param factor_str: 条件（例如：`id` = %s）
+        :param factor_args: 条件参数（例如：(1,)）
+        :return:
+        """
+        sql = build_update_sql(table, tuple(data_dict), factor_str)
+        value_list = list(data_dict.values()) + list(factor_args or ())
+
+        try:
+            await execute_sql(cs, sql, value_list)
+            return True
+        except Exception as e:
+            logging.error(str(e))
+            return False
+
+    @staticmethod
+    async def many_update_db_sql(db, cs, table, field_list, data_list, factor_str):
+        """
+        批量更新sql
+        :param db: 数据库连接对象
+        :param cs: 数据库游标对象
+        :param table: 表名（例如：user）
+        :param field_list: 所需字段列表（例如：["id", "name"]）
+        :param data_list: 对应字段数据列表（例如：[(1, "cwd"), (2, "cwd2")]）
+        :param factor_str: 条件（例如：id=%s）
+        :return:
+        """
+        sql = build_update_sql(table, tuple(field_list), factor_str)
+
+        try:
+            await execute_sql(cs, sql, data_list, many=True)
+            await db.commit()
+            return True
+        except Exception as e:
+            logging.error(str(e))
+            await db.rollback()
+            return False
+
+
+if __name__ == '__main__':
+    import asyncio
+
+    async def main():
+        amt = AioMysqlTool(
+            db_username="root",
+            db_host="127.0.0.1",
+            db_port=3306,
+            db_password="chenweida",
+            db_database="pymysql_test",
+            charset="utf8"
+        )
+        db, cs = await amt.open_db_conn()
+        print(await amt.select_db_count_sql(db, cs, "capital_market"))
+        await amt.close_db_conn(db, cs)
+        await amt.close_pool()
+
+    asyncio.run(main())
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+# ---------------------
+# author: chenweida
+# date:
+# desc: 详情页图片预取（并发下载，按url哈希缓存到本地磁盘），渲染前改写为本地文件或data URI，渲染时不再逐张联网
+# ---------------------
+import base64
+import hashlib
+import html
+import logging
+import mimetypes
+import os
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AssetTool(object):
+    """
+    缓存布局：{cache_path}{sha1前2位}/{sha1(url)}{扩展名}，相同url只下载一次（跨页面、跨运行复用）
+    """
+
+    # 解析进程中img的src先替换为占位符（序列化后为 src="asset-placeholder-序号"），主进程预取后再替换
+    PLACEHOLDER = "asset-placeholder-"
+
+    # 只读缓存时未缓存图片的src（1x1透明gif），渲染时不联网请求原链接
+    BLANK_SRC = "data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7"
+
+    # 文件头 -> MIME（data URI使用，识别不出时按url扩展名猜测）
+    MAGIC_LIST = [
+        (b"\x89PNG", "image/png"),
+        (b"\xff\xd8", "image/jpeg"),
+        (b"GIF8", "image/gif"),
+        (b"BM", "image/bmp"),
+    ]
+
+    def __init__(self, fetch_func, cache_path, worker_number=8, inline="file", max_size=10 * 1024 * 1024):
+        """
+        :param fetch_func: 下载函数，参数为url，返回字节内容，失败返回None（None为只读缓存，不下载，未缓存的图片改为空白）
+        :param cache_path: 缓存目录
+        :param worker_number: 并发下载线程数
+        :param inline: 改写方式（file：本地文件链接，渲染需允许访问本地文件 / data_uri：内嵌base64）
+        :param max_size: 单张图片大小上限（字节），超过不缓存（保留原链接）
+        """
+        if inline not in ("file", "data_uri"):
+            raise ValueError("未知的图片改写方式: {}".format(inline))
+
+        self.fetch_func = fetch_func
+        self.cache_path = os.path.abspath(cache_path)
+        self.inline = inline
+        self.max_size = max_size
+        self.executor = ThreadPoolExecutor(max_workers=worker_number, thread_name_prefix="asset")
+
+        self.lock = threading.Lock()
+        self.hit_count = 0
+        self.download_count = 0
+        self.failure_count = 0
+        self.miss_count = 0
+
+    def cache_file_path(self, url):
+        sha1 = hashlib.sha1(url.encode("utf8")).hexdigest()
+        ext = os.path.splitext(urllib.parse.urlparse(url).path)[1].lower()
+        if not ext or len(ext) > 5:
+            ext = ""
+        return os.path.join(self.cache_path, sha1[:2], sha1 + ext)
+
+    def fetch(self, url):
+        """
+        取得图片的本地缓存路径（未缓存时下载）
+        :param url: 图片链接
+        :return: 本地路径，失败返回None
+        """
+        file_path = self.cache_file_path(url)
+        if os.path.exists(file_path):
+            with self.lock:
+                self.hit_count += 1
+            return file_path
+
+        if self.fetch_func is None:
+            with self.lock:
+                self.miss_count += 1
+            return None
+
+        try:
+            content = self.fetch_func(url)
+        except Exception as e:
+            logging.error("图片下载异常: {}，错误: {}".format(url, str(e)))
+            content = None
+        if not content or len(content) > self.max_size:
+            with self.lock:
+                self.failure_count += 1
+            logging.warning("图片预取失败或超过大小上限，保留原链接: {}".format(url))
+            return None
+
+        # 先写临时文件再改名，并发下载同一url时读到的缓存总是完整的
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temp_path = "{}.{}.tmp".format(file_path, threading.get_ident())
+        with open(temp_path, "wb") as f:
+            f.write(content)
+        os.replace(temp_path, file_path)
+        with self.lock:
+            self.download_count += 1
+        return file_path
+
+    def prefetch(self, url_list):
+        """
+        并发预取一组图片
+        :param url_list: 图片链接列表（可重复）
+        :return: {url: 本地路径}，失败的url不在其中
+        """
+        url_list = list(dict.fromkeys(url for url in url_list if url))
+        path_dict = {}
+        for url, file_path in zip(url_list, self.executor.map(self.fetch, url_list)):
+            if file_path:
+                path_dict[url] = file_path
+        return path_dict
+
+    def get_src(self, url, file_path):
+        """
+        本地缓存改写后的src
+        :param url: 原链接（data URI识别不出文件头时用于猜测MIME）
+        :param file_path: 本地缓存路径
+        :return:
+        """
+        if self.inline == "file":
+            return "file://" + urllib.parse.quote(file_path)
+
+        with open(file_path, "rb") as f:
+            content = f.read()
+        mime = next((mime for magic, mime in self.MAGIC_LIST if content.startswith(magic)), None)
+        if mime is None:
+            if content[:4] == b"RIFF" and content[8:12] == b"WEBP":
+                mime = "image/webp"
+            else:
+                mime = mimetypes.guess_type(urllib.parse.urlparse(url).path)[0] or "application/octet-stream"
+        return "data:{};base64,{}".format(mime, base64.b64encode(content).decode("ascii"))
+
+    def get_miss_src(self, url):
+        """
+        预取失败或未缓存时的src：只读缓存时为空白图片（不保留原链接，渲染时不联网），否则保留原链接
+        :param url: 原链接
+        :return:
+        """
+        return self.BLANK_SRC if self.fetch_func is None else url
+
+    def localize(self, img_list):
+        """
+        预取一组img节点的图片并改写src（失败的见 get_miss_src）
+        :param img_list: lxml img节点列表（src已为绝对链接）
+        :return: 改写数量
+        """
+        path_dict = self.prefetch([img.get("src") for img in img_list])
+        localize_count = 0
+        for img in img_list:
+            file_path = path_dict.get(img.get("src"))
+            if file_path:
+                img.attrib["src"] = self.get_src(img.get("src"), file_path)
+                localize_count += 1
+            elif img.get("src"):
+                img.attrib["src"] = self.get_miss_src(img.get("src"))
+        return localize_count
+
+    @classmethod
+    def set_placeholders(cls, img_list):
+        """
+        img的src替换为占位符（在不能预取的解析进程中使用）
+        :param img_list: lxml img节点列表（src已为绝对链接）
+        :return: 原src列表（序号与占位符对应）
+        """
+        url_list = []
+        for index, img in enumerate(img_list):
+            url_list.append(img.get("src"))
+            img.attrib["src"] = "{}{}".format(cls.PLACEHOLDER, index)
+        return url_list
+
+    def fill_placeholders(self, content_str, url_list):
+        """
+        预取图片并把序列化后html中的占位符替换为本地缓存（失败的见 get_miss_src）
+        :param content_str: 序列化后的html
+        :param url_list: set_placeholders返回的原src列表
+        :return:
+        """
+        path_dict = self.prefetch(url_list)
+        # 占位符连同引号一起匹配（-1 不会匹配到 -10）
+        for index, url in enumerate(url_list):
+            src = self.get_src(url, path_dict[url]) if url in path_dict else self.get_miss_src(url or "")
+            content_str = content_str.replace(
+                '"{}{}"'.format(self.PLACEHOLDER, index), '"{}"'.format(html.escape(src, quote=True))
+            )
+        return content_str
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        logging.info("图片预取: 缓存命中 {} 张，下载 {} 张，失败 {} 张，未缓存（只读缓存）{} 张".format(
+            self.hit_count, self.download_count, self.failure_count, self.miss_count))
+
+
+if __name__ == '__main__':
+    import requests
+
+    at = AssetTool(lambda url: requests.get(url, timeout=10).content, "./cache/asset_cache/")
+    print(at.prefetch(["http://www.csrc.gov.cn/favicon.ico"]))
+    at.close()
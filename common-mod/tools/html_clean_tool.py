@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# ---------------------
+# author: chenweida
+# date:
+# desc: 详情页正文清洗：预编译XPath定位正文节点，对每个正文节点一次遍历完成全部改写（附件提取、链接/图片/字体改写、
+#       移除信息公开表格及打印关闭栏），字体及url解码在属性/文本级处理，最后只序列化一次
+# ---------------------
+import re
+import urllib.parse
+
+from lxml import etree
+from lxml.html import tostring
+
+
+class DetailCleaner(object):
+    """
+    清洗规则（与原多次XPath清洗一致）：
+        正文节点为含h2的div.content，移除其中第一个h2
+        div#files: 移除style（附件隐藏属性），其下直接子节点a为附件
+        div.detail-news内的a: href含/files/的为附件
+        a: href改为javascript:void(0);（先提取附件）
+        img: src改为绝对链接
+        font: 移除face属性
+        div.xxgk-table、div.xxgk-down-box: 移除
+        style属性及style标签: 移除font-family（系统无该字体时html转pdf会乱码）
+        属性值及文本: url编码（%xx）转为中文
+    """
+
+    CONTENT_XPATH = etree.XPath('//div[@class="content"]')
+    FIRST_H2_XPATH = etree.XPath('(.//h2)[1]')
+    # 正文起始标记，只解析从该位置开始的片段（跳过页头、导航）
+    CONTENT_MARKER = '<div class="content"'
+    FONT_FAMILY_RE = re.compile(r'font-family[^;]*(;|$)')
+    REMOVE_CLASS_SET = {"xxgk-table", "xxgk-down-box"}
+
+    def __init__(self, website_base_url):
+        """
+        :param website_base_url: 网站根链接（.mp4附件相对于根链接）
+        """
+        self.website_base_url = website_base_url
+
+    def parse_content_fragment(self, data_str):
+        """
+        从正文起始标记处开始解析（未找到标记时解析整页）
+        :param data_str: 详情页html
+        :return: 正文节点列表
+        """
+        marker_index = data_str.find(self.CONTENT_MARKER)
+        tree = etree.HTML(data_str[marker_index:] if marker_index > 0 else data_str)
+        if tree is None:
+            return []
+        return self.CONTENT_XPATH(tree)
+
+    def clean(self, data_str, detail_url):
+        """
+        清洗详情页
+        :param data_str: 详情页html
+        :param detail_url: 详情页链接（相对链接以其所在目录为基准）
+        :return: (正文节点列表, 附件列表[(链接, 标题)]（已去重）, img节点列表（src已为绝对链接）)
+        """
+        url_head = detail_url[:detail_url.rfind("/") + 1]
+        content_node_list = []
+        file_info_set = set()
+        img_list = []
+
+        for content in self.parse_content_fragment(data_str):
+            # 无标题说明该div.content并非正文节点
+            h2_list = self.FIRST_H2_XPATH(content)
+            if not h2_list:
+                continue
+            h2_list[0].getparent().remove(h2_list[0])
+
+            remove_list = []
+            for element in content.iter(etree.Element):
+                tag = element.tag
+                attrib = element.attrib
+
+                if tag == "a":
+                    href = attrib.get("href")
+                    if href is None:
+                        continue
+                    file_info = self.get_file_info(element, href, url_head)
+                    if file_info:
+                        file_info_set.add(file_info)
+                    attrib["href"] = "javascript:void(0);"
+                elif tag == "img":
+                    src = attrib.get("src")
+                    if src is not None:
+                        if "http" not in src:
+                            src = url_head + (src[1:] if src.startswith("/") else src)
+                        attrib["src"] = urllib.parse.unquote(src)
+                        img_list.append(element)
+                elif tag == "font":
+                    attrib.pop("face", None)
+                elif tag == "div":
+                    if attrib.get("id") == "files":
+                        attrib.pop("style", None)
+                    elif attrib.get("class") in self.REMOVE_CLASS_SET:
+                        # 遍历结束后再移除（其中的附件仍然提取）
+                        remove_list.append(element)
+                elif tag == "style" and element.text:
+                    element.text = self.FONT_FAMILY_RE.sub("", element.text)
+
+                style = attrib.get("style")
+                if style and "font-family" in style:
+                    attrib["style"] = self.FONT_FAMILY_RE.sub("", style)
+                self.unquote_node(element)
+
+            for element in remove_list:
+                element.getparent().remove(element)
+            content_node_list.append(content)
+
+        return content_node_list, list(file_info_set), img_list
+
+    def get_file_info(self, a, href, url_head):
+        """
+        附件链接及标题（div#files的直接子节点a，或div.detail-news内href含/files/的a）
+        :return: (链接, 标题)，不是附件时返回None
+        """
+        parent = a.getparent()
+        if parent.tag == "div" and parent.get("id") == "files":
+            pass
+        elif "/files/" in href and any(
+                ancestor.tag == "div" and ancestor.get("class") == "detail-news" for ancestor in a.iterancestors()):
+            pass
+        else:
+            return None
+
+        # 与原实现一致: 只跳过没有文本节点的a (空白标题的附件保留, 标题为空字符串)
+        text_list = list(a.itertext())
+        if not text_list:
+            return None
+        title = "".join(text_list).strip()
+        if "http" not in href:
+            href = href[1:] if href.startswith("/") else href
+            if href.endswith((".mp4", ".MP4")):
+                href = self.website_base_url + href
+            else:
+                href = url_head + href
+        return href, title
+
+    @staticmethod
+    def unquote_node(element):
+        """
+        属性值及文本中的url编码转为中文（href已改写，img的src已处理）
+        """
+        for key, value in element.attrib.items():
+            if "%" in value and key not in ("href", "src"):
+                element.attrib[key] = urllib.parse.unquote(value)
+        if element.text and "%" in element.text:
+            element.text = urllib.parse.unquote(element.text)
+        if element.tail and "%" in element.tail:
+            element.tail = urllib.parse.unquote(element.tail)
+
+    @staticmethod
+    def serialize(content_node_list):
+        """
+        正文节点序列化为html
+        :param content_node_list: 正文节点列表
+        :return:
+        """
+        return "".join(tostring(content, encoding="unicode", method="html") for content in content_node_list)
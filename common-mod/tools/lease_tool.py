@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+# ---------------------
+# author: chenweida
+# date:
+# desc: 基于数据库租约的任务认领，多个worker（可跨机器）共同消费同一张任务表
+# ---------------------
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from .sql_tool import SqlFactor, append_factor, split_factor
+
+
+class LeaseTool(object):
+    """
+    任务行增加 claimed_by、lease_until 两列（见 sql/csrc_gov_task_claim_mysql.sql）：
+        lease_until 为空或已过期的行可被认领
+        认领：一条update把一批可认领行的 claimed_by 设为本批次令牌、lease_until 设为租约到期时间
+        续约：处理耗时超过半个租约时延长未完成行的租约
+        完成：claimed_by 设为完成标记、lease_until 设为完成时间，本次运行开始后完成的行不再被本worker认领
+        释放：处理失败的行把 lease_until 设为退避时间，退避结束前不会被任何worker认领
+    worker崩溃时租约自然过期，由其他worker重新认领
+    """
+
+    # 完成标记（写入claimed_by）
+    DONE_MARK = "done"
+
+    def __init__(self, mysql_tool, table, key_field="id", batch_size=20, lease_seconds=600, retry_backoff=300):
+        """
+        :param mysql_tool: MysqlTool对象
+        :param table: 表名（例如：csrc_gov）
+        :param key_field: 主键字段（例如：id）
+        :param batch_size: 每次认领条数
+        :param lease_seconds: 租约时长（秒），需大于单条任务最长处理时间
+        :param retry_backoff: 失败释放后多少秒内不再被认领
+        """
+        self.mysql_tool = mysql_tool
+        self.table = table
+        self.key_field = key_field
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.retry_backoff = retry_backoff
+
+        # worker标识（主机名-进程号-随机串），各批次令牌以此为前缀
+        self.worker_id = "{}-{}-{}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:6])
+        self.batch_number = 0
+        # 本次运行开始时间（此后完成的行不再认领，下次运行重新认领）
+        self.run_start_str = self.time_str()
+        # 未完成主键 -> 认领令牌（渲染、上传完成回调在其他线程中结束任务，可能晚于下一批认领）
+        self.pending_key_dict = {}
+        # 已完成待写入完成标记的主键 {认领令牌: [主键, ...]}
+        self.done_key_dict = {}
+        self.last_renew_time = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def time_str(offset_seconds=0):
+        return (datetime.datetime.now() + datetime.timedelta(seconds=offset_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+    def claimable_factor(self):
+        """
+        可认领条件：租约为空或已过期，且不是本次运行开始后完成的行
+        :return: (条件语句, 参数列表)
+        """
+        clause = "(`lease_until` is null or `lease_until` < %s) and " \
+                 "(`claimed_by` is null or `claimed_by` != %s or `lease_until` < %s)"
+        return clause, [self.time_str(), self.DONE_MARK, self.run_start_str]
+
+    def claim(self, factor_str, factor_args=None):
+        """
+        认领一批任务
+        :param factor_str: 任务条件（SqlFactor.build()生成，可带order by，不可带limit）
+        :param factor_args: 任务条件参数
+        :return: 认领到的任务行列表（与其他worker竞争失败时可能为空，是否还有任务见count_claimable），失败返回None
+        """
+        # 先写入已完成行的完成标记
+        self.flush_done()
+
+        self.batch_number += 1
+        claim_token = "{}:{}".format(self.worker_id, self.batch_number)
+        quote_key = "`" + self.key_field + "`"
+        claimable_str, claimable_args = self.claimable_factor()
+
+        # 子查询挑选候选行（派生表带limit，MySQL会物化后再更新同一张表）；
+        # 外层update加锁后再次判断租约，并发认领时同一行只会被一个worker拿到
+        sql = "update {0} set `claimed_by` = %s, `lease_until` = %s where {1} in (" \
+              "select {1} from (select {1} from {0} where {2} limit {3}) as claim_t" \
+              ") and ({4})".format(self.table, quote_key, append_factor(factor_str, claimable_str),
+                                   int(self.batch_size), claimable_str)
+        args = [claim_token, self.time_str(self.lease_seconds)] + list(factor_args or ()) + \
+            claimable_args + claimable_args
+
+        db, cs = self.mysql_tool.open_db_conn()
+        ret = self.mysql_tool.execute_db_sql(db, cs, sql, args)
+        if not ret:
+            self.mysql_tool.close_db_conn(db, cs)
+            logging.error("认领任务失败")
+            return None
+
+        select_factor_str, select_factor_args = SqlFactor().eq("claimed_by", claim_token).build()
+        data_list = self.mysql_tool.select_db_sql(db, cs, self.table, [], select_factor_str, select_factor_args)
+        self.mysql_tool.close_db_conn(db, cs)
+        if data_list is None:
+            return None
+
+        with self.lock:
+            # 首批认领时开始计时续约
+            if not self.pending_key_dict:
+                self.last_renew_time = time.time()
+            for data in data_list:
+                self.pending_key_dict[data[self.key_field]] = claim_token
+        logging.info("认领任务 {} 条 (令牌 {})".format(len(data_list), claim_token))
+        return data_list
+
+    def count_claimable(self, factor_str, factor_args=None):
+        """
+        统计当前可认领的任务数（认领为空时据此判断是否结束）
+        :param factor_str: 任务条件（同claim）
+        :param factor_args: 任务条件参数
+        :return: 条数，失败返回None
+        """
+        where_str, _ = split_factor(factor_str)
+        claimable_str, claimable_args = self.claimable_factor()
+        db, cs = self.mysql_tool.open_db_conn()
+        ret = self.mysql_tool.select_db_count_sql(
+            db, cs, self.table, append_factor(where_str, claimable_str), list(factor_args or ()) + claimable_args
+        )
+        self.mysql_tool.close_db_conn(db, cs)
+        return ret["count"] if ret else None
+
+    def update_lease(self, key_list, data_dict, claim_token):
+        """
+        更新指定认领令牌下指定行的租约（令牌不符说明租约已过期并被其他worker认领，不更新）
+        :param key_list: 主键列表
+        :param data_dict: 更新字段（lease_until，完成时还有claimed_by）
+        :param claim_token: 认领令牌
+        :return:
+        """
+        if not key_list:
+            return True
+        factor_str, factor_args = (
+            SqlFactor().eq("claimed_by", claim_token).is_in(self.key_field, key_list).build()
+        )
+        db, cs = self.mysql_tool.open_db_conn()
+        ret = self.mysql_tool.update_db_sql(db, cs, self.table, data_dict, factor_str, factor_args)
+        self.mysql_tool.close_db_conn(db, cs)
+        return ret
+
+    @staticmethod
+    def group_by_token(key_token_list):
+        """
+        :param key_token_list: [(主键, 认领令牌), ...]
+        :return: {认领令牌: [主键, ...]}
+        """
+        token_dict = {}
+        for key, claim_token in key_token_list:
+            token_dict.setdefault(claim_token, []).append(key)
+        return token_dict
+
+    def heartbeat(self):
+        """
+        处理每条任务前调用，距上次续约超过半个租约时为全部未完成行续约（并写入已完成行的完成标记）
+        :return:
+        """
+        with self.lock:
+            if not self.pending_key_dict or time.time() - self.last_renew_time < self.lease_seconds / 2:
+                return True
+            self.last_renew_time = time.time()
+            token_dict = self.group_by_token(self.pending_key_dict.items())
+
+        lease_until = self.time_str(self.lease_seconds)
+        ret = all([self.update_lease(key_list, {"lease_until": lease_until}, claim_token)
+                   for claim_token, key_list in token_dict.items()])
+        if ret:
+            logging.info("续约任务 {} 条".format(sum(len(key_list) for key_list in token_dict.values())))
+        else:
+            logging.error("续约任务失败")
+        self.flush_done()
+        return ret
+
+    def complete(self, key):
+        """
+        任务处理完成（完成标记在下次认领、续约或close时批量写入）
+        :param key: 主键值
+        :return:
+        """
+        with self.lock:
+            claim_token = self.pending_key_dict.pop(key, None)
+            if claim_token:
+                self.done_key_dict.setdefault(claim_token, []).append(key)
+
+    def flush_done(self):
+        """
+        写入已完成行的完成标记（失败时保留，下次再写；始终失败则租约到期后可能被重新认领一次）
+        :return:
+        """
+        with self.lock:
+            done_key_dict, self.done_key_dict = self.done_key_dict, {}
+
+        done_data_dict = {"claimed_by": self.DONE_MARK, "lease_until": self.time_str()}
+        for claim_token, key_list in done_key_dict.items():
+            if not self.update_lease(key_list, done_data_dict, claim_token):
+                logging.error("写入完成标记失败 (令牌 {})".format(claim_token))
+                with self.lock:
+                    self.done_key_dict.setdefault(claim_token, []).extend(key_list)
+
+    def release(self, key):
+        """
+        任务处理失败，释放租约并退避
+        :param key: 主键值
+        :return:
+        """
+        with self.lock:
+            claim_token = self.pending_key_dict.pop(key, None)
+        if not claim_token:
+            return True
+        ret = self.update_lease([key], {"lease_until": self.time_str(self.retry_backoff)}, claim_token)
+        logging.info("释放任务 {}={}，{} 秒后可重新认领".format(self.key_field, key, self.retry_backoff))
+        return ret
+
+    def close(self):
+        """
+        运行结束时写入剩余的完成标记
+        :return:
+        """
+        self.flush_done()
+        if self.pending_key_dict:
+            logging.warning("仍有 {} 条任务未结束，租约到期后可重新认领".format(len(self.pending_key_dict)))
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# ---------------------
+# author: chenweida
+# date:
+# desc: 本地目录替身OBS，方法签名与OBSTool一致，可模拟带宽及延迟，用于本地离线运行、压测及性能分析
+# ---------------------
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+
+from .obs_tool import OBSTool
+
+
+class LocalObsResult(dict):
+    """
+    响应体（对应obs的GetResult.body，支持属性及下标访问）
+    """
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
+
+
+class LocalObsResponse(object):
+    """
+    响应（对应obs的GetResult：status、reason、errorCode、errorMessage、body、header）
+    """
+
+    def __init__(self, status, body=None, header=None, error_message=None):
+        self.status = status
+        self.reason = "OK" if status < 300 else "Not Found"
+        self.errorCode = None if status < 300 else "NoSuchKey"
+        self.errorMessage = error_message
+        self.body = body
+        self.header = header or []
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+class LocalObsClient(object):
+    """
+    ObsClient适配：对象保存为 root_path/桶名/对象名，元数据保存为 root_path/.meta/桶名/对象名.json
+    """
+
+    def __init__(self, root_path, bandwidth_mbps=None, latency_ms=0):
+        """
+        :param root_path: 本地根目录
+        :param bandwidth_mbps: 单连接模拟带宽（Mbps，None为不限速）
+        :param latency_ms: 每次请求模拟延迟（毫秒）
+        """
+        self.root_path = os.path.abspath(root_path)
+        self.bandwidth_mbps = bandwidth_mbps
+        self.latency_ms = latency_ms
+        self.lock = threading.Lock()
+
+    def object_path(self, bucket_name, object_key):
+        return os.path.join(self.root_path, bucket_name, object_key)
+
+    def meta_path(self, bucket_name, object_key):
+        return os.path.join(self.root_path, ".meta", bucket_name, object_key + ".json")
+
+    def simulate(self, size, connection_number=1, request_number=1):
+        """
+        模拟网络耗时：请求延迟 + 传输耗时（多连接并发时带宽叠加）
+        :param size: 传输字节数
+        :param connection_number: 并发连接数
+        :param request_number: 每个连接依次发出的请求数
+        :return:
+        """
+        seconds = self.latency_ms / 1000 * request_number
+        if self.bandwidth_mbps:
+            seconds += size * 8 / (self.bandwidth_mbps * 1000 * 1000 * connection_number)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def write_object(self, bucket_name, object_key, content, etag, metadata=None):
+        object_path = self.object_path(bucket_name, object_key)
+        meta_path = self.meta_path(bucket_name, object_key)
+        for dir_path in (os.path.dirname(object_path), os.path.dirname(meta_path)):
+            if not os.path.exists(dir_path):
+                os.makedirs(dir_path, exist_ok=True)
+
+        # 先写临时文件再改名，读到的对象总是完整的
+        with self.lock:
+            temp_path = "{}.{}.tmp".format(object_path, threading.get_ident())
+            with open(temp_path, "wb") as f:
+                f.write(content)
+            os.replace(temp_path, object_path)
+            with open(meta_path, "w", encoding="utf8") as f:
+                json.dump({
+                    "etag": etag,
+                    "contentLength": len(content),
+                    "lastModified": time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime()),
+                    "metadata": metadata or {}
+                }, f, ensure_ascii=False)
+        return LocalObsResponse(200, LocalObsResult(etag='"{}"'.format(etag)))
+
+    def createBucket(self, bucketName, location=None):
+        os.makedirs(os.path.join(self.root_path, bucketName), exist_ok=True)
+        return LocalObsResponse(200)
+
+    def putContent(self, bucketName, objectKey, content=None, metadata=None):
+        if isinstance(content, str):
+            content = content.encode("utf8")
+        content = content or b""
+        self.simulate(len(content))
+        return self.write_object(bucketName, objectKey, content, hashlib.md5(content).hexdigest(), metadata)
+
+    def putFile(self, bucketName, objectKey, file_path, metadata=None):
+        with open(file_path, "rb") as f:
+            content = f.read()
+        self.simulate(len(content))
+        return self.write_object(bucketName, objectKey, content, hashlib.md5(content).hexdigest(), metadata)
+
+    def uploadFile(self, bucketName, objectKey, uploadFile, partSize=9 * 1024 * 1024, taskNum=1,
+                   enableCheckpoint=False, checkpointFile=None, metadata=None):
+        with open(uploadFile, "rb") as f:
+            content = f.read()
+        part_number = max(1, math.ceil(len(content) / partSize))
+        connection_number = min(taskNum, part_number)
+        # 初始化 + 各分段 + 合并
+        self.simulate(len(content), connection_number, math.ceil(part_number / connection_number) + 2)
+
+        # 分段上传对象的ETag为各分段md5拼接后的md5加分段数
+        part_md5 = b"".join(
+            hashlib.md5(content[index:index + partSize]).digest() for index in range(0, len(content), partSize)
+        )
+        etag = "{}-{}".format(hashlib.md5(part_md5).hexdigest(), part_number)
+        if enableCheckpoint and checkpointFile and os.path.exists(checkpointFile):
+            os.remove(checkpointFile)
+        return self.write_object(bucketName, objectKey, content, etag, metadata)
+
+    def getObject(self, bucketName, objectKey, downloadPath=None, loadStreamInMemory=False):
+        object_path = self.object_path(bucketName, objectKey)
+        if not os.path.exists(object_path):
+            return LocalObsResponse(404, error_message="对象不存在: {}".format(objectKey))
+        self.simulate(os.path.getsize(object_path))
+
+        meta_resp = self.getObjectMetadata(bucketName, objectKey)
+        if downloadPath:
+            download_dir_path = os.path.dirname(downloadPath)
+            if download_dir_path and not os.path.exists(download_dir_path):
+                os.makedirs(download_dir_path)
+            shutil.copyfile(object_path, downloadPath)
+        body = LocalObsResult(meta_resp.body, url=downloadPath)
+        if loadStreamInMemory:
+            with open(object_path, "rb") as f:
+                body["buffer"] = f.read()
+        return LocalObsResponse(200, body, meta_resp.header)
+
+    def getObjectMetadata(self, bucketName, objectKey):
+        meta_path = self.meta_path(bucketName, objectKey)
+        if not os.path.exists(meta_path):
+            return LocalObsResponse(404, error_message="对象不存在: {}".format(objectKey))
+        self.simulate(0)
+
+        with open(meta_path, "r", encoding="utf8") as f:
+            meta_dict = json.load(f)
+        body = LocalObsResult(
+            etag='"{}"'.format(meta_dict["etag"]),
+            contentLength=meta_dict["contentLength"],
+            lastModified=meta_dict["lastModified"]
+        )
+        # 自定义元数据与obs一致，以去掉前缀的键出现在header中
+        header = [("etag", body.etag), ("content-length", str(body.contentLength))]
+        header.extend(meta_dict["metadata"].items())
+        return LocalObsResponse(200, body, header)
+
+
+class LocalOBSTool(OBSTool):
+    """
+    继承OBSTool的全部方法（只依赖client接口），仅替换client及访问链接
+    """
+
+    def __init__(self, root_path, bt, fd, bandwidth_mbps=None, latency_ms=0, multipart_threshold=None,
+                 part_size=9 * 1024 * 1024, task_num=4, checkpoint_path="./cache/obs_checkpoint_cache/"):
+        """
+        :param root_path: 本地根目录（例如：./cache/obs_local/）
+        :param bt: 桶名（本地子目录）
+        :param fd: 对象名前缀（例如：csrc_gov/）
+        :param bandwidth_mbps: 单连接模拟带宽（Mbps，None为不限速）
+        :param latency_ms: 每次请求模拟延迟（毫秒）
+        """
+        self.access = None
+        self.secret = None
+        self.server = None
+        self.bucket = bt
+        self.folder = fd or ""
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+        self.task_num = task_num
+        self.checkpoint_path = checkpoint_path
+
+        self.client = LocalObsClient(root_path, bandwidth_mbps, latency_ms)
+        self.client.createBucket(self.bucket)
+        # 访问链接
+        self.base = "file://{}/{}/{}".format(self.client.root_path, self.bucket, self.folder)
+        logging.info("使用本地替身OBS: {} (带宽 {} Mbps, 延迟 {} ms)".format(
+            self.base, bandwidth_mbps or "不限", latency_ms))
+
+
+if __name__ == '__main__':
+    lot = LocalOBSTool("./cache/obs_local/", "obs-cninfo-test", "cwd_test/", bandwidth_mbps=100, latency_ms=20)
+    lot.upload_text("test.txt", "hello")
+    print(lot.get_object_md5("test.txt"))
+    print(lot.download_file("test.txt", "./cache/obs_local_download/test.txt").body)
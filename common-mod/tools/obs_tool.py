@@ -4,12 +4,24 @@
 # date:
 # desc:
 # ---------------------
+import hashlib
+import logging
+import os
+import shutil
+
 from obs import ObsClient
 
 
 class OBSTool(object):
 
-    def __init__(self, ak, sk, sv, bt, fd):
+    def __init__(self, ak, sk, sv, bt, fd, multipart_threshold=None, part_size=9 * 1024 * 1024, task_num=4,
+                 checkpoint_path="./cache/obs_checkpoint_cache/"):
+        """
+        :param multipart_threshold: 文件大于该字节数时分段并发上传（None为不分段）
+        :param part_size: 分段大小（字节，OBS要求100KB~5GB）
+        :param task_num: 分段并发上传数
+        :param checkpoint_path: 断点续传记录文件目录
+        """
 
         # obs配置
         self.access = ak
@@ -17,6 +29,11 @@ class OBSTool(object):
         self.server = sv
         self.bucket = bt
         self.folder = fd
+        # 分段上传配置
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+        self.task_num = task_num
+        self.checkpoint_path = checkpoint_path
         # 打开obs连接
         self.client = ObsClient(access_key_id=self.access, secret_access_key=self.secret, server=self.server)
         # obs访问链接
@@ -36,34 +53,97 @@ class OBSTool(object):
         else:
             return False
 
-    def upload_text(self, object_name, file_content):
+    def upload_text(self, object_name, file_content, metadata=None):
         """
         上传文本/字节流
         :param object_name: 对象名称
         :param file_content: 文本/字节流
+        :param metadata: 自定义元数据（例如：{"md5": "..."}）
         :return:
         """
-        resp = self.client.putContent(self.bucket, self.folder + object_name, content=file_content)
+        resp = self.client.putContent(self.bucket, self.folder + object_name, content=file_content, metadata=metadata)
 
         if resp.status < 300:
             return True
         else:
             return False
 
-    def upload_file(self, object_name, file_path):
+    def upload_file(self, object_name, file_path, metadata=None):
         """
         上传文件
         :param object_name: 对象名称
         :param file_path: 文件路径
+        :param metadata: 自定义元数据
         :return:
         """
-        resp = self.client.putFile(self.bucket, self.folder + object_name, file_path=file_path)
+        resp = self.client.putFile(self.bucket, self.folder + object_name, file_path=file_path, metadata=metadata)
 
         if resp.status < 300:
             return True
         else:
             return False
 
+    def upload_multipart_file(self, object_name, file_path, metadata=None, checkpoint_key=None):
+        """
+        分段并发上传文件（断点续传：失败时保留记录文件，下次上传同一对象时只上传未完成的分段）
+        续传要求对象名、文件路径、文件大小及修改时间都与记录一致，传入checkpoint_key（例如内容md5）时
+        先把文件移到断点续传目录下的固定位置（已存在时沿用，不重写），上传成功后删除
+        :param object_name: 对象名称（续传时须与上次相同）
+        :param file_path: 文件路径
+        :param metadata: 自定义元数据
+        :param checkpoint_key: 文件内容的稳定标识（None为直接上传file_path，只有文件路径不变时才能续传）
+        :return:
+        """
+        if not os.path.exists(self.checkpoint_path):
+            os.makedirs(self.checkpoint_path)
+        record_name = hashlib.md5(
+            (self.bucket + self.folder + object_name + (checkpoint_key or "")).encode("utf-8")
+        ).hexdigest()
+        checkpoint_file = os.path.join(self.checkpoint_path, record_name + ".upload_record")
+
+        upload_path = file_path
+        if checkpoint_key:
+            upload_path = os.path.join(self.checkpoint_path, record_name + os.path.splitext(file_path)[1])
+            if not os.path.exists(upload_path):
+                shutil.move(file_path, upload_path)
+        if os.path.exists(checkpoint_file):
+            logging.info("从断点继续上传: {}".format(object_name))
+
+        resp = self.client.uploadFile(
+            self.bucket, self.folder + object_name, upload_path,
+            partSize=self.part_size, taskNum=self.task_num,
+            enableCheckpoint=True, checkpointFile=checkpoint_file, metadata=metadata
+        )
+
+        if resp.status < 300:
+            if upload_path != file_path:
+                os.remove(upload_path)
+            return True
+        else:
+            logging.error("分段上传失败: {} {} {}".format(object_name, resp.errorCode, resp.errorMessage))
+            return False
+
+    def is_multipart_size(self, file_size):
+        """
+        该大小的文件是否分段上传
+        :param file_size: 文件大小（字节）
+        :return:
+        """
+        return self.multipart_threshold is not None and file_size > self.multipart_threshold
+
+    def upload_file_auto(self, object_name, file_path, metadata=None, checkpoint_key=None):
+        """
+        按文件大小选择上传方式：超过multipart_threshold分段并发上传，否则整体上传
+        :param object_name: 对象名称
+        :param file_path: 文件路径
+        :param metadata: 自定义元数据
+        :param checkpoint_key: 分段上传时文件内容的稳定标识（见upload_multipart_file）
+        :return:
+        """
+        if self.is_multipart_size(os.path.getsize(file_path)):
+            return self.upload_multipart_file(object_name, file_path, metadata, checkpoint_key)
+        return self.upload_file(object_name, file_path, metadata)
+
     def download_file(self, object_name, file_path):
         """
         下载文件
@@ -78,6 +158,39 @@ class OBSTool(object):
         else:
             return None
 
+    def download_content(self, object_name):
+        """
+        下载对象内容到内存
+        :param object_name: 对象名称
+        :return: 字节流，不存在时返回None
+        """
+        resp = self.client.getObject(self.bucket, self.folder + object_name, loadStreamInMemory=True)
+
+        if resp.status < 300:
+            return resp.body.buffer
+        else:
+            return None
+
+    def get_object_md5(self, object_name):
+        """
+        获取已上传对象的内容md5（优先取上传时写入的自定义元数据md5，其次取整体上传对象的ETag）
+        :param object_name: 对象名称
+        :return: md5，对象不存在时返回None
+        """
+        resp = self.get_metadata(self.folder + object_name)
+        if resp is None:
+            return None
+
+        header_dict = dict(resp.header or [])
+        md5 = header_dict.get("md5") or header_dict.get("x-obs-meta-md5")
+        if md5:
+            return md5
+        # 分段上传对象的ETag不是内容md5（形如"xxx-3"）
+        etag = (resp.body.etag or "").strip('"')
+        if etag and "-" not in etag:
+            return etag
+        return None
+
     def get_metadata(self, object_name):
         """
         获取元数据
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+# ---------------------
+# author: chenweida
+# date:
+# desc: 本地写库发件箱（sqlite追加日志），数据库慢或不可用时先落本地，恢复后按批重放
+# ---------------------
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import pymysql
+
+
+class OutboxTool(object):
+    """
+    写库顺序：
+        1. 发件箱为空且未处于降级状态时直接写库
+        2. 写库失败或耗时超过slow_threshold时进入降级状态，retry_interval秒内的写入只追加到发件箱
+        3. 降级结束后先按顺序重放发件箱（每batch_size条一个事务），全部重放完才恢复直接写库
+    记录类型：
+        insert / update / case_update：由本工具重放
+        其他类型：由register_handler注册的处理函数重放（例如列表页延后解析）
+    重放为至少一次语义（写库成功后删除本地记录），处理函数需可重复执行
+    数据库可连接但同一条记录重放失败max_attempts次后移入outbox_dead表，避免阻塞后续记录
+    连接类错误（断线、超时等）不计入失败次数，数据库长时间不可用也不会把记录移入outbox_dead
+    """
+
+    # 连接类错误
+    CONNECTION_ERROR_TUPLE = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+    def __init__(self, mysql_tool, outbox_path, batch_size=100, slow_threshold=5.0, retry_interval=30,
+                 max_attempts=5):
+        """
+        :param mysql_tool: MysqlTool对象
+        :param outbox_path: 发件箱文件路径（例如：./cache/outbox_cache/csrc_gov_list.db）
+        :param batch_size: 重放时每批条数
+        :param slow_threshold: 单次写库超过多少秒视为数据库变慢
+        :param retry_interval: 降级后多少秒再尝试写库
+        :param max_attempts: 单条记录最多重放次数
+        """
+        self.mysql_tool = mysql_tool
+        self.outbox_path = outbox_path
+        self.batch_size = batch_size
+        self.slow_threshold = slow_threshold
+        self.retry_interval = retry_interval
+        self.max_attempts = max_attempts
+
+        # 记录类型与重放处理函数映射
+        self.handler_dict = {}
+        # 降级截止时间
+        self.degraded_until = 0
+        self.lock = threading.RLock()
+
+        outbox_dir_path = os.path.dirname(self.outbox_path)
+        if outbox_dir_path and not os.path.exists(outbox_dir_path):
+            os.makedirs(outbox_dir_path)
+        self.conn = sqlite3.connect(self.outbox_path, check_same_thread=False)
+        # WAL追加写，synchronous=FULL每次提交落盘
+        self.conn.execute("pragma journal_mode=wal")
+        self.conn.execute("pragma synchronous=full")
+        for table_name in ("outbox", "outbox_dead"):
+            self.conn.execute(
+                "create table if not exists {} ("
+                "seq integer primary key autoincrement, op text not null, table_name text, "
+                "payload text not null, create_time real not null, attempts integer not null default 0)"
+                .format(table_name)
+            )
+        self.conn.commit()
+
+        pending_count = self.pending_count()
+        if pending_count:
+            logging.info("发件箱中有上次未重放的记录 {} 条: {}".format(pending_count, self.outbox_path))
+
+    def register_handler(self, op, handler):
+        """
+        注册自定义记录的重放处理函数
+        :param op: 记录类型（例如：list_page）
+        :param handler: 处理函数，参数为payload，成功返回True
+        :return:
+        """
+        self.handler_dict[op] = handler
+
+    def pending_count(self):
+        with self.lock:
+            return self.conn.execute("select count(*) from outbox").fetchone()[0]
+
+    def append(self, op, table, payload):
+        """
+        追加一条记录并落盘
+        :param op: 记录类型
+        :param table: 表名
+        :param payload: 记录内容（可json序列化）
+        :return:
+        """
+        with self.lock:
+            self.conn.execute(
+                "insert into outbox (op, table_name, payload, create_time) values (?, ?, ?, ?)",
+                (op, table, json.dumps(payload, ensure_ascii=False, default=str), time.time())
+            )
+            self.conn.commit()
+        return True
+
+    def mark_degraded(self, reason):
+        """
+        进入降级状态
+        :param reason: 原因
+        :return:
+        """
+        if time.time() >= self.degraded_until:
+            logging.warning("数据库{}，{} 秒内写入转存本地发件箱: {}".format(
+                reason, self.retry_interval, self.outbox_path))
+        self.degraded_until = time.time() + self.retry_interval
+
+    def mark_elapsed(self, elapsed):
+        """
+        记录一次写库耗时，超过阈值时进入降级状态
+        :param elapsed: 耗时（秒）
+        :return:
+        """
+        if elapsed >= self.slow_threshold:
+            self.mark_degraded("写入耗时 {:.1f}s".format(elapsed))
+
+    def is_degraded(self):
+        """
+        是否需要写入发件箱（降级中，或降级结束但发件箱尚未重放完）
+        :return:
+        """
+        if time.time() < self.degraded_until:
+            return True
+        if self.pending_count():
+            return not self.drain()
+        return False
+
+    def write(self, op, table, payload):
+        """
+        写库，数据库慢或不可用时写入发件箱
+        :param op: insert / update / case_update
+        :param table: 表名
+        :param payload: 记录内容
+        :return:
+        """
+        with self.lock:
+            if self.is_degraded():
+                return self.append(op, table, payload)
+
+            start_time = time.time()
+            try:
+                db, cs = self.mysql_tool.open_db_conn()
+                ret = self.apply_sql_record(db, cs, op, table, payload)
+                if ret:
+                    db.commit()
+                else:
+                    db.rollback()
+                self.mysql_tool.close_db_conn(db, cs)
+            except Exception as e:
+                logging.error("写库失败: {}".format(str(e)))
+                ret = False
+            self.mark_elapsed(time.time() - start_time)
+
+            if not ret:
+                self.mark_degraded("写入失败")
+                return self.append(op, table, payload)
+            return True
+
+    def insert(self, table, data_dict):
+        return self.write("insert", table, {"data": data_dict})
+
+    def update(self, table, data_dict, factor_str, factor_args=None):
+        return self.write("update", table, {"data": data_dict, "factor_str": factor_str,
+                                            "factor_args": list(factor_args or ())})
+
+    def case_update(self, table, key_field, data_dict_map):
+        # json的键只能是字符串，以列表保存
+        return self.write("case_update", table, {"key_field": key_field,
+                                                 "rows": [[key, data] for key, data in data_dict_map.items()]})
+
+    def apply_sql_record(self, db, cs, op, table, payload):
+        """
+        在事务中执行一条记录（不提交）
+        :return:
+        """
+        if op == "insert":
+            return self.mysql_tool.transaction_insert_db_sql(db, cs, table, payload["data"]) is not None
+        if op == "update":
+            return self.mysql_tool.transaction_update_db_sql(
+                db, cs, table, payload["data"], payload["factor_str"], payload["factor_args"]
+            )
+        if op == "case_update":
+            return self.mysql_tool.transaction_many_case_update_db_sql(
+                db, cs, table, payload["key_field"], {key: data for key, data in payload["rows"]}
+            )
+        raise Exception("未知的发件箱记录类型: {}".format(op))
+
+    def apply_batch(self, record_list):
+        """
+        重放一批记录：连续的sql记录在一个事务中提交，自定义记录交给处理函数
+        :param record_list: [(seq, op, table_name, payload)]
+        :return: (已成功重放的seq列表, 重放失败的seq)，连接类错误或提交失败时失败seq为None（不计入失败次数）
+        """
+        done_seq_list = []
+        sql_seq_list = []
+        db, cs = self.mysql_tool.open_db_conn()
+        current_seq = None
+        try:
+            for seq, op, table, payload_str in record_list:
+                current_seq = seq
+                payload = json.loads(payload_str)
+                if op in self.handler_dict:
+                    # 先提交之前的sql记录，保证顺序
+                    current_seq = None
+                    db.commit()
+                    done_seq_list.extend(sql_seq_list)
+                    sql_seq_list = []
+                    current_seq = seq
+                    if not self.handler_dict[op](payload):
+                        return done_seq_list, seq if self.is_conn_alive(db) else None
+                    done_seq_list.append(seq)
+                    continue
+
+                if not self.apply_sql_record(db, cs, op, table, payload):
+                    if not self.is_conn_alive(db):
+                        return done_seq_list, None
+                    db.rollback()
+                    # 之前的sql记录随之回滚，下一轮重新执行
+                    return done_seq_list, seq
+                sql_seq_list.append(seq)
+
+            current_seq = None
+            db.commit()
+            done_seq_list.extend(sql_seq_list)
+            return done_seq_list, None
+        except Exception as e:
+            logging.error("发件箱重放失败: {}".format(str(e)))
+            if isinstance(e, self.CONNECTION_ERROR_TUPLE) or not self.is_conn_alive(db):
+                return done_seq_list, None
+            try:
+                db.rollback()
+            except Exception:
+                pass
+            return done_seq_list, current_seq
+        finally:
+            try:
+                self.mysql_tool.close_db_conn(db, cs)
+            except Exception:
+                pass
+
+    @staticmethod
+    def is_conn_alive(db):
+        """
+        重放失败后检查连接是否可用（mysql_tool的事务方法内部捕获了异常，连接类错误只能由此判断）
+        :param db: 数据库连接对象
+        :return:
+        """
+        ping = getattr(db, "ping", None)
+        if ping is None:
+            return True
+        try:
+            ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def drain(self):
+        """
+        按顺序分批重放发件箱，遇到失败即停止并保持降级
+        :return: 是否全部重放完
+        """
+        with self.lock:
+            total_count = 0
+            while True:
+                record_list = self.conn.execute(
+                    "select seq, op, table_name, payload from outbox order by seq limit ?", (self.batch_size,)
+                ).fetchall()
+                if not record_list:
+                    if total_count:
+                        logging.info("发件箱重放完成 {} 条".format(total_count))
+                    self.degraded_until = 0
+                    return True
+
+                try:
+                    done_seq_list, failed_seq = self.apply_batch(record_list)
+                except Exception as e:
+                    logging.error("发件箱重放连接数据库失败: {}".format(str(e)))
+                    done_seq_list, failed_seq = [], None
+                if done_seq_list:
+                    self.conn.executemany("delete from outbox where seq = ?", [(seq,) for seq in done_seq_list])
+                    self.conn.commit()
+                    total_count += len(done_seq_list)
+                if len(done_seq_list) < len(record_list):
+                    if failed_seq is not None and self.record_failure(failed_seq):
+                        continue
+                    self.mark_degraded("重放失败")
+                    logging.warning("发件箱已重放 {} 条，剩余 {} 条".format(total_count, self.pending_count()))
+                    return False
+
+    def record_failure(self, seq):
+        """
+        记录一次重放失败（仅数据库可连接时的失败，例如数据错误、约束冲突），达到最大次数时移入outbox_dead
+        :param seq: 记录序号
+        :return: 是否已移入outbox_dead
+        """
+        self.conn.execute("update outbox set attempts = attempts + 1 where seq = ?", (seq,))
+        attempts = self.conn.execute("select attempts from outbox where seq = ?", (seq,)).fetchone()[0]
+        if attempts < self.max_attempts:
+            self.conn.commit()
+            return False
+        self.conn.execute(
+            "insert into outbox_dead (op, table_name, payload, create_time, attempts) "
+            "select op, table_name, payload, create_time, attempts from outbox where seq = ?", (seq,)
+        )
+        self.conn.execute("delete from outbox where seq = ?", (seq,))
+        self.conn.commit()
+        logging.error("发件箱记录 seq={} 重放失败 {} 次，已移入 outbox_dead: {}".format(seq, attempts, self.outbox_path))
+        return True
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
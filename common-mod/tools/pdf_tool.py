@@ -2,21 +2,74 @@
 # ---------------------
 # author: chenweida
 # date: 2022-11-15
-# desc:
+# desc: html转pdf，支持两种渲染引擎：
+#       wkhtmltopdf: 每个文档启动一个wkhtmltopdf进程（pdfkit）
+#       weasyprint: 进程内渲染，字体配置在文档之间复用（省去每个文档的进程启动及字体、引擎加载）
+#       输出配置（页面大小、边距、DPI、图片质量等）按名称选择，各配置的平均大小及渲染耗时单独统计
+#       配置了渲染服务（render_server_tool.RenderClient）时wkhtmltopdf渲染交给主机级渲染服务，服务不可用时本地渲染
 # ---------------------
+import json
 import logging
+import os
 import platform
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 
 import pdfkit
 
+try:
+    import weasyprint
+    from weasyprint.text.fonts import FontConfiguration
+except ImportError:
+    weasyprint = None
+
 
 class PDFTool(object):
+    # 输出配置项 -> wkhtmltopdf参数（布尔项为True时只传参数名，为False时不传）
+    PROFILE_WK_OPTION = {
+        "page_size": "page-size",
+        "margin_top": "margin-top",
+        "margin_right": "margin-right",
+        "margin_bottom": "margin-bottom",
+        "margin_left": "margin-left",
+        "dpi": "dpi",
+        "image_dpi": "image-dpi",
+        "image_quality": "image-quality",
+        "low_quality": "lowquality",
+        "grayscale": "grayscale",
+    }
 
-    def __init__(self, cache_path):
+    def __init__(self, cache_path, pool_size=0, queue_size=8, render_timeout=120, engine="wkhtmltopdf",
+                 local_file_access=False, profile_dict=None, profile="default", render_client=None):
+        """
+        :param cache_path: pdf存放目录
+        :param pool_size: 渲染池并发渲染数（0为不开启渲染池）
+        :param queue_size: 渲染池排队任务数上限（不含渲染中的任务），超过时submit_render阻塞
+        :param render_timeout: 单次渲染超时（秒），超时强制结束wkhtmltopdf进程（weasyprint进程内渲染不支持超时）
+        :param engine: 渲染引擎（wkhtmltopdf / weasyprint）
+        :param local_file_access: 是否允许wkhtmltopdf访问本地文件（html引用本地缓存图片时需要，各平台一致）
+        :param profile_dict: 输出配置（例如：{"compact": {"page_size": "A4", "margin": "10mm", "image_quality": 75}}），
+                             margin为四边边距的简写；weasyprint只支持page_size、边距、image_dpi、image_quality
+        :param profile: 默认使用的输出配置名
+        :param render_client: 渲染服务客户端（RenderClient对象，仅wkhtmltopdf引擎使用）
+        """
 
         # pdf存放目录
         self.cache_path = cache_path
 
+        # 渲染引擎
+        self.engine = engine
+        if self.engine == "weasyprint":
+            if weasyprint is None:
+                raise ImportError("weasyprint 渲染引擎需要安装 weasyprint (pip install weasyprint)")
+            # 字体配置按线程复用（渲染池的每个线程一份）
+            self.weasy_local = threading.local()
+        elif self.engine != "wkhtmltopdf":
+            raise ValueError("未知的渲染引擎: {}".format(self.engine))
+
         # 获取当前系统
         self.plat = platform.system().lower()
 
@@ -25,11 +78,35 @@ class PDFTool(object):
             self.wk_path = r"D:\wkhtmltox\ins\wkhtmltopdf\bin\wkhtmltopdf.exe"
             self.wk_conf = pdfkit.configuration(wkhtmltopdf=self.wk_path)
 
-        self.wk_opt = {
-            # pdfkit Exit with code 1 due to network error: ProtocolUnknownError设为true，本地文件访问权限被禁止了
-            "enable-local-file-access": True,
-            # "enable-javascript": True
-        }
+        # wkhtmltopdf 基础参数（各平台相同）
+        # pdfkit Exit with code 1 due to network error: ProtocolUnknownError设为true，本地文件访问权限被禁止了
+        # （html引用本地缓存图片时才需要，未引用时不允许访问本地文件）
+        self.wk_opt = {"enable-local-file-access": True} if local_file_access else {}
+
+        # 输出配置（未配置时为wkhtmltopdf默认输出）
+        self.profile_dict = profile_dict or {}
+        self.profile = profile
+        for profile_name in self.profile_dict:
+            self.get_profile_conf(profile_name)
+        if self.profile_dict and self.profile not in self.profile_dict:
+            raise ValueError("未知的PDF输出配置: {}".format(self.profile))
+
+        # 主机级渲染服务（weasyprint为进程内渲染，不使用）
+        self.render_client = render_client if self.engine == "wkhtmltopdf" else None
+
+        # 各输出配置的渲染统计：{配置名: {"count", "failure", "size", "seconds"}}
+        self.stat_lock = threading.Lock()
+        self.stat_dict = {}
+
+        # 渲染池：每个线程驱动一个wkhtmltopdf进程
+        self.pool_size = pool_size
+        self.render_timeout = render_timeout
+        self.render_executor = None
+        if self.pool_size:
+            self.render_executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="render")
+            self.render_semaphore = threading.BoundedSemaphore(pool_size + queue_size)
+            self.render_lock = threading.Lock()
+            self.render_future_set = set()
 
     def url_html_to_pdf(self, url_list, file_name):
         """
@@ -75,27 +152,354 @@ class PDFTool(object):
         else:
             return False
 
-    def string_html_to_pdf(self, text, file_name):
+    def string_html_to_pdf(self, text, file_name, profile=None):
         """
         html文本转pdf
         :param text:
         :param file_name:
+        :param profile: 输出配置名，默认profile
         :return:
         """
-        if self.plat == "windows":
+        profile = profile or self.profile
+        file_path = self.cache_path + file_name
+        start_time = time.perf_counter()
+        if self.engine == "weasyprint":
+            pdf_content = self.render_html_weasyprint(text, profile)
+            self.record_render(profile, pdf_content and len(pdf_content), time.perf_counter() - start_time)
+            if pdf_content is None:
+                return False
+            with open(file_path, "wb") as f:
+                f.write(pdf_content)
+            return True
+
+        reached, pdf_content = self.render_with_server(text, profile=profile)
+        if reached:
+            if pdf_content:
+                with open(file_path, "wb") as f:
+                    f.write(pdf_content)
+            ret = bool(pdf_content)
+        elif self.plat not in ("windows", "linux"):
+            return False
+        else:
             try:
-                return pdfkit.from_string(text, self.cache_path + file_name, configuration=self.wk_conf, options=self.wk_opt)
+                ret = pdfkit.from_string(text, file_path, options=self.get_wk_options(profile),
+                                         **self.get_wk_kwargs())
             except Exception as e:
                 logging.error(str(e))
-                return True
-        elif self.plat == "linux":
+                ret = True
+        self.record_render(
+            profile, os.path.getsize(file_path) if os.path.exists(file_path) else None,
+            time.perf_counter() - start_time
+        )
+        return ret
+
+    def string_html_to_pdf_content(self, text, profile=None):
+        """
+        html文本转pdf（不落盘，直接返回pdf字节流）
+        :param text:
+        :param profile: 输出配置名，默认profile
+        :return: pdf字节流，失败返回None
+        """
+        profile = profile or self.profile
+        start_time = time.perf_counter()
+        if self.engine == "weasyprint":
+            pdf_content = self.render_html_weasyprint(text, profile)
+        else:
+            reached, pdf_content = self.render_with_server(text, profile=profile)
+            if not reached:
+                if self.plat not in ("windows", "linux"):
+                    return None
+                try:
+                    pdf_content = pdfkit.from_string(text, False, options=self.get_wk_options(profile),
+                                                     **self.get_wk_kwargs())
+                except Exception as e:
+                    logging.error(str(e))
+                    pdf_content = None
+        self.record_render(profile, pdf_content and len(pdf_content), time.perf_counter() - start_time)
+        return pdf_content
+
+    def get_profile_conf(self, profile):
+        """
+        输出配置（margin展开为四边边距）
+        :param profile: 输出配置名
+        :return: 配置字典，未配置输出配置时为空字典
+        """
+        if not self.profile_dict:
+            return {}
+        if profile not in self.profile_dict:
+            raise ValueError("未知的PDF输出配置: {}".format(profile))
+
+        profile_conf = dict(self.profile_dict[profile] or {})
+        margin = profile_conf.pop("margin", None)
+        if margin is not None:
+            for side in ("top", "right", "bottom", "left"):
+                profile_conf.setdefault("margin_" + side, margin)
+        for key in profile_conf:
+            if key not in self.PROFILE_WK_OPTION:
+                raise ValueError("PDF输出配置 {} 中未知的配置项: {}".format(profile, key))
+        return profile_conf
+
+    def get_render_signature(self, profile=None):
+        """
+        渲染引擎及输出配置的签名（与html一起计算md5，引擎或输出配置变化时视为内容变化）
+        :param profile: 输出配置名，默认profile
+        :return:
+        """
+        return "{}:{}".format(self.engine, json.dumps(self.get_profile_conf(profile or self.profile), sort_keys=True))
+
+    def get_wk_options(self, profile=None):
+        """
+        wkhtmltopdf参数（基础参数 + 输出配置），各平台一致
+        :param profile: 输出配置名，默认profile
+        :return:
+        """
+        wk_opt = dict(self.wk_opt)
+        for key, value in self.get_profile_conf(profile or self.profile).items():
+            if value is True:
+                wk_opt[self.PROFILE_WK_OPTION[key]] = True
+            elif value is not False and value is not None:
+                wk_opt[self.PROFILE_WK_OPTION[key]] = str(value)
+        return wk_opt
+
+    def get_wk_kwargs(self):
+        """
+        pdfkit的其余参数（Windows需指定wkhtmltopdf路径）
+        :return:
+        """
+        return {"configuration": self.wk_conf} if self.plat == "windows" else {}
+
+    def render_html_weasyprint(self, text, profile=None):
+        """
+        html文本转pdf（weasyprint进程内渲染，字体配置在同一线程的文档之间复用）
+        :param text: html文本
+        :param profile: 输出配置名，默认profile（页面大小及边距以@page样式传入，图片DPI及质量传给write_pdf）
+        :return: pdf字节流，失败返回None
+        """
+        font_config = getattr(self.weasy_local, "font_config", None)
+        if font_config is None:
+            font_config = self.weasy_local.font_config = FontConfiguration()
+
+        profile_conf = self.get_profile_conf(profile or self.profile)
+        page_rule_list = []
+        if profile_conf.get("page_size"):
+            page_rule_list.append("size: {};".format(profile_conf["page_size"]))
+        for side in ("top", "right", "bottom", "left"):
+            if profile_conf.get("margin_" + side) is not None:
+                page_rule_list.append("margin-{}: {};".format(side, profile_conf["margin_" + side]))
+        stylesheet_list = [weasyprint.CSS(string="@page { " + " ".join(page_rule_list) + " }")] \
+            if page_rule_list else None
+        write_kwargs = {}
+        if profile_conf.get("image_dpi"):
+            write_kwargs["dpi"] = profile_conf["image_dpi"]
+        if profile_conf.get("image_quality"):
+            write_kwargs["jpeg_quality"] = profile_conf["image_quality"]
+
+        try:
+            # base_url 与 wkhtmltopdf 的 enable-local-file-access 一致，允许引用本地资源
+            return weasyprint.HTML(string=text, base_url=os.path.abspath(self.cache_path)).write_pdf(
+                stylesheets=stylesheet_list, font_config=font_config, **write_kwargs
+            )
+        except Exception as e:
+            logging.error("weasyprint渲染失败: {}".format(str(e)))
+            return None
+
+    def get_wk_command(self, profile=None, wk_options=None):
+        """
+        wkhtmltopdf命令（从标准输入读html，向标准输出写pdf），参数与string_html_to_pdf一致
+        :param profile: 输出配置名，默认profile
+        :param wk_options: 直接指定的wkhtmltopdf参数（渲染服务按客户端传来的参数渲染），指定时忽略profile
+        :return:
+        """
+        if wk_options is None:
+            wk_options = self.get_wk_options(profile)
+        command = [self.wk_path if self.plat == "windows" else "wkhtmltopdf", "--quiet"]
+        for key, value in wk_options.items():
+            command.append("--" + key)
+            if value is not True:
+                command.append(str(value))
+        return command + ["-", "-"]
+
+    def record_render(self, profile, size, seconds):
+        """
+        记录一次渲染
+        :param profile: 输出配置名
+        :param size: pdf大小（字节），失败为None
+        :param seconds: 渲染耗时（秒）
+        :return:
+        """
+        with self.stat_lock:
+            stat = self.stat_dict.setdefault(profile, {"count": 0, "failure": 0, "size": 0, "seconds": 0.0})
+            stat["seconds"] += seconds
+            if size:
+                stat["count"] += 1
+                stat["size"] += size
+            else:
+                stat["failure"] += 1
+
+    def report(self):
+        """
+        各输出配置的渲染统计（平均大小及平均耗时）
+        :return: 统计文本
+        """
+        with self.stat_lock:
+            stat_list = sorted(self.stat_dict.items())
+        if not stat_list:
+            return "无渲染"
+
+        line_list = ["{:<12}{:>8}{:>8}{:>12}{:>12}".format("配置", "成功", "失败", "平均KB", "平均耗时(s)")]
+        for profile, stat in stat_list:
+            render_count = stat["count"] + stat["failure"]
+            line_list.append("{:<12}{:>8}{:>8}{:>12.1f}{:>12.3f}".format(
+                profile, stat["count"], stat["failure"],
+                stat["size"] / stat["count"] / 1024 if stat["count"] else 0,
+                stat["seconds"] / render_count
+            ))
+        return "\n".join(line_list)
+
+    def render_html(self, text, timeout=None, profile=None):
+        """
+        html文本转pdf（wkhtmltopdf为独立进程，超时强制结束进程）
+        :param text: html文本
+        :param timeout: 超时（秒），默认render_timeout
+        :param profile: 输出配置名，默认profile
+        :return: pdf字节流，失败返回None
+        """
+        profile = profile or self.profile
+        start_time = time.perf_counter()
+        if self.engine == "weasyprint":
+            pdf_content = self.render_html_weasyprint(text, profile)
+        else:
+            reached, pdf_content = self.render_with_server(text, timeout, profile)
+            if not reached:
+                pdf_content = self.render_html_wk(text, timeout, profile)
+        self.record_render(profile, pdf_content and len(pdf_content), time.perf_counter() - start_time)
+        return pdf_content
+
+    def render_with_server(self, text, timeout=None, profile=None):
+        """
+        交给渲染服务渲染
+        :param text: html文本
+        :param timeout: 超时（秒），默认render_timeout
+        :param profile: 输出配置名，默认profile
+        :return: (是否由渲染服务处理, pdf字节流)，未配置或服务不可用时为(False, None)，由调用方本地渲染
+        """
+        if not self.render_client:
+            return False, None
+        return self.render_client.render(text, self.get_wk_options(profile), timeout or self.render_timeout)
+
+    def render_html_wk(self, text, timeout=None, profile=None, wk_options=None):
+        """
+        html文本转pdf（独立wkhtmltopdf进程，超时强制结束进程）
+        :param text: html文本
+        :param timeout: 超时（秒），默认render_timeout
+        :param profile: 输出配置名，默认profile
+        :param wk_options: 直接指定的wkhtmltopdf参数，指定时忽略profile
+        :return: pdf字节流，失败返回None
+        """
+        timeout = timeout or self.render_timeout
+        try:
+            # 非Windows下单独成进程组，超时时连同子进程一起结束
+            process = subprocess.Popen(
+                self.get_wk_command(profile, wk_options), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                start_new_session=self.plat != "windows"
+            )
+        except Exception as e:
+            logging.error("启动wkhtmltopdf失败: {}".format(str(e)))
+            return None
+
+        try:
+            pdf_content, error = process.communicate(text.encode("utf8"), timeout=timeout)
+        except subprocess.TimeoutExpired:
+            if self.plat == "windows":
+                process.kill()
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+            process.communicate()
+            logging.error("wkhtmltopdf渲染超时（{} 秒），已结束进程".format(timeout))
+            return None
+
+        # 与pdfkit一致：页面内资源加载失败时退出码为1，但pdf已生成
+        if pdf_content.startswith(b"%PDF"):
+            return pdf_content
+        logging.error("wkhtmltopdf渲染失败（退出码 {}）: {}".format(
+            process.returncode, error.decode("utf8", "ignore")[-500:]))
+        return None
+
+    def submit_render(self, text, callback=None, profile=None):
+        """
+        提交到渲染池（排队任务已满时阻塞）
+        :param text: html文本
+        :param callback: 渲染完成回调，参数为pdf字节流（失败为None），在渲染线程中执行，执行完后future才完成
+        :param profile: 输出配置名，默认profile
+        :return: Future，结果为pdf字节流（失败为None）
+        """
+        if not self.render_executor:
+            raise Exception("未开启渲染池")
+
+        self.render_semaphore.acquire()
+        try:
+            future = self.render_executor.submit(self.render_task, text, callback, profile)
+        except Exception:
+            self.render_semaphore.release()
+            raise
+        with self.render_lock:
+            self.render_future_set.add(future)
+        future.add_done_callback(self.discard_render_future)
+        return future
+
+    def render_task(self, text, callback, profile):
+        try:
+            # 渲染异常视为失败，保证回调总会被调用
             try:
-                return pdfkit.from_string(text, self.cache_path + file_name)
+                pdf_content = self.render_html(text, profile=profile)
             except Exception as e:
-                logging.error(str(e))
-                return True
-        else:
-            return False
+                logging.error("渲染异常: {}".format(str(e)), exc_info=True)
+                pdf_content = None
+            if callback:
+                try:
+                    callback(pdf_content)
+                except Exception as e:
+                    logging.error("渲染回调异常: {}".format(str(e)), exc_info=True)
+            return pdf_content
+        finally:
+            self.render_semaphore.release()
+
+    def discard_render_future(self, future):
+        with self.render_lock:
+            self.render_future_set.discard(future)
+
+    def wait_render(self, wait_func=None, wait_interval=30):
+        """
+        等待已提交的渲染任务（含回调）全部完成
+        :param wait_func: 等待期间每wait_interval秒调用一次（例如任务租约续约）
+        :param wait_interval: 调用间隔（秒）
+        :return:
+        """
+        if not self.render_executor:
+            return
+        with self.render_lock:
+            future_list = list(self.render_future_set)
+        if future_list:
+            logging.info("等待渲染池完成 {} 个任务".format(len(future_list)))
+        for future in future_list:
+            while True:
+                try:
+                    future.result(timeout=wait_interval if wait_func else None)
+                    break
+                except TimeoutError:
+                    wait_func()
+
+    def close(self, wait_func=None):
+        """
+        等待渲染任务完成并关闭渲染池
+        :param wait_func: 等待期间定期调用（见wait_render）
+        :return:
+        """
+        if not self.render_executor:
+            return
+        self.wait_render(wait_func)
+        self.render_executor.shutdown(wait=True)
+        self.render_executor = None
 
 
 if __name__ == '__main__':
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+# ---------------------
+# author: chenweida
+# date:
+# desc: sql耗时统计、慢查询日志及N+1查询检测
+# ---------------------
+import logging
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from logging import handlers
+
+from .sql_tool import fingerprint_sql
+
+
+class QueryLogTool(object):
+
+    def __init__(self, slow_threshold=1.0, n_plus_one_threshold=0):
+        # 慢查询阈值（秒）
+        self.slow_threshold = slow_threshold
+        # N+1检测阈值：同一工作单元内同一指纹执行次数超过该值即告警（0为关闭）
+        self.n_plus_one_threshold = n_plus_one_threshold
+        # N+1告警列表
+        self.violation_list = []
+        # 当前线程的工作单元
+        self.unit_local = threading.local()
+        # 慢查询日志
+        self.slow_logger = logging.getLogger("slow_query")
+        # 统计 {(调用位置, 指纹): [次数, 总耗时, 总行数]}
+        self.stat_dict = {}
+        self.lock = threading.Lock()
+        # 工具目录内的栈帧不算作调用位置
+        self.tools_dir_path = os.path.dirname(os.path.abspath(__file__))
+
+    def configure(self, slow_threshold=None, slow_log_path=None, n_plus_one_threshold=None):
+        """
+        配置慢查询阈值、慢查询日志文件及N+1检测阈值
+        :param slow_threshold: 慢查询阈值（秒）
+        :param slow_log_path: 慢查询日志文件路径（例如："./log/slow_query.log"）
+        :param n_plus_one_threshold: N+1检测阈值（0为关闭）
+        :return:
+        """
+        if slow_threshold is not None:
+            self.slow_threshold = slow_threshold
+        if n_plus_one_threshold is not None:
+            self.n_plus_one_threshold = n_plus_one_threshold
+        if slow_log_path:
+            slow_log_dir_path = os.path.dirname(slow_log_path)
+            if slow_log_dir_path and not os.path.exists(slow_log_dir_path):
+                os.makedirs(slow_log_dir_path)
+            for handler in self.slow_logger.handlers:
+                if getattr(handler, "baseFilename", None) == os.path.abspath(slow_log_path):
+                    return
+            log_rh = handlers.RotatingFileHandler(
+                slow_log_path,
+                maxBytes=20 * 1024 * 1024,
+                backupCount=5,
+                encoding="utf8"
+            )
+            log_rh.setFormatter(logging.Formatter("%(asctime)s - %(message)s", "%Y-%m-%d %H:%M:%S"))
+            self.slow_logger.addHandler(log_rh)
+
+    def get_caller(self):
+        """
+        获取工具目录外最近的调用位置
+        :return: （例如：csrc_gov_list_spider.py:142 parse_list_page）
+        """
+        frame = sys._getframe(1)
+        while frame:
+            file_path = os.path.abspath(frame.f_code.co_filename)
+            if not file_path.startswith(self.tools_dir_path):
+                return "{}:{} {}".format(os.path.basename(file_path), frame.f_lineno, frame.f_code.co_name)
+            frame = frame.f_back
+        return "unknown"
+
+    def get_stack(self, depth=4):
+        """
+        获取工具目录外的调用栈（由近及远）
+        :param depth: 栈深度
+        :return:
+        """
+        stack_list = []
+        frame = sys._getframe(1)
+        while frame and len(stack_list) < depth:
+            file_path = os.path.abspath(frame.f_code.co_filename)
+            if not file_path.startswith(self.tools_dir_path):
+                stack_list.append("{}:{} {}".format(os.path.basename(file_path), frame.f_lineno, frame.f_code.co_name))
+            frame = frame.f_back
+        return stack_list
+
+    @contextmanager
+    def work_unit(self, unit_name):
+        """
+        工作单元（一页、一条任务），单元结束时检查同一指纹的重复执行次数
+        用法：
+            with query_log.work_unit("北京辖区 第1页"):
+                ...
+        :param unit_name: 工作单元名称
+        :return:
+        """
+        if not self.n_plus_one_threshold:
+            yield
+            return
+
+        # {指纹: [次数, 首次调用栈]}，嵌套时外层单元在内层结束后恢复
+        parent_unit_dict = getattr(self.unit_local, "unit_dict", None)
+        self.unit_local.unit_dict = {}
+        try:
+            yield
+        finally:
+            unit_dict = self.unit_local.unit_dict
+            self.unit_local.unit_dict = parent_unit_dict
+            for fingerprint, (count, stack_list) in unit_dict.items():
+                if count <= self.n_plus_one_threshold:
+                    continue
+                violation = {
+                    "unit": unit_name,
+                    "fingerprint": fingerprint,
+                    "count": count,
+                    "stack": stack_list
+                }
+                with self.lock:
+                    self.violation_list.append(violation)
+                logging.warning("疑似N+1查询: 工作单元[{}]内执行 {} 次 sql={} 调用栈={}".format(
+                    unit_name, count, fingerprint, " <- ".join(stack_list)))
+
+    def report_n_plus_one(self):
+        """
+        按调用位置汇总的N+1告警
+        :return:
+        """
+        with self.lock:
+            violation_list = list(self.violation_list)
+
+        if not violation_list:
+            return "无N+1查询告警"
+
+        # {(调用位置, 指纹): [告警单元数, 单元内最大次数]}
+        summary_dict = {}
+        for violation in violation_list:
+            caller = violation["stack"][0] if violation["stack"] else "unknown"
+            summary = summary_dict.setdefault((caller, violation["fingerprint"]), [0, 0])
+            summary[0] += 1
+            summary[1] = max(summary[1], violation["count"])
+
+        line_list = ["{:>8} {:>8}  {}".format("单元数", "最大次数", "调用位置 | sql指纹")]
+        for (caller, fingerprint), (unit_count, max_count) in summary_dict.items():
+            line_list.append("{:>8} {:>8}  {} | {}".format(unit_count, max_count, caller, fingerprint[:120]))
+        return "\n".join(line_list)
+
+    def record(self, sql, elapsed, row_count):
+        """
+        记录一次sql执行
+        :param sql: sql语句（参数化前）
+        :param elapsed: 耗时（秒）
+        :param row_count: 返回或影响的行数
+        :return:
+        """
+        fingerprint = fingerprint_sql(sql)
+        caller = self.get_caller()
+        row_count = max(row_count or 0, 0)
+        with self.lock:
+            stat = self.stat_dict.setdefault((caller, fingerprint), [0, 0.0, 0])
+            stat[0] += 1
+            stat[1] += elapsed
+            stat[2] += row_count
+
+        unit_dict = getattr(self.unit_local, "unit_dict", None)
+        if unit_dict is not None:
+            if fingerprint in unit_dict:
+                unit_dict[fingerprint][0] += 1
+            else:
+                unit_dict[fingerprint] = [1, self.get_stack()]
+
+        if elapsed >= self.slow_threshold:
+            self.slow_logger.warning("慢查询 {:.3f}s rows={} caller={} sql={}".format(
+                elapsed, row_count, caller, fingerprint))
+        return fingerprint, caller
+
+    def report(self):
+        """
+        按调用位置汇总的sql次数及耗时表
+        :return:
+        """
+        with self.lock:
+            stat_list = sorted(self.stat_dict.items(), key=lambda item: item[1][1], reverse=True)
+
+        if not stat_list:
+            return "无sql执行记录"
+
+        total_count = sum(stat[0] for _, stat in stat_list)
+        total_time = sum(stat[1] for _, stat in stat_list)
+        line_list = [
+            "{:>8} {:>10} {:>10} {:>10}  {}".format("次数", "总耗时(s)", "平均(ms)", "行数", "调用位置 | sql指纹"),
+        ]
+        for (caller, fingerprint), (count, elapsed, row_count) in stat_list:
+            line_list.append("{:>8} {:>10.3f} {:>10.2f} {:>10}  {} | {}".format(
+                count, elapsed, elapsed / count * 1000, row_count, caller, fingerprint[:120]))
+        line_list.append("合计: {} 次, {:.3f}s".format(total_count, total_time))
+        return "\n".join(line_list)
+
+    def reset(self):
+        with self.lock:
+            self.stat_dict = {}
+            self.violation_list = []
+
+
+# 进程内共用一个统计对象（MysqlTool的方法均为静态方法）
+query_log = QueryLogTool()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# ---------------------
+# author: chenweida
+# date:
+# desc: 详情页原始HTML快照（zstd压缩，按内容sha256寻址），用于不重新采集网站的重新解析/渲染
+# ---------------------
+import datetime
+import hashlib
+import json
+import logging
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class SnapshotTool(object):
+    """
+    快照存储布局（存储为OBSTool或LocalOBSTool）：
+        {prefix}blob/{sha256前2位}/{sha256}.zst    原始字节zstd压缩，相同内容只存一份
+        {prefix}index/{row_id}.json              该行最近一次采集的快照索引（sha256、编码、链接、采集时间）
+    """
+
+    def __init__(self, store_tool, prefix="snapshot/", level=3):
+        """
+        :param store_tool: OBSTool / LocalOBSTool对象
+        :param prefix: 对象名前缀
+        :param level: zstd压缩级别
+        """
+        if zstandard is None:
+            raise ImportError("快照需要安装 zstandard (pip install zstandard)")
+
+        self.store_tool = store_tool
+        self.prefix = prefix
+        self.level = level
+        self.decompressor = zstandard.ZstdDecompressor()
+
+    def blob_name(self, sha256):
+        return "{}blob/{}/{}.zst".format(self.prefix, sha256[:2], sha256)
+
+    def index_name(self, row_id):
+        return "{}index/{}.json".format(self.prefix, row_id)
+
+    def compress(self, raw_content):
+        # ZstdCompressor 不能被多个线程同时使用，每次保存单独创建
+        return zstandard.ZstdCompressor(level=self.level).compress(raw_content)
+
+    def save(self, row_id, raw_content, encoding=None, url=None):
+        """
+        保存快照（内容已存在时只更新索引；可在多个上传线程中并发调用）
+        :param row_id: 行id
+        :param raw_content: 原始字节
+        :param encoding: 解码所用编码
+        :param url: 采集链接
+        :return: 内容sha256，失败返回None
+        """
+        sha256 = hashlib.sha256(raw_content).hexdigest()
+        blob_name = self.blob_name(sha256)
+        if self.store_tool.get_metadata(self.store_tool.folder + blob_name) is None:
+            if not self.store_tool.upload_text(blob_name, self.compress(raw_content)):
+                logging.error("快照内容保存失败: id={}".format(row_id))
+                return None
+
+        index_dict = {
+            "sha256": sha256,
+            "encoding": encoding,
+            "url": url,
+            "size": len(raw_content),
+            "fetch_time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        if not self.store_tool.upload_text(self.index_name(row_id), json.dumps(index_dict, ensure_ascii=False)):
+            logging.error("快照索引保存失败: id={}".format(row_id))
+            return None
+        return sha256
+
+    def load(self, row_id):
+        """
+        读取快照
+        :param row_id: 行id
+        :return: (原始字节, 索引字典)，不存在时返回(None, None)
+        """
+        index_content = self.store_tool.download_content(self.index_name(row_id))
+        if index_content is None:
+            return None, None
+        index_dict = json.loads(index_content)
+
+        blob_content = self.store_tool.download_content(self.blob_name(index_dict["sha256"]))
+        if blob_content is None:
+            logging.error("快照内容缺失: id={} sha256={}".format(row_id, index_dict["sha256"]))
+            return None, None
+        raw_content = self.decompressor.decompress(blob_content)
+        if hashlib.sha256(raw_content).hexdigest() != index_dict["sha256"]:
+            logging.error("快照内容校验失败: id={}".format(row_id))
+            return None, None
+        return raw_content, index_dict
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# ---------------------
+# author: chenweida
+# date:
+# desc: 工作单元：一个连接、一个事务，单元内的读写最后统一提交或回滚
+# ---------------------
+import logging
+import time
+
+
+class UnitOfWork(object):
+    """
+    用法：
+        uow = UnitOfWork(mysql_tool)
+        try:
+            uow.insert("user", {"name": "cwd"})
+            uow.update("user", {"age": 18}, "`name` = %s", ("cwd",))
+            uow.commit()
+        except Exception:
+            uow.rollback()
+        finally:
+            uow.close()
+    单元内任一sql失败即抛出异常，由调用方回滚整个单元
+    db_elapsed为单元内连接、sql及提交的累计耗时（不含单元内的接口请求等非数据库耗时）
+    """
+
+    def __init__(self, mysql_tool):
+        """
+        :param mysql_tool: MysqlTool对象
+        """
+        self.mysql_tool = mysql_tool
+        # 单元内数据库累计耗时（秒）
+        self.db_elapsed = 0.0
+        start_time = time.perf_counter()
+        self.db, self.cs = self.mysql_tool.open_db_conn()
+        self.db_elapsed += time.perf_counter() - start_time
+        # 单元内写入条数
+        self.write_count = 0
+
+    def select(self, table, field_list, factor_str, factor_args=None):
+        """
+        查询（与写入在同一事务内，可读到本单元未提交的数据）
+        :param table: 表名
+        :param field_list: 所需字段列表
+        :param factor_str: 条件
+        :param factor_args: 条件参数
+        :return:
+        """
+        start_time = time.perf_counter()
+        ret = self.mysql_tool.select_db_sql(self.db, self.cs, table, field_list, factor_str, factor_args)
+        self.db_elapsed += time.perf_counter() - start_time
+        if ret is None:
+            raise Exception("工作单元查询失败: {}".format(table))
+        return ret
+
+    def insert(self, table, data_dict):
+        """
+        插入（不提交）
+        :param table: 表名
+        :param data_dict: 数据字典
+        :return: 插入行id
+        """
+        start_time = time.perf_counter()
+        ret = self.mysql_tool.transaction_insert_db_sql(self.db, self.cs, table, data_dict)
+        self.db_elapsed += time.perf_counter() - start_time
+        if ret is None:
+            raise Exception("工作单元插入失败: {}".format(table))
+        self.write_count += 1
+        return ret
+
+    def update(self, table, data_dict, factor_str, factor_args=None):
+        """
+        更新（不提交）
+        :param table: 表名
+        :param data_dict: 数据字典
+        :param factor_str: 条件
+        :param factor_args: 条件参数
+        :return:
+        """
+        start_time = time.perf_counter()
+        ret = self.mysql_tool.transaction_update_db_sql(self.db, self.cs, table, data_dict, factor_str, factor_args)
+        self.db_elapsed += time.perf_counter() - start_time
+        if not ret:
+            raise Exception("工作单元更新失败: {}".format(table))
+        self.write_count += 1
+        return True
+
+    def commit(self):
+        start_time = time.perf_counter()
+        try:
+            self.db.commit()
+        finally:
+            self.db_elapsed += time.perf_counter() - start_time
+
+    def rollback(self):
+        try:
+            self.db.rollback()
+        except Exception as e:
+            logging.error("工作单元回滚失败: {}".format(str(e)))
+
+    def close(self):
+        try:
+            self.mysql_tool.close_db_conn(self.db, self.cs)
+        except Exception as e:
+            logging.error("工作单元关闭连接失败: {}".format(str(e)))
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# ---------------------
+# author: chenweida
+# date:
+# desc: 后台上传队列（有界队列 + 固定数量上传线程），上传与下载/渲染并行
+# ---------------------
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+class UploadQueueTool(object):
+    """
+    提交的任务由worker_number个线程执行，排队中的任务超过queue_size时submit阻塞（背压，限制内存中待上传内容）
+    任务执行完成后在上传线程中调用回调，回调参数为任务是否成功
+    """
+
+    def __init__(self, worker_number=4, queue_size=16):
+        """
+        :param worker_number: 上传线程数
+        :param queue_size: 排队任务数上限（不含执行中的任务）
+        """
+        self.worker_number = worker_number
+        self.queue_size = queue_size
+
+        self.executor = ThreadPoolExecutor(max_workers=worker_number, thread_name_prefix="upload")
+        # 执行中 + 排队中的任务数上限
+        self.slot_semaphore = threading.BoundedSemaphore(worker_number + queue_size)
+        self.lock = threading.Lock()
+        self.future_set = set()
+        self.success_count = 0
+        self.failure_count = 0
+
+    def submit(self, func, *args, callback=None, **kwargs):
+        """
+        提交任务，队列已满时阻塞直到有任务完成
+        :param func: 任务函数，返回是否成功
+        :param callback: 完成回调，参数为是否成功
+        :return:
+        """
+        self.slot_semaphore.acquire()
+        try:
+            future = self.executor.submit(self.run_task, func, callback, args, kwargs)
+        except Exception:
+            self.slot_semaphore.release()
+            raise
+        with self.lock:
+            self.future_set.add(future)
+        future.add_done_callback(self.discard_future)
+        return future
+
+    def run_task(self, func, callback, args, kwargs):
+        """
+        执行任务及回调（异常不外抛，视为失败）
+        :return:
+        """
+        try:
+            try:
+                success = bool(func(*args, **kwargs))
+            except Exception as e:
+                logging.error("上传任务异常: {}".format(str(e)), exc_info=True)
+                success = False
+
+            with self.lock:
+                if success:
+                    self.success_count += 1
+                else:
+                    self.failure_count += 1
+
+            if callback:
+                try:
+                    callback(success)
+                except Exception as e:
+                    logging.error("上传回调异常: {}".format(str(e)), exc_info=True)
+            return success
+        finally:
+            self.slot_semaphore.release()
+
+    def discard_future(self, future):
+        with self.lock:
+            self.future_set.discard(future)
+
+    def pending_count(self):
+        with self.lock:
+            return len(self.future_set)
+
+    def drain(self, wait_func=None, wait_interval=30):
+        """
+        等待已提交的任务全部完成
+        :param wait_func: 等待期间每wait_interval秒调用一次（例如任务租约续约）
+        :param wait_interval: 调用间隔（秒）
+        :return:
+        """
+        with self.lock:
+            future_list = list(self.future_set)
+        if future_list:
+            logging.info("等待后台上传队列完成 {} 个任务".format(len(future_list)))
+        for future in future_list:
+            while True:
+                try:
+                    future.result(timeout=wait_interval if wait_func else None)
+                    break
+                except TimeoutError:
+                    wait_func()
+        logging.info("后台上传完成: 成功 {} 个，失败 {} 个".format(self.success_count, self.failure_count))
+
+    def shutdown(self, wait_func=None):
+        """
+        等待全部任务完成并关闭上传线程
+        :param wait_func: 等待期间定期调用（见drain）
+        :return:
+        """
+        self.drain(wait_func)
+        self.executor.shutdown(wait=True)
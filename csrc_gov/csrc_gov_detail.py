@@ -12,18 +12,15 @@ import os.path
 import re
 import shutil
 import uuid
-import urllib.parse
 from concurrent.futures import ThreadPoolExecutor
 
 import requests
 import urllib3
-from lxml import etree
-from lxml.etree import tounicode
-from lxml.html import tostring
 from retrying import retry
 
 from tools.snow_tool import SnowTool
 from tools.pdf_tool import PDFTool
+from tools.html_clean_tool import DetailCleaner
 from tools.md5_tool import get_file_md5
 from tools.guise_tool import random_user_agent
 from tools.proxy_tool import ProxyTool
@@ -55,6 +52,8 @@ class CsrcGovDetail(object):
         self.snow_tool = SnowTool()
         # pdf
         self.pdf_tool = PDFTool(self.global_conf["file_cache_path"])
+        # 详情页清洗
+        self.detail_cleaner = DetailCleaner(self.global_conf["website_base_url"])
         # proxy
         self.proxy_tool = ProxyTool()
         # obs
@@ -266,151 +265,16 @@ class CsrcGovDetail(object):
 
     def parse_detail_page(self, data_str, data_dict):
         """
-        解析详情页
+        解析详情页（清洗规则见DetailCleaner，预编译XPath，单次遍历）
         :param data_str:
         :param data_dict:
         :return:
         """
-        # 详情头部链接
-        end_index = data_dict["detail_url"].rfind("/")
-        url_head = data_dict["detail_url"][0:end_index + 1]
-        # 生成详情页结构树
-        tree = etree.HTML(data_str)
+        # 正文节点清洗及附件提取
+        content_list, file_info_list, _ = self.detail_cleaner.clean(data_str, data_dict["detail_url"])
         # 清洗成功后页面文本
-        content_str = ""
-        # 详情页附件列表
-        file_info_list = list()
-
-        # xpath解析
-        content_list = tree.xpath('//div[@class="content"]')
-        for content in content_list:
-            # 移除标题
-            h2_list = content.xpath('.//h2')
-            # 如果无标题说明该class content节点并非所需的节点
-            if not h2_list:
-                continue
-            for h2 in h2_list:
-                h2.getparent().remove(h2)
-                break
-
-            # 移除附件隐藏属性
-            files_list = content.xpath('.//div[@id="files"]')
-            for files in files_list:
-                if files.xpath("./@style"):
-                    files.attrib.pop("style")
-
-            # 获取附件信息
-            files_a_list = content.xpath('.//div[@id="files"]/a')
-            for files_a in files_a_list:
-                # 获取附件的url
-                href_list = files_a.xpath('./@href')
-                # 只要无href，直接跳过该条
-                if not href_list:
-                    continue
-                else:
-                    href = href_list[0]
-                title_list = files_a.xpath('.//text()')
-                # 只要无text()，直接跳过该条
-                if not title_list:
-                    continue
-                else:
-                    title = "".join(title_list).strip()
-                # 判断href是否包含http
-                if "http" not in href:
-                    # 判断href是否是以/开头，是则截取
-                    if href.startswith("/"):
-                        href = href[1:]
-                    # 判断href是否是.mp4或.MP4结尾
-                    if href.endswith(".mp4") or href.endswith(".MP4"):
-                        href = self.global_conf["website_base_url"] + href
-                    else:
-                        href = url_head + href
-                # # 替换原文href
-                # files_a.attrib["href"] = "javascript:void(0);"
-                file_info_list.append((href, title))
-
-            # 获取a标签链接内容（此处可能包含附件内容，例如内蒙古辖区）
-            detail_news_a_list = content.xpath('.//div[@class="detail-news"]//a')
-            for detail_news_a in detail_news_a_list:
-                # 获取附件的url
-                href_list = detail_news_a.xpath('./@href')
-                # 只要无href，直接跳过该条
-                if not href_list:
-                    continue
-                else:
-                    href = href_list[0]
-                title_list = detail_news_a.xpath('.//text()')
-                # 只要无text()，直接跳过该条
-                if not title_list:
-                    continue
-                else:
-                    title = "".join(title_list).strip()
-                if "/files/" not in href:
-                    continue
-                # 判断href是否包含http
-                if "http" not in href:
-                    # 判断href是否是以/开头，是则截取
-                    if href.startswith("/"):
-                        href = href[1:]
-                    # 判断href是否是.mp4或.MP4结尾
-                    if href.endswith(".mp4") or href.endswith(".MP4"):
-                        href = self.global_conf["website_base_url"] + href
-                    else:
-                        href = url_head + href
-                # # 替换原文href
-                # detail_news_a.attrib["href"] = "javascript:void(0);"
-                file_info_list.append((href, title))
-
-            # 替换a标签的href属性
-            content_a_list = content.xpath('.//a')
-            for content_a in content_a_list:
-                # 获取附件的url
-                a_list = content_a.xpath('./@href')
-                # 只要无src，直接跳过该条
-                if not a_list:
-                    continue
-                content_a.attrib["href"] = "javascript:void(0);"
-
-            # 替换img标签的src属性
-            img_list = content.xpath('.//img')
-            for img in img_list:
-                # 获取附件的url
-                src_list = img.xpath('./@src')
-                # 只要无src，直接跳过该条
-                if not src_list:
-                    continue
-                else:
-                    src = src_list[0]
-                if "http" not in src:
-                    # 判断href是否是以/开头，是则截取
-                    if src.startswith("/"):
-                        src = src[1:]
-                    src = url_head + src
-                img.attrib["src"] = src
-
-            # 删除font标签的face属性
-            font_list = content.xpath('.//font')
-            for font in font_list:
-                if font.xpath("./@face"):
-                    font.attrib.pop("face")
-
-            # 移除信息公开表格内容
-            xxgk_table_list = content.xpath('.//div[@class="xxgk-table"]')
-            for xxgk_table in xxgk_table_list:
-                xxgk_table.getparent().remove(xxgk_table)
-
-            # 移除尾部打印关闭内容
-            xxgk_down_box_list = content.xpath('.//div[@class="xxgk-down-box"]')
-            for xxgk_down_box in xxgk_down_box_list:
-                xxgk_down_box.getparent().remove(xxgk_down_box)
-            content_str += tostring(content, encoding="utf8", method="html").decode("utf8")
-            # content_str += tounicode(content, method="html")
-
-        # 字体删除(当系统无该字体时html转pdf会乱码)
-        content_str = re.sub(r'font-family(.*?);', "", content_str)
-
-        # 将url%开头编码转为中文
-        content_str = urllib.parse.unquote(content_str)
+        content_str = self.detail_cleaner.serialize(content_list)
+
         new_content_str = self.h5_temp_str.format(
             data_dict["title"],
             self.c3_temp_str,
@@ -419,9 +283,6 @@ class CsrcGovDetail(object):
             # html.unescape(content_str)
         )
 
-        # 文件信息列表去重
-        file_info_list = list(set(file_info_list))
-
         return file_info_list, new_content_str
 
     # @retry(stop_max_attempt_number=3, wait_random_min=2000, wait_random_max=4000)
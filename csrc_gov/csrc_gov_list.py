@@ -18,8 +18,10 @@ from tools.guise_tool import random_user_agent
 from tools.proxy_tool import ProxyTool
 from tools.conf_tool import read_yaml_conf
 from tools.mysql_tool import MysqlTool
+from tools.sql_tool import SqlFactor
 from tools.snow_tool import SnowTool
 from tools.log_tool import log_conf
+from tools.query_log_tool import query_log
 
 
 class CsrcGovList(object):
@@ -29,6 +31,8 @@ class CsrcGovList(object):
         self.global_conf = read_yaml_conf("conf/csrc_gov_list_pro.yml")
         # 日志
         log_conf(self.global_conf["log_path"], self.global_conf["log_file_path"])
+        # N+1查询检测
+        query_log.configure(n_plus_one_threshold=self.global_conf.get("n_plus_one_threshold", 0))
         # snow
         self.snow_tool = SnowTool()
         # proxy
@@ -135,6 +139,28 @@ class CsrcGovList(object):
         mysql_tool.close_db_conn(db, cs)
         mysql_tool.close_ssh_conn()
 
+    def get_existence_dict(self):
+        """
+        按辖区分组统计已入库的公告条数（一条group by，不逐辖区count）
+        :return: {辖区: 条数}
+        """
+        factor_str, factor_args = SqlFactor().eq("is_delete", 0).is_blank("pid").build()
+        try:
+            db, cs = self.mysql_tool.open_db_conn()
+            existence_dict = self.mysql_tool.select_db_group_count_sql(
+                db,
+                cs,
+                self.db_table,
+                "precinct",
+                factor_str,
+                factor_args
+            )
+            self.mysql_tool.close_db_conn(db, cs)
+        except Exception as e:
+            logging.error("统计已入库总条数失败-{}".format(str(e)))
+            existence_dict = None
+        return existence_dict or {}
+
     def create_db(self):
         """
         当mysql连接后3分钟左右未操作时，远程mysql会强迫关闭现有连接，导致执行数据库sql失败，现需执行sql则创建连接
@@ -821,97 +847,122 @@ class CsrcGovList(object):
         logging.info("=" * 50 + "开始采集列表页" + "=" * 50)
         logging.info("开始：{}".format(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
         logging.info("周期内开始时间：{}，结束时间：{}".format(self.start_time, self.end_time))
-        # 遍历每一辖区
-        for precinct in self.global_conf["precinct_list"]:
-            # 监控信息
-            # 状态 0失败 1成功
-            state = 0
-            # 页面总条数
-            page_total = None
-            # 数据库总条数
-            db_total = None
-            # 当天页面数据新增数量
-            today_page_increased = 0
-            # 当天数据库数据新增数量
-            today_db_increased = 0
-            # 页面数据新增数量
-            page_increased = 0
-            # 数据库数据新增数量
-            db_increased = 0
-            # 错误信息
-            error_info = ""
-
-            try:
-                logging.info("正在爬取{}".format(precinct["precinct"]))
-                # 获取总页数
-                resp_dict = self.get_list_page(precinct["list_page_base_url"], 1)
-                if resp_dict:
-                    # 总条数
-                    total = resp_dict["data"]["total"]
-                    # 每页条数
-                    rows = resp_dict["data"]["rows"]
-                    # 计算总页数
-                    pages = total // rows
-                    if total % rows > 0:
-                        pages += 1
-                    # 遍历每一页
-                    for page in range(1, pages + 1):
-                        logging.info("正在爬取第{}页".format(page))
-                        resp_dict = self.get_list_page(precinct["list_page_base_url"], page)
-                        if resp_dict:
-                            # 辖区配置信息追加resp_dict
-                            resp_dict.update(precinct)
-                            resp_is_gather, resp_today_page_increased, resp_today_db_increased, resp_page_increased, resp_db_increased = self.parse_list_page(
-                                resp_dict)
-                            # 统计更新数量
-                            today_page_increased += resp_today_page_increased
-                            today_db_increased += resp_today_db_increased
-                            page_increased += resp_page_increased
-                            db_increased += resp_db_increased
-                            # 更新状态
-                            state = 1
-                            if not resp_is_gather:
-                                break
-                    # 统计页面总条数
-                    page_total = total
-            except Exception as e:
-                error_info = "未知错误-{}".format(str(e))
-            finally:
-                log_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                # 文件监控
-                self.handle_crawler_status_to_file(
-                    id=precinct["crawler_status_id"],
-                    state=state,
-                    increment=today_page_increased,
-                    total=page_total,
-                    error_info=error_info,
-                    log_time=log_time,
-                    crawler_status_path=self.global_conf["log_path"] + "{}.txt".format(precinct["precinct_code"])
-                )
-                # # 数据库监控
-                # self.handle_crawler_status_to_db(
-                #     id=precinct["crawler_status_id"],
-                #     state=state,
-                #     increment=today_page_increased,
-                #     total=page_total,
-                #     error_info=error_info,
-                #     log_time=log_time
-                # )
-                # 接口监控
-                crawler_status = {
-                    "total": page_total,
-                    "existence": None,
-                    "increment": today_page_increased,
-                    "state": state,
-                    "errorInfo": error_info,
-                    "logTime": log_time
-                }
-                update_info(precinct["condition"], crawler_status)
+        # 各辖区监控信息（统一统计已入库总条数后写入，中途异常退出时已完成辖区的监控信息也会写入）
+        crawler_status_list = []
+        try:
+            # 遍历每一辖区
+            for precinct in self.global_conf["precinct_list"]:
+                # 监控信息
+                # 状态 0失败 1成功
+                state = 0
+                # 页面总条数
+                page_total = None
+                # 数据库总条数
+                db_total = None
+                # 当天页面数据新增数量
+                today_page_increased = 0
+                # 当天数据库数据新增数量
+                today_db_increased = 0
+                # 页面数据新增数量
+                page_increased = 0
+                # 数据库数据新增数量
+                db_increased = 0
+                # 错误信息
+                error_info = ""
+
+                try:
+                    logging.info("正在爬取{}".format(precinct["precinct"]))
+                    # 获取总页数
+                    resp_dict = self.get_list_page(precinct["list_page_base_url"], 1)
+                    if resp_dict:
+                        # 总条数
+                        total = resp_dict["data"]["total"]
+                        # 每页条数
+                        rows = resp_dict["data"]["rows"]
+                        # 计算总页数
+                        pages = total // rows
+                        if total % rows > 0:
+                            pages += 1
+                        # 遍历每一页
+                        for page in range(1, pages + 1):
+                            logging.info("正在爬取第{}页".format(page))
+                            resp_dict = self.get_list_page(precinct["list_page_base_url"], page)
+                            if resp_dict:
+                                # 辖区配置信息追加resp_dict
+                                resp_dict.update(precinct)
+                                with query_log.work_unit("{} 第{}页".format(precinct["precinct"], page)):
+                                    resp_is_gather, resp_today_page_increased, resp_today_db_increased, resp_page_increased, resp_db_increased = self.parse_list_page(
+                                        resp_dict)
+                                # 统计更新数量
+                                today_page_increased += resp_today_page_increased
+                                today_db_increased += resp_today_db_increased
+                                page_increased += resp_page_increased
+                                db_increased += resp_db_increased
+                                # 更新状态
+                                state = 1
+                                if not resp_is_gather:
+                                    break
+                        # 统计页面总条数
+                        page_total = total
+                except Exception as e:
+                    error_info = "未知错误-{}".format(str(e))
+                finally:
+                    log_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    crawler_status_list.append((precinct, state, today_page_increased, page_total, error_info, log_time))
+        finally:
+            self.handle_crawler_status_list(crawler_status_list)
         # 关闭mysql ssh连接
         self.mysql_tool.close_ssh_conn()
+        logging.info("sql统计：\n{}".format(query_log.report()))
+        if query_log.n_plus_one_threshold:
+            logging.info("N+1查询检测：\n{}".format(query_log.report_n_plus_one()))
         logging.info("结束：{}".format(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
         logging.info("=" * 50 + "结束采集列表页" + "=" * 50)
 
+    def handle_crawler_status_list(self, crawler_status_list):
+        """
+        写入各辖区监控信息（已入库总条数所有辖区一次分组统计）
+        :param crawler_status_list: [(辖区配置, 状态, 当天页面新增数量, 页面总条数, 错误信息, 记录时间), ...]
+        :return:
+        """
+        if not crawler_status_list:
+            return
+        # 已入库总条数
+        existence_dict = self.get_existence_dict()
+        for precinct, state, today_page_increased, page_total, error_info, log_time in crawler_status_list:
+            existence = existence_dict.get(precinct["precinct"])
+            # 文件监控
+            self.handle_crawler_status_to_file(
+                id=precinct["crawler_status_id"],
+                state=state,
+                increment=today_page_increased,
+                total=page_total,
+                existence=existence,
+                error_info=error_info,
+                log_time=log_time,
+                crawler_status_path=self.global_conf["log_path"] + "{}.txt".format(precinct["precinct_code"])
+            )
+            # # 数据库监控
+            # self.handle_crawler_status_to_db(
+            #     id=precinct["crawler_status_id"],
+            #     state=state,
+            #     increment=today_page_increased,
+            #     total=page_total,
+            #     existence=existence,
+            #     error_info=error_info,
+            #     log_time=log_time
+            # )
+            # 接口监控
+            crawler_status = {
+                "total": page_total,
+                "existence": existence,
+                "increment": today_page_increased,
+                "state": state,
+                "errorInfo": error_info,
+                "logTime": log_time
+            }
+            update_info(precinct["condition"], crawler_status)
+
 
 if __name__ == '__main__':
     cgl = CsrcGovList()
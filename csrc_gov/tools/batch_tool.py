@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# ---------------------
+# author: chenweida
+# date:
+# desc: 写后批量更新（write-behind），先落本地日志再合并写库
+# ---------------------
+import json
+import logging
+import os
+import threading
+import time
+
+
+class BatchUpdateTool(object):
+
+    def __init__(self, mysql_tool, table, key_field="id", batch_size=50, flush_interval=30, journal_path=None,
+                 outbox_tool=None, retry_interval=30):
+        """
+        :param mysql_tool: MysqlTool对象
+        :param table: 表名（例如：csrc_gov）
+        :param key_field: 主键字段（例如：id）
+        :param batch_size: 累计多少行合并写库一次
+        :param flush_interval: 距上次写库超过多少秒时写库一次
+        :param journal_path: 本地日志路径，写库成功前的更新都记录在此，进程崩溃后下次启动重放
+        :param outbox_tool: OutboxTool对象，配置后由发件箱写库（数据库慢或不可用时转存发件箱，不再阻塞）
+        :param retry_interval: 写库失败后多少秒内不再自动写库（close时仍会写库）
+        """
+        self.mysql_tool = mysql_tool
+        self.table = table
+        self.key_field = key_field
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal_path = journal_path
+        self.outbox_tool = outbox_tool
+        self.retry_interval = retry_interval
+
+        # 上传回调可能来自多个线程
+        self.lock = threading.RLock()
+        # 待写库数据 {主键: 数据字典}
+        self.pending_dict = {}
+        self.last_flush_time = time.time()
+        # 写库失败后的退避截止时间
+        self.retry_until = 0
+
+        if self.journal_path:
+            journal_dir_path = os.path.dirname(self.journal_path)
+            if journal_dir_path and not os.path.exists(journal_dir_path):
+                os.makedirs(journal_dir_path)
+            self.replay_journal()
+
+        # 定时写库线程（最后不满一批的数据不必等到下次add）
+        self.stop_event = threading.Event()
+        self.timer_thread = threading.Thread(target=self.run_timer, name="batch_update_timer", daemon=True)
+        self.timer_thread.start()
+
+    def replay_journal(self):
+        """
+        重放上次未写库的日志
+        :return:
+        """
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "r", encoding="utf8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 崩溃时最后一行可能只写了一半
+                    continue
+                self.pending_dict.setdefault(record["key"], {}).update(record["data"])
+        if self.pending_dict:
+            logging.info("重放写后日志 {} 条，准备写库".format(len(self.pending_dict)))
+            self.flush()
+
+    def write_journal(self, key, data_dict):
+        """
+        追加写日志并落盘
+        :param key: 主键值
+        :param data_dict: 数据字典
+        :return:
+        """
+        with open(self.journal_path, "a", encoding="utf8") as f:
+            f.write(json.dumps({"key": key, "data": data_dict}, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def add(self, key, data_dict):
+        """
+        添加一行待更新数据，满足条数或时间条件时合并写库
+        :param key: 主键值
+        :param data_dict: 数据字典（例如：{"flag": 1}）
+        :return:
+        """
+        with self.lock:
+            if self.journal_path:
+                self.write_journal(key, data_dict)
+            self.pending_dict.setdefault(key, {}).update(data_dict)
+            if self.is_flush_due():
+                self.flush()
+
+    def is_flush_due(self):
+        """
+        是否满足条数或时间条件（写库失败后的retry_interval秒内不写库）
+        :return:
+        """
+        if not self.pending_dict or time.time() < self.retry_until:
+            return False
+        return len(self.pending_dict) >= self.batch_size or time.time() - self.last_flush_time >= self.flush_interval
+
+    def run_timer(self):
+        """
+        定时检查时间条件并写库，直到close
+        :return:
+        """
+        while not self.stop_event.wait(1):
+            try:
+                with self.lock:
+                    if self.is_flush_due():
+                        self.flush()
+            except Exception as e:
+                logging.error("写后批量更新定时写库异常: {}".format(str(e)), exc_info=True)
+
+    def flush(self):
+        """
+        将待更新数据合并为一条sql写库，写库成功后清空日志
+        :return:
+        """
+        with self.lock:
+            if not self.pending_dict:
+                return True
+
+            try:
+                if self.outbox_tool:
+                    ret = self.outbox_tool.case_update(self.table, self.key_field, self.pending_dict)
+                else:
+                    db, cs = self.mysql_tool.open_db_conn()
+                    ret = self.mysql_tool.many_case_update_db_sql(
+                        db, cs, self.table, self.key_field, self.pending_dict
+                    )
+                    self.mysql_tool.close_db_conn(db, cs)
+            except Exception as e:
+                logging.error("写后批量更新连接数据库失败: {}".format(str(e)))
+                ret = False
+
+            if not ret:
+                # 保留待写数据及日志，退避后再写库（或下次启动重放）
+                self.retry_until = time.time() + self.retry_interval
+                logging.error("写后批量更新失败，保留 {} 条待写数据，{} 秒后重试".format(
+                    len(self.pending_dict), self.retry_interval))
+                return False
+
+            logging.info("写后批量更新成功 {} 条".format(len(self.pending_dict)))
+            self.pending_dict = {}
+            self.last_flush_time = time.time()
+            if self.journal_path and os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            return True
+
+    def close(self):
+        """
+        停止定时写库并写入剩余数据（失败时保留在本地日志，下次启动重放）
+        :return:
+        """
+        self.stop_event.set()
+        self.timer_thread.join()
+        return self.flush()
@@ -5,16 +5,103 @@
 # desc:
 # ---------------------
 import logging
+import time
+from functools import lru_cache
 
 import pymysql
 from sshtunnel import SSHTunnelForwarder
 
+from .query_log_tool import query_log
+
+
+def execute_sql(cs, sql, args=None, many=False):
+    """
+    执行sql并记录耗时、行数、指纹及调用位置
+    :param cs: 数据库游标对象
+    :param sql: sql语句
+    :param args: sql参数
+    :param many: 是否executemany
+    :return:
+    """
+    start_time = time.perf_counter()
+    try:
+        if many:
+            return cs.executemany(sql, args)
+        return cs.execute(sql, args)
+    finally:
+        query_log.record(sql, time.perf_counter() - start_time, cs.rowcount)
+
+
+@lru_cache(maxsize=512)
+def build_select_sql(table, field_tuple, factor_str):
+    """
+    生成查询sql（参数化后同一形态的语句文本相同，故缓存复用）
+    :param table: 表名（例如：user）
+    :param field_tuple: 所需字段元组（例如：("id", "name")）
+    :param factor_str: 条件（例如：`id` = %s）
+    :return:
+    """
+    if field_tuple:
+        field_str = ",".join(["`" + str(field) + "`" for field in field_tuple])
+        return "select " + field_str + " from " + table + " where " + factor_str
+    else:
+        return "select * from " + table + " where " + factor_str
+
+
+@lru_cache(maxsize=512)
+def build_update_sql(table, field_tuple, factor_str):
+    """
+    生成更新sql
+    :param table: 表名（例如：user）
+    :param field_tuple: 更新字段元组（例如：("name", "age")）
+    :param factor_str: 条件（例如：`id` = %s）
+    :return:
+    """
+    field_str = ",".join(["`" + str(field) + "`=%s" for field in field_tuple])
+    if factor_str:
+        return "update " + table + " set " + field_str + " where " + factor_str
+    else:
+        return "update " + table + " set " + field_str
+
+
+def build_case_update_sql(table, key_field, data_dict_map):
+    """
+    生成多行合并更新sql（update ... set `f` = case `key` when ... end where `key` in (...)）
+    :param table: 表名（例如：user）
+    :param key_field: 主键字段（例如：id）
+    :param data_dict_map: 主键与数据字典映射（例如：{1: {"name": "cwd"}, 2: {"name": "cwd2", "age": 18}}）
+    :return: (sql, 参数列表)
+    """
+    # 各行字段可不同，未包含该字段的行保持原值
+    field_list = []
+    for data_dict in data_dict_map.values():
+        for data_key in data_dict:
+            if data_key not in field_list:
+                field_list.append(data_key)
+
+    quote_key = "`" + key_field + "`"
+    set_list = []
+    value_list = []
+    for field in field_list:
+        when_list = []
+        for key, data_dict in data_dict_map.items():
+            if field in data_dict:
+                when_list.append("when %s then %s")
+                value_list.extend([key, data_dict[field]])
+        set_list.append("`{0}` = case {1} {2} else `{0}` end".format(field, quote_key, " ".join(when_list)))
+    key_list = list(data_dict_map)
+    value_list.extend(key_list)
+    sql = "update " + table + " set " + ",".join(set_list) + \
+          " where " + quote_key + " in (" + ",".join(["%s"] * len(key_list)) + ")"
+    return sql, value_list
+
 
 class MysqlTool(object):
 
     def __init__(self, db_username, db_password, db_database, db_host="127.0.0.1", db_port=3306,
                  db_relay_host="0.0.0.0", db_relay_port=10022, ssh_host="139.159.150.159",
-                 ssh_port=22, ssh_username=None, ssh_password=None, charset="utf8"):
+                 ssh_port=22, ssh_username=None, ssh_password=None, charset="utf8",
+                 connect_timeout=10, read_timeout=None, write_timeout=None):
 
         self.db_username = db_username
         self.db_password = db_password
@@ -29,6 +116,10 @@ class MysqlTool(object):
         self.ssh_username = ssh_username
         self.ssh_password = ssh_password
         self.charset = charset
+        # 超时（秒），隧道卡住时读写不会无限等待
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
 
         # 是否通过ssh连接mysql
         if self.ssh_username and self.ssh_password:
@@ -44,7 +135,8 @@ class MysqlTool(object):
         开启db连接
         :return:
         """
-        # 打开数据库连接
+        # 打开数据库连接（建连耗时以"connect"指纹记录，逐条开关连接时可在统计中看出）
+        start_time = time.perf_counter()
         if self.ssh_username and self.ssh_password:
             db = pymysql.connect(
                 host=self.db_host,
@@ -52,7 +144,10 @@ class MysqlTool(object):
                 user=self.db_username,
                 password=self.db_password,
                 database=self.db_database,
-                charset=self.charset
+                charset=self.charset,
+                connect_timeout=self.connect_timeout,
+                read_timeout=self.read_timeout,
+                write_timeout=self.write_timeout
             )
         else:
             db = pymysql.connect(
@@ -61,8 +156,12 @@ class MysqlTool(object):
                 user=self.db_username,
                 password=self.db_password,
                 database=self.db_database,
-                charset=self.charset
+                charset=self.charset,
+                connect_timeout=self.connect_timeout,
+                read_timeout=self.read_timeout,
+                write_timeout=self.write_timeout
             )
+        query_log.record("connect", time.perf_counter() - start_time, 0)
         # 创建游标对象
         cs = db.cursor(cursor=pymysql.cursors.DictCursor)
         return db, cs
@@ -89,13 +188,33 @@ class MysqlTool(object):
             self.server.stop()
 
     @staticmethod
-    def select_db_count_sql(db, cs, table, factor_str=""):
+    def execute_db_sql(db, cs, sql, args=None):
+        """
+        执行任意sql（分区维护等DDL）
+        :param db: 数据库连接对象
+        :param cs: 数据库游标对象
+        :param sql: sql语句
+        :param args: sql参数
+        :return:
+        """
+        try:
+            execute_sql(cs, sql, args)
+            db.commit()
+            return True
+        except Exception as e:
+            logging.error(str(e))
+            db.rollback()
+            return False
+
+    @staticmethod
+    def select_db_count_sql(db, cs, table, factor_str="", factor_args=None):
         """
         查询总条数sql
         :param db: 数据库连接对象
         :param cs: 数据库游标对象
         :param table: 表名（例如：user）
         :param factor_str: 表名（例如：user="cwd"）
+        :param factor_args: 条件参数（例如：("cwd",)，对应factor_str中的%s）
         :return:
         """
         if not factor_str:
@@ -104,7 +223,7 @@ class MysqlTool(object):
             sql = "select count(*) as count from {} where {}".format(table, factor_str)
 
         try:
-            cs.execute(sql)
+            execute_sql(cs, sql, factor_args or None)
             ret = cs.fetchone()
             return ret
         except Exception as e:
@@ -112,24 +231,46 @@ class MysqlTool(object):
             return None
 
     @staticmethod
-    def select_db_sql(db, cs, table, field_list, factor_str):
+    def select_db_group_count_sql(db, cs, table, group_field, factor_str="", factor_args=None):
+        """
+        分组统计条数sql（一条group by代替逐组count）
+        :param db: 数据库连接对象
+        :param cs: 数据库游标对象
+        :param table: 表名（例如：user）
+        :param group_field: 分组字段（例如：sex）
+        :param factor_str: 条件（例如：`age` >= %s）
+        :param factor_args: 条件参数（例如：(18,)，对应factor_str中的%s）
+        :return: {分组值: 条数}（例如：{"men": 10, "women": 12}）
+        """
+        quote_field = "`" + group_field + "`"
+        sql = "select " + quote_field + " as group_value, count(*) as count from " + table
+        if factor_str:
+            sql += " where " + factor_str
+        sql += " group by " + quote_field
+
+        try:
+            execute_sql(cs, sql, factor_args or None)
+            return {row["group_value"]: row["count"] for row in cs.fetchall()}
+        except Exception as e:
+            logging.error(str(e))
+            return None
+
+    @staticmethod
+    def select_db_sql(db, cs, table, field_list, factor_str, factor_args=None):
         """
         查询sql
         :param db: 数据库连接对象
         :param cs: 数据库游标对象
         :param table: 表名（例如：user）
         :param field_list: 所需字段列表（例如：["id", "name"]）
-        :param factor_str: 条件（例如：id=1）
+        :param factor_str: 条件（例如：id=1 或 `id` = %s）
+        :param factor_args: 条件参数（例如：(1,)，对应factor_str中的%s）
         :return:
         """
-        if field_list:
-            field_str = ",".join(["`" + str(field) + "`" for field in field_list])
-            sql = "select " + field_str + " from " + table + " where " + factor_str
-        else:
-            sql = "select * from " + table + " where " + factor_str
+        sql = build_select_sql(table, tuple(field_list or ()), factor_str)
 
         try:
-            cs.execute(sql)
+            execute_sql(cs, sql, factor_args or None)
             return cs.fetchall()
         except Exception as e:
             logging.error(str(e))
@@ -157,7 +298,7 @@ class MysqlTool(object):
         sql = "insert into " + table + "(" + field_str + ") values (" + seat_str + ")"
 
         try:
-            cs.execute(sql, value_list)
+            execute_sql(cs, sql, value_list)
             insert_id = db.insert_id()
             db.commit()
             return insert_id
@@ -166,6 +307,27 @@ class MysqlTool(object):
             db.rollback()
             return None
 
+    @staticmethod
+    def transaction_insert_db_sql(db, cs, table, data_dict):
+        """
+        事务插入sql，需要手动commit
+        :param db: 数据库连接对象
+        :param cs: 数据库游标对象
+        :param table: 表名（例如：user）
+        :param data_dict: 数据字典（例如：{"name": "cwd", "age": 18, "sex": "men"}）
+        :return: 插入行id，失败返回None
+        """
+        field_str = ",".join(["`" + data_key + "`" for data_key in data_dict])
+        seat_str = ",".join(["%s"] * len(data_dict))
+        sql = "insert into " + table + "(" + field_str + ") values (" + seat_str + ")"
+
+        try:
+            execute_sql(cs, sql, list(data_dict.values()))
+            return db.insert_id()
+        except Exception as e:
+            logging.error(str(e))
+            return None
+
     @staticmethod
     def many_insert_db_sql(db, cs, table, field_list, data_list):
         """
@@ -187,7 +349,7 @@ class MysqlTool(object):
         sql = "insert into " + table + "(" + field_str + ") values (" + seat_str + ")"
 
         try:
-            cs.executemany(sql, data_list)
+            execute_sql(cs, sql, data_list, many=True)
             db.commit()
             return True
         except Exception as e:
@@ -196,30 +358,22 @@ class MysqlTool(object):
             return False
 
     @staticmethod
-    def update_db_sql(db, cs, table, data_dict, factor_str):
+    def update_db_sql(db, cs, table, data_dict, factor_str, factor_args=None):
         """
         更新sql
         :param db: 数据库连接对象
         :param cs: 数据库游标对象
         :param table: 表名（例如：user）
         :param data_dict: 数据字典（例如：{"name": "cwd", "age": 18, "sex": "men"}）
-        :param factor_str: 条件（例如：id=1）
+        :param factor_str: 条件（例如：id=1 或 `id` = %s）
+        :param factor_args: 条件参数（例如：(1,)，对应factor_str中的%s）
         :return:
         """
-        field_list = []
-        value_list = []
-        for data_key in data_dict:
-            field_list.append("`" + data_key + "`=%s")
-            value_list.append(data_dict[data_key])
-        field_str = ",".join(field_list)
-
-        if factor_str:
-            sql = "update " + table + " set " + field_str + " where " + factor_str
-        else:
-            sql = "update " + table + " set " + field_str
+        sql = build_update_sql(table, tuple(data_dict), factor_str)
+        value_list = list(data_dict.values()) + list(factor_args or ())
 
         try:
-            cs.execute(sql, value_list)
+            execute_sql(cs, sql, value_list)
             db.commit()
             return True
         except Exception as e:
@@ -228,30 +382,22 @@ class MysqlTool(object):
             return False
 
     @staticmethod
-    def transaction_update_db_sql(db, cs, table, data_dict, factor_str):
+    def transaction_update_db_sql(db, cs, table, data_dict, factor_str, factor_args=None):
         """
         事务更新sql，需要手动commit
         :param db: 数据库连接对象
         :param cs: 数据库游标对象
         :param table: 表名（例如：user）
         :param data_dict: 数据字典（例如：{"name": "cwd", "age": 18, "sex": "men"}）
-        :param factor_str: 条件（例如：id=1）
+        :param factor_str: 条件（例如：id=1 或 `id` = %s）
+        :param factor_args: 条件参数（例如：(1,)，对应factor_str中的%s）
         :return:
         """
-        field_list = []
-        value_list = []
-        for data_key in data_dict:
-            field_list.append("`" + data_key + "`=%s")
-            value_list.append(data_dict[data_key])
-        field_str = ",".join(field_list)
-
-        if factor_str:
-            sql = "update " + table + " set " + field_str + " where " + factor_str
-        else:
-            sql = "update " + table + " set " + field_str
+        sql = build_update_sql(table, tuple(data_dict), factor_str)
+        value_list = list(data_dict.values()) + list(factor_args or ())
 
         try:
-            cs.execute(sql, value_list)
+            execute_sql(cs, sql, value_list)
             return True
         except Exception as e:
             logging.error(str(e))
@@ -276,7 +422,7 @@ class MysqlTool(object):
         sql = "update " + table + " set " + field_str + " where " + factor_str
 
         try:
-            cs.executemany(sql, data_list)
+            execute_sql(cs, sql, data_list, many=True)
             db.commit()
             return True
         except Exception as e:
@@ -284,6 +430,54 @@ class MysqlTool(object):
             db.rollback()
             return False
 
+    @staticmethod
+    def many_case_update_db_sql(db, cs, table, key_field, data_dict_map):
+        """
+        多行合并更新sql（update ... set `f` = case `key` when ... end where `key` in (...)）
+        :param db: 数据库连接对象
+        :param cs: 数据库游标对象
+        :param table: 表名（例如：user）
+        :param key_field: 主键字段（例如：id）
+        :param data_dict_map: 主键与数据字典映射（例如：{1: {"name": "cwd"}, 2: {"name": "cwd2", "age": 18}}）
+        :return:
+        """
+        if not data_dict_map:
+            return True
+
+        sql, value_list = build_case_update_sql(table, key_field, data_dict_map)
+
+        try:
+            execute_sql(cs, sql, value_list)
+            db.commit()
+            return True
+        except Exception as e:
+            logging.error(str(e))
+            db.rollback()
+            return False
+
+    @staticmethod
+    def transaction_many_case_update_db_sql(db, cs, table, key_field, data_dict_map):
+        """
+        事务多行合并更新sql，需要手动commit
+        :param db: 数据库连接对象
+        :param cs: 数据库游标对象
+        :param table: 表名（例如：user）
+        :param key_field: 主键字段（例如：id）
+        :param data_dict_map: 主键与数据字典映射（例如：{1: {"name": "cwd"}, 2: {"name": "cwd2", "age": 18}}）
+        :return:
+        """
+        if not data_dict_map:
+            return True
+
+        sql, value_list = build_case_update_sql(table, key_field, data_dict_map)
+
+        try:
+            execute_sql(cs, sql, value_list)
+            return True
+        except Exception as e:
+            logging.error(str(e))
+            return False
+
 
 if __name__ == '__main__':
     # ssh连接
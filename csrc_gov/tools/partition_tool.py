@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+# ---------------------
+# author: chenweida
+# date:
+# desc: 按月RANGE COLUMNS分区维护：预建未来分区、将过期月分区合并入归档分区（冷热分离）
+# ---------------------
+import datetime
+import logging
+
+from .sql_tool import SqlFactor
+
+
+class PartitionTool(object):
+    """
+    分区布局（见 sql/csrc_gov_partition_mysql.sql）：
+        p_archive  VALUES LESS THAN ('2026-05-01')      迁移时的历史数据，之后不再改动
+        p2026      VALUES LESS THAN ('2027-01-01')      冷数据，整年移出热数据窗口后按年合并
+        p202701    VALUES LESS THAN ('2027-02-01')      热数据，每月一个分区
+        ...
+        p_future   VALUES LESS THAN (MAXVALUE)          兜底
+    查询带publish_time条件时MySQL只扫描命中的分区
+    归档只重组当年的月分区，不重写 p_archive 及已归档的年分区
+    """
+
+    def __init__(self, mysql_tool, table, archive_name="p_archive", future_name="p_future"):
+        """
+        :param mysql_tool: MysqlTool对象
+        :param table: 表名（例如：csrc_gov）
+        :param archive_name: 归档分区名
+        :param future_name: 兜底分区名
+        """
+        self.mysql_tool = mysql_tool
+        self.table = table
+        self.archive_name = archive_name
+        self.future_name = future_name
+
+    @staticmethod
+    def month_start(date, offset=0):
+        """
+        月初日期
+        :param date: 日期（例如：2026-10-19）
+        :param offset: 偏移月数（例如：-1）
+        :return: （例如：2026-09-01）
+        """
+        month_index = date.year * 12 + date.month - 1 + offset
+        return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+    @staticmethod
+    def partition_name(month_date):
+        return "p" + month_date.strftime("%Y%m")
+
+    def get_partition_list(self):
+        """
+        查询当前分区
+        :return: [(分区名, 上界)]，上界为date或None（MAXVALUE），未分区时返回空列表
+        """
+        factor_str, factor_args = (
+            SqlFactor()
+            .raw("`TABLE_SCHEMA` = database()")
+            .eq("TABLE_NAME", self.table)
+            .raw("`PARTITION_NAME` is not null")
+            .order_by("PARTITION_ORDINAL_POSITION")
+            .build()
+        )
+        db, cs = self.mysql_tool.open_db_conn()
+        ret = self.mysql_tool.select_db_sql(
+            db, cs, "information_schema.PARTITIONS",
+            ["PARTITION_NAME", "PARTITION_DESCRIPTION"],
+            factor_str, factor_args
+        )
+        self.mysql_tool.close_db_conn(db, cs)
+
+        partition_list = []
+        for row in ret or []:
+            description = (row["PARTITION_DESCRIPTION"] or "").strip("'")
+            if description.upper() == "MAXVALUE":
+                boundary = None
+            else:
+                boundary = datetime.datetime.strptime(description[:10], "%Y-%m-%d").date()
+            partition_list.append((row["PARTITION_NAME"], boundary))
+        return partition_list
+
+    def reorganize(self, from_name_list, into_list):
+        """
+        重组分区
+        :param from_name_list: 原分区名列表（需相邻）
+        :param into_list: 新分区列表 [(分区名, 上界)]，上界为None时为MAXVALUE
+        :return:
+        """
+        into_str = ",".join([
+            "partition {} values less than ({})".format(
+                name, "maxvalue" if boundary is None else "'{}'".format(boundary.strftime("%Y-%m-%d")))
+            for name, boundary in into_list
+        ])
+        sql = "alter table {} reorganize partition {} into ({})".format(
+            self.table, ",".join(from_name_list), into_str)
+        db, cs = self.mysql_tool.open_db_conn()
+        ret = self.mysql_tool.execute_db_sql(db, cs, sql)
+        self.mysql_tool.close_db_conn(db, cs)
+        return ret
+
+    def add_future_partitions(self, future_months, today=None):
+        """
+        从兜底分区中拆出未来的月分区
+        :param future_months: 预建到当前月之后的月数
+        :param today: 当前日期（默认今天）
+        :return:
+        """
+        today = today or datetime.date.today()
+        partition_list = self.get_partition_list()
+        if not partition_list or partition_list[-1][0] != self.future_name:
+            logging.warning("表 {} 未按月分区（或缺少 {} 分区），跳过预建".format(self.table, self.future_name))
+            return False
+
+        # 最后一个有界分区的上界
+        last_boundary = max(boundary for _, boundary in partition_list if boundary)
+        target_boundary = self.month_start(today, future_months + 1)
+
+        into_list = []
+        month_date = last_boundary
+        while month_date < target_boundary:
+            into_list.append((self.partition_name(month_date), self.month_start(month_date, 1)))
+            month_date = self.month_start(month_date, 1)
+        if not into_list:
+            logging.info("未来分区已存在，无需预建")
+            return True
+
+        into_list.append((self.future_name, None))
+        ret = self.reorganize([self.future_name], into_list)
+        logging.info("预建分区 {}: {}".format("成功" if ret else "失败", [name for name, _ in into_list[:-1]]))
+        return ret
+
+    def archive_partitions(self, hot_months, today=None):
+        """
+        将整年都在热数据窗口之前的月分区合并为年分区（例如：p202605 ~ p202612 合并为 p2026）
+        未满一年的过期月分区保留为月分区，待当年全部过期后再合并
+        :param hot_months: 保留为独立月分区的最少月数（含当前月）
+        :param today: 当前日期（默认今天）
+        :return:
+        """
+        today = today or datetime.date.today()
+        partition_list = self.get_partition_list()
+        if not partition_list or partition_list[0][0] != self.archive_name:
+            logging.warning("表 {} 未按月分区（或缺少 {} 分区），跳过归档".format(self.table, self.archive_name))
+            return False
+
+        hot_start = self.month_start(today, -(hot_months - 1))
+        # {年份: [月分区名]}，只取整年都已过期的月分区（pYYYYMM）
+        year_dict = {}
+        for name, boundary in partition_list[1:]:
+            if not boundary or len(name) != 7 or not name[1:].isdigit():
+                continue
+            year = int(name[1:5])
+            if datetime.date(year + 1, 1, 1) <= hot_start:
+                year_dict.setdefault(year, []).append(name)
+        if not year_dict:
+            logging.info("无需归档的月分区")
+            return True
+
+        ret = True
+        for year, from_name_list in sorted(year_dict.items()):
+            year_ret = self.reorganize(from_name_list, [("p{}".format(year), datetime.date(year + 1, 1, 1))])
+            logging.info("归档分区 {}: {} -> p{}".format("成功" if year_ret else "失败", from_name_list, year))
+            ret = ret and year_ret
+        return ret
+
+    def rotate(self, hot_months, future_months, today=None):
+        """
+        分区轮转：预建未来分区并归档过期分区
+        :param hot_months: 热数据月数
+        :param future_months: 预建月数
+        :param today: 当前日期（默认今天）
+        :return:
+        """
+        add_ret = self.add_future_partitions(future_months, today)
+        archive_ret = self.archive_partitions(hot_months, today)
+        return add_ret and archive_ret
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+# ---------------------
+# author: chenweida
+# date:
+# desc: 主机级PDF渲染服务（Unix socket），同一主机上各爬虫进程的wkhtmltopdf渲染由一个渲染池统一调度：
+#       RenderServer: 优先级队列 + 固定数量渲染线程（默认CPU核数），排队已满时返回busy（背压）
+#       RenderClient: PDFTool使用，busy时退避重试，服务不可用时由调用方本地渲染
+#       协议：每个连接一个请求，帧为 8字节头（json头长度、正文长度，大端） + json头 + 正文
+# ---------------------
+import itertools
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+
+from .pdf_tool import PDFTool
+
+FRAME_HEAD = struct.Struct(">II")
+
+
+def send_frame(sock, header, body=b""):
+    """
+    发送一帧
+    :param sock: socket对象
+    :param header: json头（字典）
+    :param body: 正文字节
+    :return:
+    """
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf8")
+    sock.sendall(FRAME_HEAD.pack(len(header_bytes), len(body)) + header_bytes + body)
+
+
+def recv_exact(sock, size):
+    chunk_list = []
+    while size > 0:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            raise ConnectionError("连接已关闭")
+        chunk_list.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunk_list)
+
+
+def recv_frame(sock):
+    """
+    接收一帧
+    :param sock: socket对象
+    :return: (json头, 正文字节)
+    """
+    header_size, body_size = FRAME_HEAD.unpack(recv_exact(sock, FRAME_HEAD.size))
+    header = json.loads(recv_exact(sock, header_size).decode("utf8"))
+    return header, recv_exact(sock, body_size)
+
+
+class RenderJob(object):
+
+    def __init__(self, text, wk_options, timeout):
+        self.text = text
+        self.wk_options = wk_options
+        self.timeout = timeout
+        self.pdf_content = None
+        self.done_event = threading.Event()
+
+
+class RenderServer(object):
+    """
+    priority越小越先渲染，相同优先级先到先渲染
+    """
+
+    # 客户端可传的wkhtmltopdf参数（输出配置 + 本地文件访问）
+    ALLOWED_WK_OPTION_SET = set(PDFTool.PROFILE_WK_OPTION.values()) | {"enable-local-file-access"}
+
+    def __init__(self, socket_path, worker_number=None, queue_size=None, max_timeout=300):
+        """
+        :param socket_path: Unix socket路径
+        :param worker_number: 渲染线程数（每个线程驱动一个wkhtmltopdf进程），默认CPU核数
+        :param queue_size: 排队任务数上限（不含渲染中的任务），默认渲染线程数的4倍，超过时返回busy
+        :param max_timeout: 单次渲染超时上限（秒），客户端传来的超时不超过该值
+        """
+        self.socket_path = socket_path
+        self.worker_number = worker_number or os.cpu_count() or 1
+        self.queue_size = queue_size or self.worker_number * 4
+        self.max_timeout = max_timeout
+
+        self.pdf_tool = PDFTool("./", render_timeout=max_timeout)
+        self.job_queue = queue.PriorityQueue()
+        self.sequence = itertools.count()
+        self.server_sock = None
+        self.stopping = False
+        self.thread_list = []
+
+        self.lock = threading.Lock()
+        self.success_count = 0
+        self.failure_count = 0
+        self.busy_count = 0
+
+    def serve_forever(self):
+        """
+        启动渲染线程并接受连接（阻塞，直到shutdown后已接受的请求全部返回）
+        :return:
+        """
+        if os.path.exists(self.socket_path):
+            if self.is_alive(self.socket_path):
+                raise Exception("渲染服务已在运行: {}".format(self.socket_path))
+            os.remove(self.socket_path)
+
+        self.server_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server_sock.bind(self.socket_path)
+        # 同一主机同一用户组的爬虫进程可访问
+        os.chmod(self.socket_path, 0o660)
+        self.server_sock.listen(128)
+        # 定时醒来检查是否已停止 (其他线程关闭socket不能唤醒阻塞中的accept)
+        self.server_sock.settimeout(1)
+
+        for index in range(self.worker_number):
+            self.start_thread(self.render_worker, name="render-{}".format(index))
+        logging.info("渲染服务已启动: {} (渲染线程 {} 个，排队上限 {})".format(
+            self.socket_path, self.worker_number, self.queue_size))
+
+        while not self.stopping:
+            try:
+                conn, _ = self.server_sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            conn.settimeout(None)
+            self.start_thread(self.handle_connection, conn)
+        self.server_sock.close()
+
+        for thread in self.thread_list:
+            thread.join()
+        logging.info("渲染服务已停止: 成功 {} 个，失败 {} 个，busy {} 次".format(
+            self.success_count, self.failure_count, self.busy_count))
+
+    def start_thread(self, target, *args, name=None):
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        # 顺带清理已结束的连接线程
+        self.thread_list = [item for item in self.thread_list if item.is_alive()] + [thread]
+
+    @staticmethod
+    def is_alive(socket_path):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+            return True
+        except OSError:
+            return False
+        finally:
+            sock.close()
+
+    def handle_connection(self, conn):
+        """
+        处理一个渲染请求：排队已满时立即返回busy，否则入队并等待渲染完成后返回pdf
+        :param conn: 客户端连接
+        :return:
+        """
+        try:
+            header, body = recv_frame(conn)
+            wk_options = header.get("options") or {}
+            unknown_option_list = sorted(set(wk_options) - self.ALLOWED_WK_OPTION_SET)
+            if unknown_option_list:
+                send_frame(conn, {"status": "error", "message": "不支持的参数: {}".format(unknown_option_list)})
+                return
+
+            # 停止中不再入队 (客户端重试时连接失败, 转为本地渲染)
+            queue_length = self.job_queue.qsize()
+            if queue_length >= self.queue_size or self.stopping:
+                with self.lock:
+                    self.busy_count += 1
+                send_frame(conn, {"status": "busy", "queue": queue_length})
+                return
+
+            timeout = min(header.get("timeout") or self.max_timeout, self.max_timeout)
+            job = RenderJob(body.decode("utf8"), wk_options, timeout)
+            self.job_queue.put((header.get("priority", 5), next(self.sequence), job))
+            job.done_event.wait()
+
+            if job.pdf_content:
+                send_frame(conn, {"status": "ok"}, job.pdf_content)
+            else:
+                send_frame(conn, {"status": "error", "message": "渲染失败"})
+        except Exception as e:
+            logging.error("处理渲染请求失败: {}".format(str(e)))
+        finally:
+            conn.close()
+
+    def render_worker(self):
+        while True:
+            _, _, job = self.job_queue.get()
+            if job is None:
+                return
+            try:
+                job.pdf_content = self.pdf_tool.render_html_wk(job.text, job.timeout, wk_options=job.wk_options)
+            except Exception as e:
+                logging.error("渲染异常: {}".format(str(e)), exc_info=True)
+            finally:
+                with self.lock:
+                    if job.pdf_content:
+                        self.success_count += 1
+                    else:
+                        self.failure_count += 1
+                job.done_event.set()
+
+    def shutdown(self):
+        """
+        停止接受连接，排队中的任务渲染完成后结束渲染线程
+        :return:
+        """
+        self.stopping = True
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        # 结束标记排在所有任务之后
+        for _ in range(self.worker_number):
+            self.job_queue.put((float("inf"), next(self.sequence), None))
+
+
+class RenderClient(object):
+    """
+    每次渲染新建一个连接（线程安全）；渲染服务不可用时retry_interval秒内不再尝试连接
+    """
+
+    def __init__(self, socket_path, priority=5, busy_wait=0.5, busy_timeout=600, retry_interval=30):
+        """
+        :param socket_path: Unix socket路径
+        :param priority: 渲染优先级（越小越先渲染）
+        :param busy_wait: 服务busy时首次等待秒数（之后翻倍，最多5秒）
+        :param busy_timeout: 服务持续busy超过该秒数时放弃（由调用方本地渲染）
+        :param retry_interval: 服务不可用后重新尝试连接的间隔（秒）
+        """
+        self.socket_path = socket_path
+        self.priority = priority
+        self.busy_wait = busy_wait
+        self.busy_timeout = busy_timeout
+        self.retry_interval = retry_interval
+        self.unavailable_until = 0
+
+    def render(self, text, wk_options, timeout):
+        """
+        请求渲染服务渲染
+        :param text: html文本
+        :param wk_options: wkhtmltopdf参数
+        :param timeout: 渲染超时（秒）
+        :return: (是否由渲染服务处理, pdf字节流)，服务不可用或持续busy时为(False, None)
+        """
+        if not hasattr(socket, "AF_UNIX") or time.time() < self.unavailable_until:
+            return False, None
+
+        start_time = time.time()
+        busy_wait = self.busy_wait
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+                send_frame(sock, {
+                    "op": "render", "priority": self.priority, "timeout": timeout, "options": wk_options
+                }, text.encode("utf8"))
+                header, body = recv_frame(sock)
+            except OSError as e:
+                self.unavailable_until = time.time() + self.retry_interval
+                logging.warning("渲染服务不可用，{} 秒内本地渲染: {}".format(self.retry_interval, str(e)))
+                return False, None
+            finally:
+                sock.close()
+
+            if header["status"] == "ok":
+                return True, body
+            if header["status"] == "error":
+                logging.error("渲染服务渲染失败: {}".format(header.get("message")))
+                return True, None
+
+            # busy: 退避后重试（阻塞提交渲染的线程，背压传递到爬虫）
+            if time.time() - start_time > self.busy_timeout:
+                logging.warning("渲染服务持续繁忙超过 {} 秒，本地渲染".format(self.busy_timeout))
+                return False, None
+            logging.debug("渲染服务繁忙（排队 {}），{} 秒后重试".format(header.get("queue"), busy_wait))
+            time.sleep(busy_wait)
+            busy_wait = min(busy_wait * 2, 5)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# ---------------------
+# author: chenweida
+# date:
+# desc: 参数化sql条件构造、sql指纹
+# ---------------------
+import re
+
+
+class SqlFactor(object):
+    """
+    参数化的where条件构造器，所有值均以%s占位，由驱动负责转义
+    用法：
+        factor_str, factor_args = SqlFactor().eq("pid", 1).is_blank("attachment_url").build()
+        mysql_tool.select_db_sql(db, cs, "csrc_gov", ["id"], factor_str, factor_args)
+    """
+
+    def __init__(self):
+        # 条件语句列表（以and连接）
+        self.clause_list = []
+        # 条件参数列表
+        self.arg_list = []
+        # 排序语句列表
+        self.order_list = []
+        # 限制条数
+        self.limit_number = None
+
+    @staticmethod
+    def quote(field):
+        """
+        字段加反引号
+        :param field: 字段名（例如：id）
+        :return:
+        """
+        return "`" + str(field) + "`"
+
+    def raw(self, clause, *args):
+        """
+        添加原始条件语句
+        :param clause: 条件语句（例如：(`pid` is null or `pid` = %s)）
+        :param args: 条件语句中%s对应的参数
+        :return:
+        """
+        self.clause_list.append(clause)
+        self.arg_list.extend(args)
+        return self
+
+    def eq(self, field, value):
+        return self.raw(self.quote(field) + " = %s", value)
+
+    def ne(self, field, value):
+        return self.raw(self.quote(field) + " != %s", value)
+
+    def gt(self, field, value):
+        return self.raw(self.quote(field) + " > %s", value)
+
+    def ge(self, field, value):
+        return self.raw(self.quote(field) + " >= %s", value)
+
+    def lt(self, field, value):
+        return self.raw(self.quote(field) + " < %s", value)
+
+    def le(self, field, value):
+        return self.raw(self.quote(field) + " <= %s", value)
+
+    def is_in(self, field, value_list):
+        """
+        in条件，空列表时条件恒为假
+        :param field: 字段名
+        :param value_list: 值列表
+        :return:
+        """
+        value_list = list(value_list)
+        if not value_list:
+            return self.raw("1 = 0")
+        seat_str = ",".join(["%s"] * len(value_list))
+        return self.raw(self.quote(field) + " in (" + seat_str + ")", *value_list)
+
+    def is_blank(self, field):
+        quote_field = self.quote(field)
+        return self.raw("(" + quote_field + " is null or " + quote_field + " = '')")
+
+    def order_by(self, field, desc=False):
+        self.order_list.append(self.quote(field) + (" desc" if desc else ""))
+        return self
+
+    def limit(self, number):
+        self.limit_number = int(number)
+        return self
+
+    def build(self):
+        """
+        生成条件语句及参数
+        :return: (factor_str, factor_args)
+        """
+        factor_str = " and ".join(self.clause_list) if self.clause_list else "1 = 1"
+        if self.order_list:
+            factor_str += " order by " + ",".join(self.order_list)
+        if self.limit_number is not None:
+            factor_str += " limit {}".format(self.limit_number)
+        return factor_str, tuple(self.arg_list)
+
+
+def split_factor(factor_str):
+    """
+    已生成的条件语句拆分为where条件及order by、limit部分
+    :param factor_str: SqlFactor.build()生成的条件（例如：`flag` = %s order by `publish_time` desc）
+    :return: （例如：("`flag` = %s", " order by `publish_time` desc")）
+    """
+    match = re.search(r"\s(order by|limit)\s", factor_str, flags=re.I)
+    if match:
+        return factor_str[:match.start()], factor_str[match.start():]
+    return factor_str, ""
+
+
+def append_factor(factor_str, clause):
+    """
+    在已生成的条件语句中追加and条件（插入到order by、limit之前）
+    :param factor_str: SqlFactor.build()生成的条件（例如：`flag` = %s order by `publish_time` desc）
+    :param clause: 追加的条件（例如：`lease_until` < %s）
+    :return: （例如：(`flag` = %s) and (`lease_until` < %s) order by `publish_time` desc）
+    """
+    where_str, tail_str = split_factor(factor_str)
+    return "(" + (where_str or "1 = 1") + ") and (" + clause + ")" + tail_str
+
+
+def fingerprint_sql(sql):
+    """
+    sql指纹：去除具体取值，同一形态的语句得到相同指纹
+    :param sql: sql语句（例如：select * from user where `id` = 1）
+    :return: （例如：select * from user where `id` = ?）
+    """
+    sql = re.sub(r"'(?:[^'\\]|\\.)*'", "?", sql)
+    sql = re.sub(r'"(?:[^"\\]|\\.)*"', "?", sql)
+    sql = sql.replace("%s", "?")
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    # in列表及多行values长度不同也视为同一形态
+    sql = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?+)", sql)
+    sql = re.sub(r"(?:when \? then \?\s*)+", "when ? then ? ", sql, flags=re.I)
+    return re.sub(r"\s+", " ", sql).strip().lower()
+
+
+if __name__ == '__main__':
+    print(SqlFactor().eq("detail_url", "http://www.csrc.gov.cn/a'b.shtml").is_blank("attachment_url")
+          .order_by("publish_time", desc=True).build())
+    print(fingerprint_sql("select `id` from csrc_gov where `pid` = '12' and `id` in (1, 2, 3) limit 10"))
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# ---------------------
+# author: chenweida
+# date:
+# desc: sqlite替身库，方法签名与MysqlTool一致，用于本地离线运行、压测及性能分析
+# ---------------------
+import datetime
+import logging
+import os
+import sqlite3
+import time
+
+from .mysql_tool import MysqlTool
+from .query_log_tool import query_log
+
+# 与pymysql写入datetime时的格式一致，便于与字符串时间比较
+sqlite3.register_adapter(datetime.datetime, lambda value: value.strftime("%Y-%m-%d %H:%M:%S"))
+sqlite3.register_adapter(datetime.date, lambda value: value.strftime("%Y-%m-%d"))
+
+
+def dict_factory(cursor, row):
+    """
+    行转字典（对应pymysql的DictCursor）
+    :param cursor: 游标对象
+    :param row: 行元组
+    :return:
+    """
+    return {column[0]: row[index] for index, column in enumerate(cursor.description)}
+
+
+class SqliteCursor(object):
+    """
+    sqlite游标方言适配：%s占位符转?，其余与pymysql游标用法一致
+    （反引号标识符sqlite本身支持）
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    @staticmethod
+    def convert_sql(sql):
+        return sql.replace("%s", "?")
+
+    def execute(self, sql, args=None):
+        return self.cursor.execute(self.convert_sql(sql), tuple(args or ()))
+
+    def executemany(self, sql, args):
+        return self.cursor.executemany(self.convert_sql(sql), [tuple(arg) for arg in args])
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+
+    def close(self):
+        self.cursor.close()
+
+
+class SqliteConnection(object):
+    """
+    sqlite连接适配：提供pymysql连接的insert_id()
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.last_cursor = None
+
+    def cursor(self, cursor=None):
+        self.last_cursor = SqliteCursor(self.conn.cursor())
+        return self.last_cursor
+
+    def insert_id(self):
+        return self.last_cursor.lastrowid if self.last_cursor else 0
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+
+class SqliteTool(MysqlTool):
+    """
+    继承MysqlTool的全部sql方法（静态方法只依赖db、cs接口），仅替换连接的建立
+    """
+
+    def __init__(self, db_path, bootstrap_path=None, timeout=30):
+        """
+        :param db_path: sqlite数据库文件路径（例如：./cache/sqlite_cache/csrc_gov.db）
+        :param bootstrap_path: 建表脚本路径，每次初始化执行一次（脚本需使用if not exists）
+        :param timeout: 等待写锁的超时时间（秒）
+        """
+        self.db_path = db_path
+        self.bootstrap_path = bootstrap_path
+        self.timeout = timeout
+        self.ssh_username = None
+        self.ssh_password = None
+        self.server = None
+
+        db_dir_path = os.path.dirname(self.db_path)
+        if db_dir_path and not os.path.exists(db_dir_path):
+            os.makedirs(db_dir_path)
+
+        if self.bootstrap_path:
+            self.bootstrap(self.bootstrap_path)
+
+    def bootstrap(self, sql_path):
+        """
+        执行建表脚本
+        :param sql_path: 建表脚本路径
+        :return:
+        """
+        with open(sql_path, "r", encoding="utf8") as f:
+            sql_script = f.read()
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        try:
+            conn.executescript(sql_script)
+            conn.commit()
+        finally:
+            conn.close()
+        logging.info("sqlite建表脚本执行完成: {} -> {}".format(sql_path, self.db_path))
+
+    def open_db_conn(self):
+        """
+        开启db连接（sqlite建连很快，仍按MysqlTool的方式逐次开关）
+        :return:
+        """
+        start_time = time.perf_counter()
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = dict_factory
+        query_log.record("connect", time.perf_counter() - start_time, 0)
+        db = SqliteConnection(conn)
+        cs = db.cursor()
+        return db, cs
+
+    def close_ssh_conn(self):
+        pass
+
+
+if __name__ == '__main__':
+    # 初始化本地库并查询
+    st = SqliteTool("./cache/sqlite_cache/csrc_gov.db", bootstrap_path="../common-mod/sql/csrc_gov_sqlite.sql")
+    d, c = st.open_db_conn()
+    print(st.select_db_count_sql(d, c, "csrc_gov", ""))
+    st.close_db_conn(d, c)